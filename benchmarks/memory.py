@@ -0,0 +1,168 @@
+'''
+pyrpm memory benchmark
+
+Generates synthetic packages (see rpmgen), keeps them open as YumPackage
+objects with all header entries decoded, the way an indexing service holds
+them, and reports the memory retained per package and per header entry (via
+tracemalloc), along with how well repeated strings are shared: the number of
+string references in the file owners, groups, dirnames and dependency names
+against the number of distinct string objects behind them.
+
+The results are written as JSON; given a previous result file with
+--baseline, a retained size larger than --threshold times the baseline is
+reported and the exit status is 1.
+
+    python benchmarks/memory.py --packages 1000 --output memory.json
+'''
+import gc
+import json
+import optparse
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyrpm.yum import YumPackage  # noqa: E402
+
+from rpmgen import write_rpm  # noqa: E402
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+def generate(directory, count, options):
+    ''' write count synthetic packages to directory, returns their paths '''
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, 'mem%06d-1.0-1.x86_64.rpm' % (i, ))
+        write_rpm(path, name='mem%06d' % (i, ), files=options.files, directories=options.directories, changelogs=options.changelogs,
+                  requires=options.requires, provides=options.provides)
+        paths.append(path)
+    return paths
+
+
+def load(paths):
+    ''' open every package and decode all header entries, keeping the packages
+        but not their files
+    '''
+    packages = []
+    for path in paths:
+        with open(path, 'rb') as file:
+            package = YumPackage(file, checksum=None)
+        for header in (package.signature, package.header):
+            for entry in header:
+                pass
+        package.rpmfile = None
+        packages.append(package)
+    return packages
+
+
+def sharing(packages):
+    ''' (references, distinct objects) of the repeated strings of packages '''
+    references = 0
+    distinct = set()
+    for package in packages:
+        files = package.filelist
+        for strings in (files.column('username'), files.column('group'), files.dirnames,
+                        [prco.name for prco in package.requires], [prco.name for prco in package.provides]):
+            for string in strings:
+                references += 1
+                distinct.add(id(string))
+    return references, len(distinct)
+
+
+def run(count, options):
+    directory = tempfile.mkdtemp(prefix='pyrpm-memory-')
+    try:
+        paths = generate(directory, count, options)
+
+        gc.collect()
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            packages = load(paths)
+            gc.collect()
+            retained = tracemalloc.get_traced_memory()[0] - before
+        finally:
+            tracemalloc.stop()
+
+        entries = sum(len(package.signature.records) + len(package.header.records) for package in packages)
+        references, distinct = sharing(packages)
+        return {
+            'packages': count,
+            'retained': retained,
+            'per_package': retained / float(count),
+            'per_entry': retained / float(entries),
+            'string_references': references,
+            'distinct_strings': distinct,
+        }
+    finally:
+        shutil.rmtree(directory)
+
+
+def compare(results, baseline, threshold):
+    ''' runs retaining more than threshold times their baseline, as messages '''
+    previous = dict((result['packages'], result['per_package']) for result in baseline['results'])
+    regressions = []
+    for result in results:
+        size = previous.get(result['packages'])
+        if size and result['per_package'] > size * threshold:
+            regressions.append('%d packages: %.0f bytes per package, baseline %.0f' % (result['packages'], result['per_package'], size))
+    return regressions
+
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage='%prog [options]', description='measure the memory pyrpm retains per package')
+    parser.add_option('--packages', default='1000', help='numbers of packages, comma separated [default: %default]')
+    parser.add_option('--files', type='int', default=50, help='files per package [default: %default]')
+    parser.add_option('--directories', type='int', default=8, help='directories per package [default: %default]')
+    parser.add_option('--changelogs', type='int', default=10, help='changelog entries per package [default: %default]')
+    parser.add_option('--requires', type='int', default=20, help='requires per package [default: %default]')
+    parser.add_option('--provides', type='int', default=5, help='provides per package [default: %default]')
+    parser.add_option('-o', '--output', default=None, help='write the JSON results to OUTPUT instead of stdout')
+    parser.add_option('--baseline', default=None, help='JSON results of an earlier run to compare with')
+    parser.add_option('--threshold', type='float', default=1.1, help='growth against the baseline reported as regression [default: %default]')
+    options, args = parser.parse_args(argv)
+    if tracemalloc is None:
+        parser.error('tracemalloc is not available')
+
+    results = []
+    for count in [int(count) for count in options.packages.split(',')]:
+        result = run(count, options)
+        results.append(result)
+        sys.stderr.write('%8d packages %10.0f bytes/pkg %8.1f bytes/entry %8d strings in %d objects\n' % (
+            count, result['per_package'], result['per_entry'], result['string_references'], result['distinct_strings']))
+
+    document = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'config': dict((name, getattr(options, name)) for name in ('files', 'directories', 'changelogs', 'requires', 'provides')),
+        'results': results,
+    }
+    if options.output:
+        with open(options.output, 'w') as file:
+            json.dump(document, file, indent=2, sort_keys=True)
+    else:
+        json.dump(document, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+    if options.baseline:
+        with open(options.baseline) as file:
+            regressions = compare(results, json.load(file), options.threshold)
+        for regression in regressions:
+            sys.stderr.write('regression: %s\n' % (regression, ))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
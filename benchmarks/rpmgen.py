@@ -0,0 +1,179 @@
+'''
+synthetic RPM packages for benchmarks
+
+build_rpm assembles a complete package in memory: lead, signature header
+(size, sha1 and sha256 header digests, md5 of header and payload), main
+header with file list, changelog and dependencies, and a cpio payload
+compressed with gzip, bzip2 or xz. The packages are complete enough for
+pyrpm to read and verify them, they are not meant to be installed.
+'''
+import bz2
+import hashlib
+import struct
+import zlib
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+HEADER_MAGIC = b'\x8e\xad\xe8\x01\x00\x00\x00\x00'
+LEAD_MAGIC = b'\xed\xab\xee\xdb'
+
+NULL, CHAR, INT8, INT16, INT32, INT64, STRING, BIN, STRING_ARRAY, I18NSTRING = range(10)
+INTEGER_FORMATS = {INT8: 'b', INT16: 'h', INT32: 'i', INT64: 'q'}
+ALIGNMENT = {INT16: 2, INT32: 4, INT64: 8}
+
+# dependency flags
+EQ = 8
+GE = 12
+RPMLIB = 1 << 24
+
+FILE_MODE = 0o100644
+MTIME = 1400000000
+
+
+def _encode(value):
+    return value if isinstance(value, bytes) else value.encode('utf-8')
+
+
+def header(entries):
+    ''' header structure from (tag, type, value) entries, the value being an
+        int or list of ints, a string, bytes or a list of strings
+    '''
+    index = []
+    store = b''
+    for tag, type, value in sorted(entries):
+        if type in INTEGER_FORMATS:
+            values = value if isinstance(value, (list, tuple)) else [value]
+            store += b'\x00' * (-len(store) % ALIGNMENT.get(type, 1))
+            data = struct.pack('!%d%s' % (len(values), INTEGER_FORMATS[type]), *values)
+            count = len(values)
+        elif type == BIN:
+            data = value
+            count = len(value)
+        elif type == STRING_ARRAY:
+            data = b''.join(_encode(item) + b'\x00' for item in value)
+            count = len(value)
+        else:
+            data = _encode(value) + b'\x00'
+            count = 1
+        index.append(struct.pack('!iiii', tag, type, len(store), count))
+        store += data
+    return HEADER_MAGIC + struct.pack('!ii', len(index), len(store)) + b''.join(index) + store
+
+
+def lead(name, source=False):
+    return struct.pack('!4sBBhh66shh16s', LEAD_MAGIC, 3, 0, 1 if source else 0, 1, _encode(name)[:65], 1, 5, b'')
+
+
+def _cpio_entry(name, mode, data, inode):
+    name = _encode(name) + b'\x00'
+    fields = (inode, mode, 0, 0, 1, MTIME, len(data), 0, 0, 0, 0, len(name), 0)
+    entry = b'070701' + b''.join(('%08x' % (field, )).encode('ascii') for field in fields) + name
+    entry += b'\x00' * (-len(entry) % 4) + data
+    return entry + b'\x00' * (-len(entry) % 4)
+
+
+def cpio(files):
+    ''' newc cpio archive of (name, mode, data) members '''
+    archive = b''.join(_cpio_entry(name, mode, data, inode + 1) for inode, (name, mode, data) in enumerate(files))
+    return archive + _cpio_entry('TRAILER!!!', 0, b'', 0)
+
+
+def compress(data, compressor):
+    if compressor == 'gzip':
+        compressobj = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return compressobj.compress(data) + compressobj.flush()
+    if compressor == 'bzip2':
+        return bz2.compress(data)
+    if compressor == 'xz':
+        if lzma is None:
+            raise ValueError('xz compression needs the lzma module')
+        return lzma.compress(data)
+    raise ValueError('unknown compressor %s' % (compressor, ))
+
+
+def build_rpm(name='bench', version='1.0', release='1', epoch=None, arch='x86_64', files=10, file_size=256, directories=3,
+              changelogs=5, requires=5, provides=5, compressor='gzip', source=False):
+    ''' bytes of a synthetic package
+
+        files regular files of file_size bytes each are spread over
+        directories directories, the package gets changelogs changelog
+        entries, requires dependencies (plus rpmlib ones) and provides
+        provides (plus its own name).
+    '''
+    evr = '%s%s-%s' % ('%d:' % (epoch, ) if epoch is not None else '', version, release)
+
+    # files
+    dirnames = ['/usr/share/%s/dir%d/' % (name, i) for i in range(max(directories, 1))]
+    basenames = []
+    dirindexes = []
+    contents = []
+    for i in range(files):
+        dirindexes.append(i % len(dirnames))
+        basenames.append('file%d' % (i, ))
+        contents.append((('%s %d\n' % (name, i)) * file_size)[:file_size].encode('ascii'))
+    payload = cpio([('.' + dirnames[dirindex] + basename, FILE_MODE, data) for dirindex, basename, data in zip(dirindexes, basenames, contents)])
+
+    # dependencies
+    provide_names = [name] + ['%s-capability%d' % (name, i) for i in range(provides)]
+    provide_flags = [EQ] * len(provide_names)
+    provide_versions = [evr] * len(provide_names)
+    require_names = ['rpmlib(CompressedFileNames)', 'rpmlib(PayloadFilesHavePrefix)'] + ['requirement%d' % (i, ) for i in range(requires)]
+    require_flags = [RPMLIB | 10, RPMLIB | 10] + [GE if i % 2 else 0 for i in range(requires)]
+    require_versions = ['3.0.4-1', '4.0-1'] + ['1.%d' % (i, ) if i % 2 else '' for i in range(requires)]
+
+    entries = [
+        (1000, STRING, name), (1001, STRING, version), (1002, STRING, release),
+        (1004, I18NSTRING, 'synthetic package %s' % (name, )),
+        (1005, I18NSTRING, 'A synthetic package generated for benchmarks.\n' * 4),
+        (1006, INT32, MTIME), (1007, STRING, 'bench.example.com'), (1009, INT32, files * file_size),
+        (1011, STRING, 'pyrpm'), (1014, STRING, 'BSD'), (1015, STRING, 'pyrpm benchmarks'),
+        (1016, I18NSTRING, 'Development/Libraries'), (1020, STRING, 'https://example.com/'),
+        (1021, STRING, 'linux'), (1022, STRING, arch),
+        (1046, INT32, len(payload)),
+        (1047, STRING_ARRAY, provide_names), (1112, INT32, provide_flags), (1113, STRING_ARRAY, provide_versions),
+        (1049, STRING_ARRAY, require_names), (1048, INT32, require_flags), (1050, STRING_ARRAY, require_versions),
+        (1124, STRING, 'cpio'), (1125, STRING, compressor), (1126, STRING, '6'), (5011, INT32, 8),
+    ]
+    if epoch is not None:
+        entries.append((1003, INT32, epoch))
+    if not source:
+        entries.append((1044, STRING, '%s-%s-%s.src.rpm' % (name, version, release)))
+    if files:
+        entries += [
+            (1028, INT32, [file_size] * files), (1030, INT16, [FILE_MODE - 0x10000] * files),  # int16 is signed
+            (1033, INT16, [0] * files), (1034, INT32, [MTIME] * files),
+            (1035, STRING_ARRAY, [hashlib.sha256(data).hexdigest() for data in contents]),
+            (1036, STRING_ARRAY, [''] * files), (1037, INT32, [0] * files),
+            (1039, STRING_ARRAY, ['root'] * files), (1040, STRING_ARRAY, ['root'] * files),
+            (1095, INT32, [1] * files), (1096, INT32, list(range(1, files + 1))), (1097, STRING_ARRAY, [''] * files),
+            (1116, INT32, dirindexes), (1117, STRING_ARRAY, basenames), (1118, STRING_ARRAY, dirnames),
+        ]
+    if changelogs:
+        entries += [
+            (1080, INT32, [MTIME - i * 86400 for i in range(changelogs)]),
+            (1081, STRING_ARRAY, ['Packager <packager@example.com> - %s-%d' % (version, changelogs - i) for i in range(changelogs)]),
+            (1082, STRING_ARRAY, ['- change number %d\n- with a second line' % (changelogs - i, ) for i in range(changelogs)]),
+        ]
+    compressed = compress(payload, compressor)
+    entries += [(5092, STRING_ARRAY, [hashlib.sha256(compressed).hexdigest()]), (5093, INT32, 8)]
+    main_header = header(entries)
+
+    signature = header([
+        (1000, INT32, len(main_header) + len(compressed)),
+        (1004, BIN, hashlib.md5(main_header + compressed).digest()),
+        (1007, INT32, len(payload)),
+        (269, STRING, hashlib.sha1(main_header).hexdigest()),
+        (273, STRING, hashlib.sha256(main_header).hexdigest()),
+    ])
+    signature += b'\x00' * (-len(signature) % 8)
+
+    return lead('%s-%s' % (name, evr), source) + signature + main_header + compressed
+
+
+def write_rpm(path, **kwargs):
+    ''' write a synthetic package to path, see build_rpm for the arguments '''
+    with open(path, 'wb') as file:
+        file.write(build_rpm(**kwargs))
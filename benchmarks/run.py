@@ -0,0 +1,226 @@
+'''
+pyrpm benchmarks
+
+Generates repositories of synthetic packages (see rpmgen) and times reading
+them: header parsing, building the composite lists, checksumming, the
+YumPackage XML builders and YumRepository.save/read. Every stage records its
+wall time and the peak of the memory allocated while it ran (via tracemalloc,
+which slows the stages down, --no-memory gives clean times).
+
+The results are written as JSON; given a previous result file with
+--baseline, stages that got slower than --threshold times the baseline are
+reported and the exit status is 1.
+
+    python benchmarks/run.py --sizes 1,1000 --output results.json
+'''
+from contextlib import contextmanager
+import gc
+import json
+import optparse
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from timeit import default_timer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyrpm.rpm import RPM  # noqa: E402
+from pyrpm.tools.createrepo import YumRepository  # noqa: E402
+from pyrpm.yum import YumPackage  # noqa: E402
+
+from rpmgen import write_rpm  # noqa: E402
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+SIZES = (1, 1000, 50000)
+
+
+class Timers(object):
+    ''' wall time accumulated per stage '''
+
+    def __init__(self):
+        self.seconds = {}
+        self.order = []
+
+    @contextmanager
+    def __call__(self, stage):
+        start = default_timer()
+        try:
+            yield
+        finally:
+            if stage not in self.seconds:
+                self.seconds[stage] = 0.0
+                self.order.append(stage)
+            self.seconds[stage] += default_timer() - start
+
+
+def generate(directory, count, options):
+    ''' write count synthetic packages to directory, returns their paths '''
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, 'bench%06d-1.%d-1.x86_64.rpm' % (i, i % 7))
+        write_rpm(path, name='bench%06d' % (i, ), version='1.%d' % (i % 7, ), files=options.files, file_size=options.file_size,
+                  directories=options.directories, changelogs=options.changelogs, requires=options.requires, provides=options.provides,
+                  compressor=options.compressor)
+        paths.append(path)
+    return paths
+
+
+def parse(paths, timed):
+    for path in paths:
+        with timed('parse'):
+            RPM.open(path, checksum=None, composite=False).close()
+
+
+def composite(paths, timed):
+    for path in paths:
+        with RPM.open(path, checksum=None, composite=False) as rpm:
+            with timed('composite'):
+                rpm._match_composite()
+
+
+def checksum(paths, timed):
+    for path in paths:
+        with RPM.open(path, checksum='sha256', defer_checksum=True, composite=False) as rpm:
+            with timed('checksum'):
+                rpm.checksum
+
+
+def xml(paths, timed, repo):
+    for path in paths:
+        with YumPackage.open(path) as package:
+            package.location = os.path.basename(path)
+            with timed('xml_primary'):
+                primary = package.xml_primary_metadata()
+            with timed('xml_filelists'):
+                filelists = package.xml_filelists_metadata()
+            with timed('xml_other'):
+                other = package.xml_other_metadata()
+            repo._add_metadata(package.checksum, primary, filelists, other)
+
+
+def save(repo, timed):
+    with timed('save'):
+        repo.save()
+
+
+def read(directory, timed):
+    with timed('read'):
+        YumRepository(directory).read()
+
+
+def measure(function, memory, *args):
+    ''' run a pass of stages, returning {stage: seconds} and the peak of the
+        memory allocated meanwhile
+    '''
+    gc.collect()
+    timers = Timers()
+    if memory:
+        tracemalloc.start()
+    try:
+        function(*args + (timers, ))
+        peak = tracemalloc.get_traced_memory()[1] if memory else None
+    finally:
+        if memory:
+            tracemalloc.stop()
+    return [(stage, timers.seconds[stage], peak) for stage in timers.order]
+
+
+def run(size, options):
+    directory = tempfile.mkdtemp(prefix='pyrpm-bench-')
+    try:
+        start = default_timer()
+        paths = generate(directory, size, options)
+        sys.stderr.write('%d packages generated in %.1fs\n' % (size, default_timer() - start))
+
+        repo = YumRepository(directory)
+        memory = options.memory and tracemalloc is not None
+        results = []
+        for function, args in [
+                (parse, (paths, )),
+                (composite, (paths, )),
+                (checksum, (paths, )),
+                (lambda paths, timed: xml(paths, timed, repo), (paths, )),
+                (save, (repo, )),
+                (read, (directory, ))]:
+            for stage, seconds, peak in measure(function, memory, *args):
+                results.append({
+                    'packages': size,
+                    'stage': stage,
+                    'seconds': seconds,
+                    'per_package': seconds / size,
+                    'peak_memory': peak,
+                })
+        return results
+    finally:
+        shutil.rmtree(directory)
+
+
+def compare(results, baseline, threshold):
+    ''' stages slower than threshold times their baseline, as messages '''
+    previous = dict(((result['packages'], result['stage']), result['seconds']) for result in baseline['results'])
+    regressions = []
+    for result in results:
+        seconds = previous.get((result['packages'], result['stage']))
+        if seconds and result['seconds'] > seconds * threshold:
+            regressions.append('%s at %d packages: %.3fs, baseline %.3fs' % (result['stage'], result['packages'], result['seconds'], seconds))
+    return regressions
+
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage='%prog [options]', description='benchmark pyrpm on synthetic packages')
+    parser.add_option('--sizes', default=','.join(str(size) for size in SIZES), help='repository sizes in packages [default: %default]')
+    parser.add_option('--files', type='int', default=20, help='files per package [default: %default]')
+    parser.add_option('--file-size', type='int', default=256, help='bytes per file [default: %default]')
+    parser.add_option('--directories', type='int', default=4, help='directories per package [default: %default]')
+    parser.add_option('--changelogs', type='int', default=10, help='changelog entries per package [default: %default]')
+    parser.add_option('--requires', type='int', default=10, help='requires per package [default: %default]')
+    parser.add_option('--provides', type='int', default=5, help='provides per package [default: %default]')
+    parser.add_option('--compressor', default='gzip', choices=['gzip', 'bzip2', 'xz'], help='payload compressor [default: %default]')
+    parser.add_option('--no-memory', dest='memory', action='store_false', default=True, help='do not trace memory allocations')
+    parser.add_option('-o', '--output', default=None, help='write the JSON results to OUTPUT instead of stdout')
+    parser.add_option('--baseline', default=None, help='JSON results of an earlier run to compare with')
+    parser.add_option('--threshold', type='float', default=1.25, help='slowdown against the baseline reported as regression [default: %default]')
+    options, args = parser.parse_args(argv)
+
+    results = []
+    for size in [int(size) for size in options.sizes.split(',')]:
+        for result in run(size, options):
+            results.append(result)
+            sys.stderr.write('%8d %-14s %10.4fs %12.1fus/pkg %s\n' % (
+                size, result['stage'], result['seconds'], result['per_package'] * 1e6,
+                '' if result['peak_memory'] is None else '%.1fMiB' % (result['peak_memory'] / 1048576.0, )))
+
+    document = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'config': dict((name, getattr(options, name)) for name in ('files', 'file_size', 'directories', 'changelogs', 'requires', 'provides', 'compressor', 'memory')),
+        'results': results,
+    }
+    if options.output:
+        with open(options.output, 'w') as file:
+            json.dump(document, file, indent=2, sort_keys=True)
+    else:
+        json.dump(document, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+    if options.baseline:
+        with open(options.baseline) as file:
+            regressions = compare(results, json.load(file), options.threshold)
+        for regression in regressions:
+            sys.stderr.write('regression: %s\n' % (regression, ))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
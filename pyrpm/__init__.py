@@ -0,0 +1 @@
+from pyrpm.batch import scan
@@ -0,0 +1,113 @@
+'''
+Batch operations over many RPM files
+
+The functions here take a list of package paths and spread the work over a
+pool of worker processes. Results are yielded as they complete, one record per
+package; failures to read a package are reported in the record instead of
+aborting the whole batch.
+'''
+
+from collections import namedtuple
+import multiprocessing
+import multiprocessing.pool
+
+from pyrpm.rpm import RPM, Header, RPMError
+
+VerifyResult = namedtuple("VerifyResult", ['path', 'mismatches', 'error'])
+ScanResult = namedtuple("ScanResult", ['path', 'tags', 'checksum', 'error'])
+
+# values that are not header tags
+RPM_ATTRIBUTES = ('filesize', 'binary', 'source', 'canonical_filename')
+COMPOSITE_ATTRIBUTES = ('filelist', 'changelog', 'provides', 'requires', 'obsoletes', 'conflicts')
+
+
+def imap(function, items, workers=1, threads=False, chunksize=1):
+    ''' map function over items, in a pool of worker processes (or threads)
+        if there is more than one worker, yielding results as they complete
+    '''
+    if workers <= 1:
+        for item in items:
+            yield function(item)
+        return
+
+    pool = (multiprocessing.pool.ThreadPool if threads else multiprocessing.Pool)(workers)
+    try:
+        for result in pool.imap_unordered(function, items, chunksize):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _verify_payload(path):
+    try:
+        with RPM.open(path, checksum=None) as rpm:
+            return VerifyResult(path, rpm.verify_payload(), None)
+    except (RPMError, IOError, OSError) as e:
+        return VerifyResult(path, None, str(e))
+
+
+def verify_payloads(paths, workers=1):
+    ''' verify the payloads of the packages at paths, see RPM.verify_payload
+
+        Yields a VerifyResult per package, mismatches being None and error set
+        when the package could not be read.
+    '''
+    return imap(_verify_payload, paths, workers)
+
+
+def _verify_digests(job):
+    path, payload = job
+    try:
+        with RPM.open(path, checksum=None, composite=False) as rpm:
+            return VerifyResult(path, rpm.verify_digests(payload), None)
+    except (RPMError, IOError, OSError) as e:
+        return VerifyResult(path, None, str(e))
+
+
+def verify_digests(paths, payload=False, workers=1, threads=False):
+    ''' check the digests of the packages at paths, see RPM.verify_digests
+
+        Only the headers are read unless payload is set. Yields a VerifyResult
+        per package in completion order, mismatches being None and error set
+        when the package could not be read or has no digests.
+    '''
+    return imap(_verify_digests, ((path, payload) for path in paths), workers, threads, chunksize=16)
+
+
+def _tag_value(rpm, tag):
+    if tag in Header.TAGS:
+        return getattr(rpm.header, tag)
+    if tag in RPM_ATTRIBUTES or tag in COMPOSITE_ATTRIBUTES:
+        return getattr(rpm, tag)
+    return rpm.header.get(tag)
+
+
+def _scan(job):
+    path, tags, checksum = job
+    composite = any(tag in COMPOSITE_ATTRIBUTES for tag in tags)
+    try:
+        with RPM.open(path, checksum=checksum, composite=composite) as rpm:
+            return ScanResult(path, dict((tag, _tag_value(rpm, tag)) for tag in tags), rpm.checksum, None)
+    except (RPMError, IOError, OSError) as e:
+        return ScanResult(path, None, None, str(e))
+
+
+def scan(paths, tags=('name', 'epoch', 'version', 'release', 'architecture'), workers=1, threads=False, checksum=None):
+    ''' read selected tags of many packages
+
+        Only the lead, signature and header of each package are read and only
+        the requested tags are decoded. tags can name header values (the
+        attribute names of Header, e.g. 'name'), header tag numbers, the RPM
+        attributes filesize, binary, source and canonical_filename, or one of
+        the composite lists (filelist, changelog, provides, requires,
+        obsoletes, conflicts), which are only built when asked for. The
+        package file is hashed only if a checksum algorithm is given.
+
+        Yields a ScanResult per package in completion order, tags mapping the
+        requested tags to their values, or error set if the package could not
+        be read. The packages are spread over a pool of worker processes, or
+        threads with threads set.
+    '''
+    tags = tuple(tags)
+    return imap(_scan, ((path, tags, checksum) for path in paths), workers, threads, chunksize=16)
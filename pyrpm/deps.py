@@ -0,0 +1,182 @@
+'''
+Dependency index over a set of packages
+
+The index maps capability names and file paths to the packages providing
+them, so what-provides and what-requires lookups are a dictionary access
+followed by an EVR range check on the (usually few) candidates. A
+repoclosure over the whole index checks every require of every package this
+way.
+'''
+
+from collections import namedtuple
+
+from pyrpm.version import flags_value, ranges_overlap
+
+Package = namedtuple("Package", ['pkgid', 'name', 'arch', 'epoch', 'version', 'release'])
+Capability = namedtuple("Capability", ['name', 'flags', 'version'])
+Unresolved = namedtuple("Unresolved", ['package', 'requirement'])
+
+COMMON_NS = '{http://linux.duke.edu/metadata/common}'
+RPM_NS = '{http://linux.duke.edu/metadata/rpm}'
+FILELISTS_NS = '{http://linux.duke.edu/metadata/filelists}'
+
+NO_VERSION = (None, None, None)
+
+
+def _nevra(package):
+    epoch = '%s:' % (package.epoch, ) if package.epoch and package.epoch != '0' else ''
+    return '%s-%s%s-%s.%s' % (package.name, epoch, package.version, package.release, package.arch)
+
+
+def _xml_capabilities(format, pcotype):
+    return [Capability(entry.get('name'), flags_value(entry.get('flags')), (entry.get('epoch'), entry.get('ver'), entry.get('rel')))
+            for entry in format.findall('%s%s/%sentry' % (RPM_NS, pcotype, RPM_NS))]
+
+
+class DependencyIndex(object):
+    ''' what-provides / what-requires index over packages
+
+        Packages are added from YumPackage (or RPM) objects or from the
+        primary (and optionally filelists) metadata of a YumRepository.
+        Requires on rpmlib() capabilities are satisfied by rpm itself and are
+        not indexed.
+    '''
+
+    def __init__(self):
+        self.packages = {}
+        # capability name -> [(pkgid, flags, evr)]
+        self.provides = {}
+        self.requires = {}
+        # file path -> [pkgid]
+        self.files = {}
+
+    def __len__(self):
+        return len(self.packages)
+
+    @classmethod
+    def from_packages(cls, packages):
+        index = cls()
+        for package in packages:
+            index.add_package(package)
+        return index
+
+    @classmethod
+    def from_repository(cls, repository, filelists=False):
+        index = cls()
+        index.add_repository(repository, filelists)
+        return index
+
+    def add(self, package, provides=(), requires=(), files=()):
+        ''' add a Package with its provides and requires (Capability
+            sequences) and its file paths
+        '''
+        pkgid = package.pkgid
+        self.packages[pkgid] = package
+        for capability in provides:
+            self.provides.setdefault(capability.name, []).append((pkgid, capability.flags, capability.version))
+        for capability in requires:
+            if capability.name.startswith('rpmlib('):
+                continue
+            self.requires.setdefault(capability.name, []).append((pkgid, capability.flags, capability.version))
+        for path in files:
+            providers = self.files.setdefault(path, [])
+            if not providers or providers[-1] != pkgid:
+                providers.append(pkgid)
+
+    def add_package(self, package):
+        ''' add a YumPackage (or RPM), identified by its checksum if it has
+            one, by its NEVRA otherwise
+        '''
+        header = package.header
+        files = package.filelist
+        info = Package(package.checksum, header.name, header.architecture if package.binary else 'src',
+                       str(header.epoch), header.version, header.release)
+        if info.pkgid is None:
+            info = info._replace(pkgid=_nevra(info))
+        self.add(
+            info,
+            [Capability(prco.name, flags_value(prco.flags), prco.version) for prco in package.provides],
+            [Capability(prco.name, flags_value(prco.flags), prco.version) for prco in package.requires],
+            files.names if hasattr(files, 'names') else [file.name for file in files])
+
+    def add_node(self, node, files=None):
+        ''' add a package from its primary metadata node, with the file paths
+            of its filelists node if given (the primary node only lists the
+            files commonly required)
+        '''
+        version = node.find(COMMON_NS + 'version')
+        format = node.find(COMMON_NS + 'format')
+        if format is None:
+            format = node
+        if files is None:
+            files = format.findall(FILELISTS_NS + 'file') + format.findall(COMMON_NS + 'file')
+        self.add(
+            Package(node.findtext(COMMON_NS + 'checksum'), node.findtext(COMMON_NS + 'name'), node.findtext(COMMON_NS + 'arch'),
+                    version.get('epoch'), version.get('ver'), version.get('rel')),
+            _xml_capabilities(format, 'provides'),
+            _xml_capabilities(format, 'requires'),
+            [file.text for file in files])
+
+    def add_repository(self, repository, filelists=False):
+        ''' add the packages of a YumRepository, from its loaded package nodes
+            or streamed from its repodata
+
+            With filelists the complete file lists are indexed, otherwise only
+            the files listed in the primary metadata are.
+        '''
+        if repository.primary_data:
+            for pkgid, node in repository.primary_data.items():
+                files = repository.filelists_data.get(pkgid) if filelists else None
+                self.add_node(node, None if files is None else files.findall(FILELISTS_NS + 'file'))
+            return
+
+        types = ('primary', 'filelists') if filelists else ('primary', )
+        for pkgid, primary, files, other in repository.iter_packages(types):
+            self.add_node(primary, None if files is None else files.findall(FILELISTS_NS + 'file'))
+
+    def what_provides(self, name, flags=0, version=NO_VERSION):
+        ''' pkgids of the packages providing the capability (or file) name,
+            within the version range given by flags and version
+        '''
+        flags = flags_value(flags)
+        result = [pkgid for pkgid, pflags, pversion in self.provides.get(name, ())
+                  if ranges_overlap(pflags, pversion, flags, version)]
+        if name.startswith('/'):
+            result.extend(pkgid for pkgid in self.files.get(name, ()) if pkgid not in result)
+        return result
+
+    def what_requires(self, name, flags=0, version=NO_VERSION):
+        ''' pkgids of the packages requiring the capability name, restricted
+            to the requires a provide of name with flags and version satisfies
+        '''
+        flags = flags_value(flags)
+        result = []
+        for pkgid, rflags, rversion in self.requires.get(name, ()):
+            if pkgid not in result and ranges_overlap(flags, version, rflags, rversion):
+                result.append(pkgid)
+        return result
+
+    def is_satisfied(self, name, flags=0, version=NO_VERSION):
+        ''' whether any package satisfies the requirement '''
+        for pkgid, pflags, pversion in self.provides.get(name, ()):
+            if ranges_overlap(pflags, pversion, flags, version):
+                return True
+        return name.startswith('/') and name in self.files
+
+    def closure(self):
+        ''' list the requires no package in the index satisfies, as
+            Unresolved tuples sorted by package
+        '''
+        unresolved = []
+        for name, requirers in self.requires.items():
+            if name.startswith('/') and name in self.files:
+                continue
+            providers = self.provides.get(name, ())
+            for pkgid, flags, version in requirers:
+                for _, pflags, pversion in providers:
+                    if ranges_overlap(pflags, pversion, flags, version):
+                        break
+                else:
+                    unresolved.append(Unresolved(self.packages[pkgid], Capability(name, flags, version)))
+        unresolved.sort(key=lambda item: (item.package.name, item.package.pkgid, item.requirement.name))
+        return unresolved
@@ -0,0 +1,362 @@
+'''
+File ownership index over a set of packages
+
+PathIndex collects the file lists of packages with every directory name
+stored once and, per package, only the directory numbers and basenames of
+its files. It is compiled into a flat, sorted binary layout in which exact
+paths and path prefixes are found by binary search; PathIndexFile answers
+queries directly on that layout, so a saved index is memory-mapped and
+queried without being loaded.
+
+Layout (all integers unsigned 32 bit little-endian):
+
+    header      magic, version and the counts and offsets below
+    packages    offsets into the package string blob (count + 1)
+    dirnames    sorted, offsets into the dirname blob (count + 1)
+    dir_entries first entry of every dirname (count + 1)
+    entries     basename number of every entry, sorted by basename within
+                their directory
+    postings    first posting of every entry (count + 1)
+    basenames   offsets into the basename blob (count + 1), every distinct
+                basename is stored once
+    owners      package numbers, the postings of the entries
+    blobs       UTF-8 strings of packages, dirnames and basenames
+'''
+
+import mmap
+import struct
+import sys
+
+from pyrpm.rpm import _intern
+
+FILELISTS_NS = '{http://linux.duke.edu/metadata/filelists}'
+
+MAGIC = b'PYRPMPIX'
+VERSION = 1
+
+_UINT32 = struct.Struct('<I')
+_RANGE = struct.Struct('<2I')
+# magic, version, counts of packages, dirnames, entries, basenames and owners,
+# offsets of the sections
+_HEADER = struct.Struct('<8s6I10I')
+
+if sys.version < '3':
+    def _decode(data):
+        return data
+else:
+    def _decode(data):
+        return data.decode('utf-8', 'surrogateescape')
+
+
+def _encode(text):
+    if isinstance(text, bytes):
+        return text
+    if sys.version < '3':
+        return text.encode('utf-8')
+    return text.encode('utf-8', 'surrogateescape')
+
+
+def _split(path):
+    ''' split path into its dirname (with the trailing slash) and basename '''
+    slash = path.rfind(b'/' if isinstance(path, bytes) else '/') + 1
+    return path[:slash], path[slash:]
+
+
+def _uint32_array(values):
+    return struct.pack('<%dI' % (len(values), ), *values)
+
+
+def _string_table(strings):
+    ''' offsets (one more than strings) and blob of encoded strings '''
+    offsets = [0]
+    for string in strings:
+        offsets.append(offsets[-1] + len(string))
+    return offsets, b''.join(strings)
+
+
+class PathIndex(object):
+    ''' which-package-owns-this-path index, built from YumPackage file lists
+        or the filelists metadata of a YumRepository
+
+        Packages are identified by their checksum (pkgid). Queries compile the
+        index once into the layout of PathIndexFile, adding packages
+        afterwards compiles it again on the next query.
+    '''
+
+    def __init__(self):
+        self.packages = []
+        # dirname -> dirname number
+        self.dirnames = {}
+        # per package: (array of dirname numbers, basenames) of its files
+        self.postings = []
+        self._compiled = None
+
+    def __len__(self):
+        return len(self.packages)
+
+    @classmethod
+    def from_packages(cls, packages):
+        index = cls()
+        for package in packages:
+            index.add_package(package)
+        return index
+
+    @classmethod
+    def from_repository(cls, repository):
+        index = cls()
+        index.add_repository(repository)
+        return index
+
+    def _dirname(self, dirname):
+        number = self.dirnames.get(dirname)
+        if number is None:
+            number = self.dirnames[dirname] = len(self.dirnames)
+        return number
+
+    def add_files(self, pkgid, dirnames, basenames):
+        ''' add package pkgid owning the files with the given dirnames (ending
+            with a slash) and basenames
+        '''
+        self.packages.append(pkgid)
+        self.postings.append((_uint32_array([self._dirname(dirname) for dirname in dirnames]), [_intern(basename) for basename in basenames]))
+        self._compiled = None
+
+    def add(self, pkgid, paths):
+        ''' add package pkgid owning the files at paths '''
+        dirnames = []
+        basenames = []
+        for path in paths:
+            dirname, basename = _split(path)
+            dirnames.append(dirname)
+            basenames.append(basename)
+        self.add_files(pkgid, dirnames, basenames)
+
+    def add_package(self, package):
+        ''' add a YumPackage (or RPM), identified by its checksum '''
+        files = package.filelist
+        if hasattr(files, 'dirindexes'):
+            # FileTable, the header already stores the paths split
+            dirnames = files.dirnames
+            self.add_files(package.checksum, [dirnames[dirindex] for dirindex in files.dirindexes], files.basenames)
+        else:
+            self.add(package.checksum, [file.name for file in files])
+
+    def add_node(self, node):
+        ''' add a package from its filelists metadata node '''
+        self.add(node.get('pkgid'), [file.text for file in node.findall(FILELISTS_NS + 'file')])
+
+    def add_repository(self, repository):
+        ''' add the packages of a YumRepository, from its loaded filelists
+            nodes or streamed from its repodata
+        '''
+        if repository.filelists_data:
+            for node in repository.filelists_data.values():
+                self.add_node(node)
+            return
+
+        for pkgid, node in repository.iter_metadata('filelists'):
+            self.add_node(node)
+
+    def tobytes(self):
+        ''' the index in the layout of PathIndexFile '''
+        dirnames = sorted((_encode(dirname), number) for dirname, number in self.dirnames.items())
+        dirname_order = [0] * len(dirnames)
+        for position, (dirname, number) in enumerate(dirnames):
+            dirname_order[number] = position
+
+        # (dirname position, basename) -> package numbers
+        entries = {}
+        for package, (dirindexes, basenames) in enumerate(self.postings):
+            for dirindex, basename in zip(struct.unpack('<%dI' % (len(dirindexes) // 4, ), dirindexes), basenames):
+                owners = entries.setdefault((dirname_order[dirindex], _encode(basename)), [])
+                if not owners or owners[-1] != package:
+                    owners.append(package)
+
+        basename_numbers = {}
+        dir_entries = [0] * (len(dirnames) + 1)
+        entry_basenames = []
+        postings = [0]
+        owners = []
+        for (dirname, basename), packages in sorted(entries.items()):
+            dir_entries[dirname + 1] += 1
+            number = basename_numbers.get(basename)
+            if number is None:
+                number = basename_numbers[basename] = len(basename_numbers)
+            entry_basenames.append(number)
+            owners.extend(packages)
+            postings.append(len(owners))
+        for position in range(len(dirnames)):
+            dir_entries[position + 1] += dir_entries[position]
+
+        package_offsets, package_blob = _string_table([_encode(pkgid) for pkgid in self.packages])
+        dirname_offsets, dirname_blob = _string_table([dirname for dirname, number in dirnames])
+        basename_offsets, basename_blob = _string_table([basename for basename, number in sorted(basename_numbers.items(), key=lambda item: item[1])])
+
+        sections = [
+            _uint32_array(package_offsets),
+            _uint32_array(dirname_offsets),
+            _uint32_array(dir_entries),
+            _uint32_array(entry_basenames),
+            _uint32_array(postings),
+            _uint32_array(basename_offsets),
+            _uint32_array(owners),
+            package_blob,
+            dirname_blob,
+            basename_blob,
+        ]
+        offsets = []
+        offset = _HEADER.size
+        for section in sections:
+            offsets.append(offset)
+            offset += len(section)
+        header = _HEADER.pack(MAGIC, VERSION, len(self.packages), len(dirnames), len(entry_basenames), len(basename_numbers), len(owners), *offsets)
+        return header + b''.join(sections)
+
+    def save(self, path):
+        ''' write the index to path, see PathIndexFile.open '''
+        with open(path, 'wb') as file:
+            file.write(self.tobytes())
+
+    def _index(self):
+        if self._compiled is None:
+            self._compiled = PathIndexFile(self.tobytes())
+        return self._compiled
+
+    def what_owns(self, path):
+        ''' pkgids of the packages owning path '''
+        return self._index().what_owns(path)
+
+    def search(self, prefix):
+        ''' (path, pkgids) of the paths starting with prefix, see
+            PathIndexFile.search
+        '''
+        return self._index().search(prefix)
+
+
+class PathIndexFile(object):
+    ''' read-only path index queried in place, on the bytes (or memory map)
+        written by PathIndex
+    '''
+
+    def __init__(self, buffer):
+        if len(buffer) < _HEADER.size:
+            raise ValueError('truncated path index')
+        header = _HEADER.unpack_from(buffer, 0)
+        if header[0] != MAGIC:
+            raise ValueError('not a path index')
+        if header[1] != VERSION:
+            raise ValueError('unsupported path index version %d' % (header[1], ))
+        self.buffer = buffer
+        (self.package_count, self.dirname_count, self.entry_count, self.basename_count, self.owner_count,
+         self._packages, self._dirnames, self._dir_entries, self._entries, self._postings, self._basenames, self._owners,
+         self._package_blob, self._dirname_blob, self._basename_blob) = header[2:]
+
+    @classmethod
+    def open(cls, path):
+        ''' open the index saved at path through a read-only memory map '''
+        with open(path, 'rb') as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return cls(mapped)
+        except:
+            mapped.close()
+            raise
+
+    def close(self):
+        if hasattr(self.buffer, 'close'):
+            self.buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self.package_count
+
+    def _range(self, table, index):
+        return _RANGE.unpack_from(self.buffer, table + 4 * index)
+
+    def _string(self, table, blob, index):
+        start, end = _RANGE.unpack_from(self.buffer, table + 4 * index)
+        return self.buffer[blob + start:blob + end]
+
+    def _dirname(self, index):
+        return self._string(self._dirnames, self._dirname_blob, index)
+
+    def _basename(self, entry):
+        return self._string(self._basenames, self._basename_blob, _UINT32.unpack_from(self.buffer, self._entries + 4 * entry)[0])
+
+    def _pkgids(self, entry):
+        start, end = self._range(self._postings, entry)
+        buffer, owners = self.buffer, self._owners
+        return [_decode(self._string(self._packages, self._package_blob, _UINT32.unpack_from(buffer, owners + 4 * i)[0])) for i in range(start, end)]
+
+    @staticmethod
+    def _bisect(key, value, lo, hi):
+        ''' first index in lo to hi whose key is not below value '''
+        while lo < hi:
+            middle = (lo + hi) // 2
+            if key(middle) < value:
+                lo = middle + 1
+            else:
+                hi = middle
+        return lo
+
+    def _find_dirname(self, dirname):
+        index = self._bisect(self._dirname, dirname, 0, self.dirname_count)
+        if index < self.dirname_count and self._dirname(index) == dirname:
+            return index
+        return None
+
+    def package(self, number):
+        ''' pkgid of a package by its number '''
+        return _decode(self._string(self._packages, self._package_blob, number))
+
+    def what_owns(self, path):
+        ''' pkgids of the packages owning path '''
+        dirname, basename = _split(_encode(path))
+        index = self._find_dirname(dirname)
+        if index is None:
+            return []
+        start, end = self._range(self._dir_entries, index)
+        entry = self._bisect(self._basename, basename, start, end)
+        if entry < end and self._basename(entry) == basename:
+            return self._pkgids(entry)
+        return []
+
+    def _entries_from(self, dirname, start, end, basename_prefix=b''):
+        if basename_prefix:
+            start = self._bisect(self._basename, basename_prefix, start, end)
+        for entry in range(start, end):
+            basename = self._basename(entry)
+            if not basename.startswith(basename_prefix):
+                break
+            yield _decode(dirname + basename), self._pkgids(entry)
+
+    def search(self, prefix):
+        ''' iterate over the (path, pkgids) of all paths starting with prefix,
+            grouped by directory
+        '''
+        prefix = _encode(prefix)
+        dirname, basename = _split(prefix)
+
+        # the directory the prefix ends in, files starting with basename
+        if basename:
+            index = self._find_dirname(dirname)
+            if index is not None:
+                start, end = self._range(self._dir_entries, index)
+                for item in self._entries_from(dirname, start, end, basename):
+                    yield item
+
+        # all files of the directories starting with prefix
+        index = self._bisect(self._dirname, prefix, 0, self.dirname_count)
+        while index < self.dirname_count:
+            dirname = self._dirname(index)
+            if not dirname.startswith(prefix):
+                break
+            start, end = self._range(self._dir_entries, index)
+            for item in self._entries_from(dirname, start, end):
+                yield item
+            index += 1
@@ -0,0 +1,303 @@
+'''
+RPM payload access
+
+The payload of a RPM package is a compressed cpio archive following the
+header. It is decompressed on the fly in bounded chunks and its members are
+handed out one at a time with file-like readers, so payloads of any size can
+be processed without holding them in memory.
+'''
+
+import bz2
+import errno
+import os
+import os.path
+import stat
+import zlib
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+from pyrpm.rpm import RPMError
+
+DECOMPRESSION_ERRORS = (zlib.error, IOError, OSError, EOFError, ValueError)
+if lzma is not None:
+    DECOMPRESSION_ERRORS += (lzma.LZMAError, )
+
+CHUNK_SIZE = 64 * 1024
+
+CPIO_MAGIC = (b'070701', b'070702')
+CPIO_HEADER_SIZE = 110
+CPIO_TRAILER = 'TRAILER!!!'
+
+
+def _decompressor(compressor):
+    ''' create a decompressor for the payload compressor named in the header '''
+    if compressor in (None, 'gzip'):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if compressor == 'bzip2':
+        return bz2.BZ2Decompressor()
+    if compressor in ('xz', 'lzma'):
+        if lzma is None:
+            raise RPMError('%s compressed payloads need the lzma module' % (compressor, ))
+        return lzma.LZMADecompressor(lzma.FORMAT_XZ if compressor == 'xz' else lzma.FORMAT_ALONE)
+    raise RPMError('unsupported payload compressor %s' % (compressor, ))
+
+
+class DecompressingReader(object):
+    ''' file-like reader decompressing a compressed stream on the fly
+
+        Compressed data is read in chunks of chunk_size and at most
+        chunk_size bytes are decompressed at a time (where the decompressor
+        allows to bound its output), so memory use stays bounded.
+    '''
+
+    def __init__(self, file, compressor, chunk_size=CHUNK_SIZE):
+        self.file = file
+        self.decompressor = _decompressor(compressor)
+        self.chunk_size = chunk_size
+        self.buffer = b''
+        self.pending = b''
+        self.eof = False
+
+    def _decompress(self):
+        ''' decompress the next piece of data into the buffer '''
+        try:
+            self._decompress_chunk()
+        except DECOMPRESSION_ERRORS as e:
+            raise RPMError('corrupt payload: %s' % (e, ))
+
+    def _decompress_chunk(self):
+        decompressor = self.decompressor
+        if getattr(decompressor, 'eof', False):
+            self.eof = True
+            return
+
+        if hasattr(decompressor, 'unconsumed_tail'):  # zlib
+            if not self.pending:
+                self.pending = self.file.read(self.chunk_size)
+                if not self.pending:
+                    self.eof = True
+                    return
+            data = decompressor.decompress(self.pending, self.chunk_size)
+            self.pending = decompressor.unconsumed_tail
+        elif hasattr(decompressor, 'needs_input'):  # bz2 and lzma
+            compressed = b''
+            if decompressor.needs_input:
+                compressed = self.file.read(self.chunk_size)
+                if not compressed:
+                    self.eof = True
+                    return
+            data = decompressor.decompress(compressed, self.chunk_size)
+        else:
+            compressed = self.file.read(self.chunk_size)
+            if not compressed:
+                self.eof = True
+                return
+            data = decompressor.decompress(compressed)
+        self.buffer += data
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            while not self.eof:
+                self._decompress()
+            data, self.buffer = self.buffer, b''
+            return data
+
+        while len(self.buffer) < size and not self.eof:
+            self._decompress()
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def close(self):
+        ''' drop the buffered data, the compressed file is left open '''
+        self.buffer = b''
+        self.pending = b''
+        self.eof = True
+
+
+class CpioEntry(object):
+    ''' member of a cpio archive, reading returns its data
+
+        An entry can only be read until the next entry of the archive is
+        requested.
+    '''
+
+    FIELDS = ('inode', 'mode', 'uid', 'gid', 'nlink', 'mtime', 'size', 'devmajor', 'devminor', 'rdevmajor', 'rdevminor', 'namesize', 'check')
+
+    def __init__(self, archive, header, name):
+        self.archive = archive
+        for field, value in zip(self.FIELDS, header):
+            setattr(self, field, value)
+        self.name = name
+        self.remaining = self.size
+
+    def __repr__(self):
+        return 'CpioEntry(%r, mode=%o, size=%d)' % (self.name, self.mode, self.size)
+
+    def isreg(self):
+        return stat.S_ISREG(self.mode)
+
+    def isdir(self):
+        return stat.S_ISDIR(self.mode)
+
+    def islnk(self):
+        return stat.S_ISLNK(self.mode)
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.archive._read(size)
+        self.remaining -= len(data)
+        return data
+
+
+class CpioArchive(object):
+    ''' reader for new ascii (newc) cpio archives as used in RPM payloads '''
+
+    def __init__(self, file):
+        self.file = file
+        self.offset = 0
+        self.entry = None
+
+    def __iter__(self):
+        while True:
+            entry = self.next_entry()
+            if entry is None:
+                return
+            yield entry
+
+    def _read(self, size):
+        data = self.file.read(size)
+        if len(data) != size:
+            raise RPMError('truncated payload')
+        self.offset += size
+        return data
+
+    def _skip(self, size):
+        while size > 0:
+            size -= len(self._read(min(size, CHUNK_SIZE)))
+
+    def _align(self):
+        self._skip(-self.offset % 4)
+
+    def next_entry(self):
+        ''' move to the next entry of the archive, None at its end '''
+        if self.entry is not None:
+            self._skip(self.entry.remaining)
+            self.entry.remaining = 0
+            self._align()
+            self.entry = None
+
+        data = self._read(CPIO_HEADER_SIZE)
+        if data[:6] not in CPIO_MAGIC:
+            raise RPMError('invalid payload, unknown cpio format')
+        try:
+            header = [int(data[i:i + 8], 16) for i in range(6, CPIO_HEADER_SIZE, 8)]
+        except ValueError:
+            raise RPMError('invalid payload, corrupt cpio header')
+
+        name = self._read(header[11])[:-1]
+        try:
+            name = name.decode('utf-8')
+        except UnicodeError:
+            name = name.decode('iso-8859-1')
+        self._align()
+
+        if name == CPIO_TRAILER:
+            return None
+        self.entry = CpioEntry(self, header, name)
+        return self.entry
+
+
+def _inside(root, path):
+    ''' whether path is root or below it, both normalized '''
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+
+def _target(directory, root, entry):
+    ''' path inside directory to extract entry to, refusing to leave it
+
+        root is the resolved directory. The parent of the path is resolved as
+        well, so symbolic links extracted before cannot redirect the entry.
+    '''
+    parts = [part for part in entry.name.split('/') if part not in ('', '.')]
+    if not parts or '..' in parts:
+        raise RPMError('refusing to extract %s' % (entry.name, ))
+    path = os.path.join(directory, *parts)
+    if not _inside(root, os.path.realpath(os.path.dirname(path))):
+        raise RPMError('refusing to extract %s outside of %s' % (entry.name, directory))
+    return path
+
+
+def extract(entries, directory):
+    ''' extract cpio entries into directory
+
+        Regular files, directories, symbolic links and hard links are
+        created, other file types are skipped. Entries whose path would leave
+        directory, also through a symbolic link, and symbolic links that are
+        absolute or point outside of directory are refused with RPMError.
+    '''
+    root = os.path.realpath(directory)
+    links = {}
+    directories = []
+    for entry in entries:
+        path = _target(directory, root, entry)
+        parent = os.path.dirname(path)
+        if not os.path.isdir(parent):
+            os.makedirs(parent)
+
+        # never write through a symbolic link left by an earlier entry
+        if os.path.islink(path) and not entry.islnk():
+            os.remove(path)
+
+        if entry.isdir():
+            if not os.path.isdir(path):
+                os.makedirs(path)
+            directories.append((path, entry))
+            continue
+
+        if entry.islnk():
+            target = entry.read().decode('utf-8')
+            if os.path.isabs(target) or not _inside(root, os.path.normpath(os.path.join(os.path.realpath(parent), target))):
+                raise RPMError('refusing to extract %s, its link target %s is outside of %s' % (entry.name, target, directory))
+            if os.path.lexists(path):
+                os.remove(path)
+            os.symlink(target, path)
+            continue
+
+        if not entry.isreg():
+            continue
+
+        # hard linked files carry their data in the last link only
+        key = (entry.devmajor, entry.devminor, entry.inode)
+        if entry.nlink > 1 and entry.size == 0:
+            links.setdefault(key, []).append(path)
+            continue
+
+        with open(path, 'wb') as file:
+            data = entry.read(CHUNK_SIZE)
+            while data:
+                file.write(data)
+                data = entry.read(CHUNK_SIZE)
+        os.chmod(path, entry.mode & 0o777)
+        os.utime(path, (entry.mtime, entry.mtime))
+
+        for link in links.pop(key, []):
+            try:
+                os.link(path, link)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+
+    # hard linked empty files
+    for paths in links.values():
+        open(paths[0], 'wb').close()
+        for link in paths[1:]:
+            os.link(paths[0], link)
+
+    # apply directory modes last, read-only directories have to be filled first
+    for path, entry in reversed(directories):
+        os.chmod(path, entry.mode & 0o777)
+        os.utime(path, (entry.mtime, entry.mtime))
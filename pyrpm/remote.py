@@ -0,0 +1,269 @@
+'''
+Reading packages over HTTP
+
+HTTPRangeFile is a read-only file object for a URL, it fetches the bytes it
+is asked for with HTTP range requests over one keep-alive connection.
+open_url reads a package from a URL fetching only its lead, signature and
+header, located by the sizes stored in them; the payload (and the rest of
+the file for a checksum) is fetched lazily when it is read.
+'''
+import errno
+import struct
+import sys
+
+from pyrpm.rpm import RPM, RPMError
+
+if sys.version < '3':
+    import httplib as http_client
+    from urlparse import urlsplit
+else:
+    import http.client as http_client
+    from urllib.parse import urlsplit
+
+LEAD_SIZE = 96
+HEADER_INTRO_SIZE = 16
+
+# socket errors of a connection closed by the server
+_DISCONNECT_ERRNOS = (errno.ECONNRESET, errno.ECONNABORTED, errno.EPIPE)
+
+
+def parse_url(url):
+    ''' the connection class, host and path (with the query) of an http or
+        https url
+    '''
+    parts = urlsplit(url)
+    if parts.scheme == 'http':
+        connection_class = http_client.HTTPConnection
+    elif parts.scheme == 'https':
+        connection_class = http_client.HTTPSConnection
+    else:
+        raise ValueError('unsupported URL %s' % (url, ))
+    return connection_class, parts.netloc, (parts.path or '/') + ('?' + parts.query if parts.query else '')
+
+
+def connect(connection_class, host, timeout=None):
+    ''' a new connection to host, with the default socket timeout if timeout
+        is None
+    '''
+    if timeout is None:
+        return connection_class(host)
+    return connection_class(host, timeout=timeout)
+
+
+def disconnected(error):
+    ''' whether error means the server closed the keep-alive connection, the
+        request can then be repeated on a new one
+
+        Refused connections and timeouts are not.
+    '''
+    if isinstance(error, (http_client.BadStatusLine, http_client.CannotSendRequest)):
+        return True
+    return isinstance(error, EnvironmentError) and error.errno in _DISCONNECT_ERRNOS
+
+
+class HTTPRangeFile(object):
+    ''' read-only, seekable file fetching its data with HTTP range requests
+
+        Reads are served from a buffer holding the last fetched data, reads
+        beyond it fetch at least block_size bytes. Data fetched right after
+        the buffer is appended to it as long as the buffer stays below
+        max_buffer bytes. requests and bytes_fetched count the traffic.
+    '''
+
+    BLOCK_SIZE = 256 * 1024
+    MAX_BUFFER = 16 * 1024 * 1024
+
+    def __init__(self, url, block_size=BLOCK_SIZE, max_buffer=MAX_BUFFER, timeout=None, headers=None):
+        self.connection_class, self.host, self.path = parse_url(url)
+        self.url = url
+        self.block_size = block_size
+        self.max_buffer = max_buffer
+        self.timeout = timeout
+        self.headers = dict(headers or {})
+
+        self.connection = None
+        self.position = 0
+        self.size = None
+        self.buffer = b''
+        self.buffer_start = 0
+        self.requests = 0
+        self.bytes_fetched = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def _connect(self):
+        if self.connection is None:
+            self.connection = connect(self.connection_class, self.host, self.timeout)
+        return self.connection
+
+    def _request(self, start, end=None):
+        ''' GET bytes start to end (exclusive, None for the end of the file),
+            returns the status, the response and its body
+        '''
+        headers = dict(self.headers)
+        headers['Range'] = 'bytes=%d-%s' % (start, '' if end is None else end - 1)
+        for attempt in (0, 1):
+            connection = self._connect()
+            try:
+                connection.request('GET', self.path, headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+            except Exception as error:
+                self.close()
+                if attempt or not disconnected(error):
+                    raise
+                continue
+            if response.getheader('connection', '').lower() == 'close':
+                self.close()
+            self.requests += 1
+            self.bytes_fetched += len(body)
+            return response.status, response, body
+
+    def fetch(self, start, end=None):
+        ''' the bytes from start to end (exclusive, None for the end of the file) '''
+        if end is not None and end <= start:
+            return b''
+        status, response, body = self._request(start, end)
+
+        if status == 206:
+            content_range = response.getheader('content-range', '')
+            total = content_range.rpartition('/')[2]
+            if total.isdigit():
+                self.size = int(total)
+            return body
+        if status == 200:
+            # the server ignored the range and sent the whole file, keep it
+            # all as the buffer so no more requests are needed
+            self.size = len(body)
+            self.buffer = body
+            self.buffer_start = 0
+            return body[start:end]
+        if status == 416:
+            content_range = response.getheader('content-range', '')
+            total = content_range.rpartition('/')[2]
+            if total.isdigit():
+                self.size = int(total)
+            return b''
+        raise IOError('HTTP error %d %s fetching %s' % (status, response.reason, self.url))
+
+    def _fill(self, start, end, extend):
+        ''' fetch bytes start to end into the buffer, appended to it with
+            extend (start is then the end of the buffer)
+        '''
+        data = self.fetch(start, end)
+        if self.buffer_start == 0 and len(self.buffer) == self.size:
+            # the buffer holds the whole file
+            return
+        if extend:
+            self.buffer += data
+        else:
+            self.buffer = data
+            self.buffer_start = start
+
+    def prefetch(self, start, end):
+        ''' make sure bytes start to end are in the buffer, fetching only the
+            missing part if the buffer ends within that range
+        '''
+        buffer_end = self.buffer_start + len(self.buffer)
+        if self.buffer_start <= start and end <= buffer_end:
+            return
+        if self.buffer_start <= start <= buffer_end:
+            self._fill(buffer_end, end, True)
+        else:
+            self._fill(start, end, False)
+
+    def _length(self):
+        if self.size is None:
+            self.fetch(0, 1)
+            if self.size is None:
+                raise IOError('size of %s unknown' % (self.url, ))
+        return self.size
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self.position
+        elif whence == 2:
+            offset += self._length()
+        if offset < 0:
+            raise IOError('negative seek position %d' % (offset, ))
+        self.position = offset
+        return self.position
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            # up to the end of the file, if its size is known
+            end = self.size
+        else:
+            end = self.position + size
+            if self.size is not None:
+                end = min(end, self.size)
+        if end is not None and end <= self.position:
+            return b''
+
+        buffer_end = self.buffer_start + len(self.buffer)
+        if not (self.buffer_start <= self.position and end is not None and end <= buffer_end):
+            if self.buffer_start <= self.position <= buffer_end and len(self.buffer) < self.max_buffer:
+                # extend the buffer
+                self._fill(buffer_end, None if end is None else max(end, buffer_end + self.block_size), True)
+            else:
+                self._fill(self.position, None if end is None else max(end, self.position + self.block_size), False)
+
+        offset = self.position - self.buffer_start
+        data = self.buffer[offset:None if end is None else end - self.buffer_start]
+        self.position += len(data)
+        return data
+
+
+def _header_size(intro):
+    ''' size of a header structure from its 16 byte intro '''
+    if len(intro) != HEADER_INTRO_SIZE:
+        raise RPMError('truncated RPM file, header ends prematurely')
+    magic, version, reserved, count, store_size = struct.unpack('!3sc4sll', intro)
+    if magic != b'\x8e\xad\xe8' or count < 0 or store_size < 0:
+        raise RPMError('invalid RPM header')
+    return HEADER_INTRO_SIZE + 16 * count + store_size
+
+
+def header_end(file):
+    ''' offset of the end of the main header of the package in file, found
+        by reading the lead and the header sizes only
+    '''
+    file.prefetch(0, LEAD_SIZE + HEADER_INTRO_SIZE)
+    file.seek(LEAD_SIZE)
+    signature_end = LEAD_SIZE + _header_size(file.read(HEADER_INTRO_SIZE))
+    header_start = signature_end + -signature_end % 8
+
+    file.prefetch(0, header_start + HEADER_INTRO_SIZE)
+    file.seek(header_start)
+    end = header_start + _header_size(file.read(HEADER_INTRO_SIZE))
+    file.seek(0)
+    return end
+
+
+def open_url(url, cls=RPM, checksum=None, block_size=HTTPRangeFile.BLOCK_SIZE, timeout=None, headers=None, **kwargs):
+    ''' read the package at url, an instance of cls (RPM or YumPackage)
+
+        Only the lead, signature and header are fetched, in three requests.
+        The file is not checksummed by default since that needs all of it;
+        with checksum set the rest of the file is downloaded for the digest.
+        The remaining arguments are passed on to cls.
+    '''
+    file = HTTPRangeFile(url, block_size=block_size, timeout=timeout, headers=headers)
+    try:
+        file.prefetch(0, header_end(file))
+        return cls(file, checksum=checksum, **kwargs)
+    except:
+        file.close()
+        raise
@@ -5,49 +5,88 @@ PyRPM
 PyRPM is a pure python, simple to use, module to read information from a RPM file.
 '''
 
+import binascii
 from collections import namedtuple
 import hashlib
+import mmap
 import re
 import stat
 import struct
 import sys
+from array import array
+
+from pyrpm.stats import null_timer
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 if sys.version < '3':
-    try:
-        from cStringIO import StringIO as BytesIO
-    except:
-        from StringIO import StringIO as BytesIO
+    def _intern(string):
+        return intern(string) if isinstance(string, str) else string
 else:
-    from io import BytesIO
+    def _intern(string):
+        return sys.intern(string) if type(string) is str else string
+
+
+def _decode_string(string):
+    ''' decode a raw string value '''
+    # not all UTF-8 is valid and we should catch any errors processing those as ultimately
+    # a strange character is acceptable
+    try:
+        return string.decode('utf-8')
+    except UnicodeError:
+        # if UTF-8 fails, give 8859-1 a try as it is the next most common
+        try:
+            return string.decode('iso-8859-1')
+        except UnicodeError:
+            # if both fail, keep the bytestring as strange characters are fine for most applications
+            return string
+
+
+def _array_typecode(size):
+    ''' find a signed array typecode with the given item size '''
+    for typecode in ('b', 'h', 'i', 'l', 'q'):
+        try:
+            if array(typecode).itemsize == size:
+                return typecode
+        except ValueError:  # 'q' is not available everywhere
+            pass
+    return None
 
 
 class Entry(object):
-    ''' RPM Header Entry '''
-
-    def __init__(self, entry=None, store=None, tag=None, type=None, value=None):
-        DECODING_MAP = {
-            0: self._read_null,
-            1: self._read_char,
-            2: self._read_int8,
-            3: self._read_int16,
-            4: self._read_int32,
-            5: self._read_int64,
-            6: self._read_string,
-            7: self._read_binary,
-            8: self._read_string_array,
-            9: self._read_string,
-        }
+    ''' RPM Header Entry
+
+        Entries are decoded straight from the header store, a bytes object
+        holding the data area of the header. Integer entries with a count of
+        one become plain ints, larger ones are returned as array.array (or as
+        read-only numpy arrays viewing the store when use_numpy is set).
+        Only the tag, type and decoded value are kept. The strings of
+        arrays repeating across files and packages (owners, groups,
+        dirnames, languages and dependency names) are interned.
+    '''
+
+    __slots__ = ('tag', 'type', 'value')
+
+    # (struct format, array typecode, numpy dtype) of the integer types
+    INTEGER_FORMATS = {
+        2: (struct.Struct('!b'), _array_typecode(1), '>i1'),
+        3: (struct.Struct('!h'), _array_typecode(2), '>i2'),
+        4: (struct.Struct('!i'), _array_typecode(4), '>i4'),
+        5: (struct.Struct('!q'), _array_typecode(8), '>i8'),
+    }
 
-        # read from file if possible
-        if entry is not None and store is not None:
-            # seek to position in store
-            store.seek(entry[2])
+    INTERNED_TAGS = frozenset([1039, 1040, 1047, 1049, 1054, 1090, 1097, 1118])
 
+    def __init__(self, entry=None, store=None, tag=None, type=None, value=None, use_numpy=False):
+        # read from store if possible
+        if entry is not None and store is not None:
             # decode information
-            self.entry = entry
             self.tag = entry[0]
             self.type = entry[1]
-            self.value = DECODING_MAP[entry[1]](store, entry[3])
+            self.value = self.DECODING_MAP[entry[1]](self, store, entry[2], entry[3], use_numpy)
         else:
             self.tag = tag
             self.type = type
@@ -59,85 +98,110 @@ class Entry(object):
     def __repr__(self):
         return "(%s, %s)" % (self.tag, self.value, )
 
-    def _read_format(self, fmt, store):
-        size = struct.calcsize(fmt)
-        data = store.read(size)
-        unpacked_data = struct.unpack(fmt, data)
-        return unpacked_data[0] if len(unpacked_data) == 1 else unpacked_data
-
-    def _read_null(self, store, data_count):
+    def _check(self, store, offset, size):
+        if offset < 0 or offset + size > len(store):
+            raise RPMError('corrupt RPM header, entry %d exceeds the store' % (self.tag, ))
+
+    def _string_end(self, store, offset, data_count):
+        ''' find the end of data_count NUL terminated strings '''
+        end = offset
+        for i in range(data_count):
+            end = store.find(b'\x00', end)
+            if end == -1:
+                raise RPMError('corrupt RPM header, unterminated string in entry %d' % (self.tag, ))
+            end += 1
+        return end
+
+    def _read_null(self, store, offset, data_count, use_numpy=False):
         return None
 
-    def _read_char(self, store, data_count):
-        ''' store is a pointer to the store offset
-        where the char should be read
-        '''
-        return self._read_format('!{0:d}s'.format(data_count), store)
-
-    def _read_int8(self, store, data_count):
-        ''' int8 = 1byte
+    def _read_char(self, store, offset, data_count, use_numpy=False):
+        ''' read data_count raw characters
         '''
-        return int(self._read_char(store, data_count))
+        self._check(store, offset, data_count)
+        return store[offset:offset + data_count]
 
-    def _read_int16(self, store, data_count):
-        ''' int16 = 2bytes
+    def _read_int(self, store, offset, data_count, use_numpy=False):
+        ''' read int8/int16/int32/int64 entries, 1/2/4/8 bytes each
         '''
-        return self._read_format('!{0:d}h'.format(data_count), store)
+        fmt, typecode, dtype = self.INTEGER_FORMATS[self.type]
+        size = fmt.size * data_count
+        self._check(store, offset, size)
+        if data_count == 1:
+            return fmt.unpack_from(store, offset)[0]
+
+        if use_numpy:
+            return numpy.frombuffer(store, dtype=dtype, count=data_count, offset=offset)
+
+        if typecode is None:
+            return struct.unpack_from('!%d%s' % (data_count, fmt.format[-1:]), store, offset)
+
+        # copy the big endian data straight out of the store
+        values = array(typecode)
+        data = memoryview(store)[offset:offset + size]
+        if hasattr(values, 'frombytes'):
+            values.frombytes(data)
+        else:
+            values.fromstring(data.tobytes())
+        if sys.byteorder == 'little':
+            values.byteswap()
+        return values
 
-    def _read_int32(self, store, data_count):
-        ''' int32 = 4bytes
+    def _read_string(self, store, offset, data_count, use_numpy=False):
+        ''' read a string entry
         '''
-        return self._read_format('!{0:d}i'.format(data_count), store)
+        return _decode_string(store[offset:self._string_end(store, offset, 1) - 1])
 
-    def _read_int64(self, store, data_count):
-        ''' int64 = 8bytes
+    def _read_string_array(self, store, offset, data_count, use_numpy=False):
+        ''' read a array of string entries
         '''
-        return self._read_format('!{0:d}q'.format(data_count), store)
+        if data_count == 0:
+            return []
+        data = store[offset:self._string_end(store, offset, data_count) - 1]
 
-    def _read_string(self, store, data_count):
-        ''' read a string entry
-        '''
-        string = b''
-        while True:
-            char = self._read_char(store, 1)
-            if char == b'\x00':  # read until '\0'
-                break
-            string += char
-
-        # not all UTF-8 is valid and we should catch any errors processing those as ultimately
-        # a strange character is acceptable
+        # most arrays are valid UTF-8 as a whole, which can then be split in one go
         try:
-            returnstring = string.decode('utf-8')
+            values = data.decode('utf-8').split(u'\x00')
         except UnicodeError:
-            # if UTF-8 fails, give 8859-1 a try as it is the next most common
-            try:
-                returnstring = string.decode('iso-8859-1')
-            except UnicodeError:
-                # if both fail, keep the bytestring as strange characters are fine for most applications
-                returnstring = string
-
-        return returnstring
+            values = [_decode_string(string) for string in data.split(b'\x00')]
+        if self.tag in self.INTERNED_TAGS:
+            return [_intern(value) for value in values]
+        return values
 
-    def _read_string_array(self, store, data_count):
-        ''' read a array of string entries
-        '''
-        return [self._read_string(store, 1) for i in range(data_count)]
-
-    def _read_binary(self, store, data_count):
+    def _read_binary(self, store, offset, data_count, use_numpy=False):
         ''' read a binary entry
         '''
-        return self._read_format('!{0:d}s'.format(data_count), store)
+        return self._read_char(store, offset, data_count)
+
+    # decoder of every entry type, shared by all entries
+    DECODING_MAP = {
+        0: _read_null,
+        1: _read_char,
+        2: _read_int,
+        3: _read_int,
+        4: _read_int,
+        5: _read_int,
+        6: _read_string,
+        7: _read_binary,
+        8: _read_string_array,
+        9: _read_string,
+    }
+
+
+_INDEX_RECORD = struct.Struct('!4l')
 
 
 class HeaderBase(object):
 
     ''' RPM Header Structure '''
+    __slots__ = ('use_numpy', 'stats', 'index', 'index_data', 'store', '_cache', 'header_range')
+
     MAGIC_NUMBER = b'\x8e\xad\xe8'
     MAGIC_NUMBER_MATCHER = re.compile(b'(\x8e\xad\xe8)')
 
     TAGS = {}
 
-    def __init__(self, file):
+    def __init__(self, file, lazy=True, use_numpy=False, stats=None):
         ''' read a RPM header structure with all its entries
 
             Header format:
@@ -147,31 +211,84 @@ class HeaderBase(object):
             Entry format:
             [4bytes][4bytes][4bytes][4bytes]
                TAG    TYPE   OFFSET  COUNT
+
+            The index records are kept as read and only their tags are parsed
+            up front, index maps every tag to the position of its (first)
+            record. With lazy set an entry is decoded from the store the first time its tag is
+            accessed and cached from then on, otherwise all entries are
+            decoded right away. Integer arrays are decoded into numpy arrays
+            instead of array.array when use_numpy is set. Decoded entries are
+            counted in stats, a pyrpm.stats.Stats, if given.
         '''
-        self.entries = []
+        if use_numpy and numpy is None:
+            raise RPMError('numpy decoding requested but numpy is not available')
+
+        self.use_numpy = use_numpy
+        self.stats = stats
+        self.index = {}
+        self.index_data = b''
+        self.store = None
+        self._cache = {}
 
         # read from file if possible
         if file:
             # read and check header
             start = file.tell()
-            header = struct.unpack('!3sc4sll', file.read(16))
+            header = self._read_exactly(file, 16)
+            header = struct.unpack('!3sc4sll', header)
             if header[0] != self.MAGIC_NUMBER:
                 raise RPMError('invalid RPM header')
+            if header[3] < 0 or header[4] < 0:
+                raise RPMError('invalid RPM header, negative index or store size')
 
-            # read entries and store
-            entries = [file.read(16) for i in range(header[3])]
-            store = BytesIO(file.read(header[4]))
-
-            # parse entries
-            for entry in entries:
-                parsed_entry = struct.unpack("!4l", entry)
-                object_entry = Entry(parsed_entry, store)
+            # read index records and store
+            self.index_data = self._read_exactly(file, 16 * header[3])
+            self.store = self._read_exactly(file, header[4])
 
-                if object_entry:
-                    self.entries.append(object_entry)
+            # map tags to their index records, the first record of a tag wins
+            for position, tag in enumerate(struct.unpack('!%dl' % (4 * header[3], ), self.index_data)[0::4]):
+                if tag not in self.index:
+                    self.index[tag] = position
             end = file.tell()
             self.header_range = (start, end)
 
+            if not lazy:
+                for entry in self:
+                    pass
+
+    def _read_exactly(self, file, size):
+        data = file.read(size)
+        if len(data) != size:
+            raise RPMError('truncated RPM file, header ends prematurely')
+        return data
+
+    @property
+    def entries(self):
+        return list(self)
+
+    @property
+    def records(self):
+        ''' the (tag, type, offset, count) index records '''
+        return [_INDEX_RECORD.unpack_from(self.index_data, 16 * position) for position in range(len(self.index_data) // 16)]
+
+    def _entry(self, position):
+        ''' decode the entry of the index record at position, caching indexed
+            tags
+        '''
+        record = _INDEX_RECORD.unpack_from(self.index_data, 16 * position)
+        indexed = self.index.get(record[0]) == position
+        if indexed:
+            try:
+                return self._cache[record[0]]
+            except KeyError:
+                pass
+        if self.stats is not None:
+            self.stats.count('entries_decoded')
+        entry = Entry(record, self.store, use_numpy=self.use_numpy)
+        if indexed:
+            self._cache[record[0]] = entry
+        return entry
+
     def __getattr__(self, name):
         if name in self.TAGS:
             id, default = self.TAGS[name]
@@ -183,18 +300,33 @@ class HeaderBase(object):
         raise AttributeError(name)
 
     def __iter__(self):
-        for entry in self.entries:
-            yield entry
+        for position in range(len(self.index_data) // 16):
+            yield self._entry(position)
+
+    def __contains__(self, item):
+        return item in self.index
+
+    def get(self, item, default=None):
+        try:
+            return self[item]
+        except KeyError:
+            return default
 
     def __getitem__(self, item):
-        for entry in self:
-            if entry.tag == item:
-                return entry.value
-        raise KeyError()
+        entry = self._cache.get(item)
+        if entry is not None:
+            return entry.value
+        try:
+            position = self.index[item]
+        except KeyError:
+            raise KeyError(item)
+        return self._entry(position).value
 
 
 # signature header section
 class Signature(HeaderBase):
+    __slots__ = ()
+
     TAGS = {
         'size': (1000, -1),
         'pgp': (1002, ""),
@@ -202,11 +334,15 @@ class Signature(HeaderBase):
         'gpg': (1005, ""),
         'pgp5': (1006, ""),
         'payload_size': (1007, -1),
+        'sha1': (269, ""),
+        'sha256': (273, ""),
     }
 
 
 # primary header section
 class Header(HeaderBase):
+    __slots__ = ()
+
     TAGS = {
         'name': (1000, ""),
         'version': (1001, "0.1"),
@@ -236,29 +372,337 @@ class RPMError(Exception):
     pass
 
 
+class _DigestReader(object):
+    ''' file wrapper feeding the data read through it to a set of digests
+
+        Every byte is hashed once and in file order: data read again after
+        seeking back is not fed to the digests a second time.
+    '''
+
+    def __init__(self, file, digests):
+        self.file = file
+        self.digests = digests
+        self.size = file.tell()  # number of bytes hashed so far
+
+    def read(self, size=-1):
+        position = self.file.tell()
+        data = self.file.read(size)
+        end = position + len(data)
+        if end > self.size:
+            chunk = data[self.size - position:] if position < self.size else data
+            for digest in self.digests:
+                digest.update(chunk)
+            self.size = end
+        return data
+
+    def seek(self, offset, whence=0):
+        return self.file.seek(offset, whence)
+
+    def tell(self):
+        return self.file.tell()
+
+
+class _CountingReader(object):
+    ''' file wrapper counting the bytes read through it '''
+
+    def __init__(self, file):
+        self.file = file
+        self.count = 0
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        self.count += len(data)
+        return data
+
+    def seek(self, offset, whence=0):
+        return self.file.seek(offset, whence)
+
+    def tell(self):
+        return self.file.tell()
+
+
 RPMFile = namedtuple("RPMFile", ['name', 'size', 'mode', 'rdevice', 'device', 'time', 'digest', 'link_to',
                      'flags', 'username', 'group', 'verify_flags', 'language', 'inode', 'color', 'content_class', 'type', 'primary'])
 RPMChangeLog = namedtuple("RPMChangeLog", ['name', 'text', 'time'])
 RPMprco = namedtuple("RPMprco", ['name', 'version', 'flags', 'str_flags'])
+PayloadMismatch = namedtuple("PayloadMismatch", ['name', 'kind', 'expected', 'actual'])
+DigestMismatch = namedtuple("DigestMismatch", ['digest', 'expected', 'actual'])
+
+
+def _sequence(value):
+    ''' header arrays with a single element decode to a scalar '''
+    if value is None or hasattr(value, '__len__') and not isinstance(value, (bytes, type(u''))):
+        return value
+    return [value]
+
+
+class FileTable(object):
+    ''' the files of a package, stored column by column
+
+        The columns are the parallel file arrays of the header, integer
+        columns stay in the array.array (or numpy) form they were decoded to
+        and dirnames are interned. Indexing and iterating build RPMFile tuples
+        on demand, so the table can be used like a list of RPMFile. Columns
+        missing from the header, or not matching the number of files, hold
+        None for every file.
+
+        The table can be changed like a list too (append, insert, extend,
+        remove, pop, item assignment and deletion); the first change turns
+        the columns into lists. The type and primary fields of the RPMFile
+        tuples stored are derived again from their mode, flags and name.
+        version counts the changes.
+    '''
+
+    COLUMNS = [
+        ('size', 1028), ('mode', 1030), ('rdevice', 1033), ('time', 1034), ('digest', 1035), ('link_to', 1036), ('flags', 1037),
+        ('username', 1039), ('group', 1040), ('verify_flags', 1045), ('device', 1095), ('inode', 1096), ('language', 1097), ('color', 1140),
+    ]
+
+    def __init__(self, header=None):
+        self.columns = {}
+        self.basenames = []
+        self.dirnames = []
+        self.dirindexes = []
+
+        if header is not None and 1117 in header:
+            self.basenames = _sequence(header[1117])
+            self.dirnames = [_intern(dirname) for dirname in _sequence(header.get(1118, []))]
+            self.dirindexes = self._column(header, 1116)
+            if self.dirindexes is None:
+                self.basenames = []
+
+            for name, tag in self.COLUMNS:
+                self.columns[name] = self._column(header, tag)
+
+            # content classes are stored as an index into a dictionary
+            content_classes = _sequence(header.get(1142))
+            indexes = self._column(header, 1141)
+            if content_classes is not None and indexes is not None:
+                self.columns['content_class'] = [content_classes[index] for index in indexes]
+
+        for name in ('content_class', ) + tuple(name for name, tag in self.COLUMNS):
+            if self.columns.get(name) is None:
+                self.columns[name] = _NoneColumn(len(self.basenames))
+        self._primary_dirnames = [('bin/' in dirname or dirname.startswith('/etc/')) for dirname in self.dirnames]
+        self.version = 0
+
+    def _column(self, header, tag):
+        column = _sequence(header.get(tag))
+        if column is None or len(column) != len(self.basenames):
+            return None
+        return column
+
+    def __len__(self):
+        return len(self.basenames)
+
+    def __iter__(self):
+        for idx in range(len(self.basenames)):
+            yield self.row(idx)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self.row(i) for i in range(*idx.indices(len(self.basenames)))]
+        if idx < 0:
+            idx += len(self.basenames)
+        if not 0 <= idx < len(self.basenames):
+            raise IndexError(idx)
+        return self.row(idx)
+
+    def __repr__(self):
+        return 'FileTable(%d files)' % (len(self.basenames), )
+
+    def _columns(self):
+        ''' the mutable columns, turned into lists first '''
+        if self.version == 0:
+            self.basenames = list(self.basenames)
+            self.dirnames = list(self.dirnames)
+            self.dirindexes = list(self.dirindexes)
+            for name, column in self.columns.items():
+                self.columns[name] = list(column)
+        self.version += 1
+        return [self.basenames, self.dirindexes] + list(self.columns.values())
+
+    def _dirindex(self, dirname):
+        try:
+            return self.dirnames.index(dirname)
+        except ValueError:
+            self.dirnames.append(_intern(dirname))
+            self._primary_dirnames.append('bin/' in dirname or dirname.startswith('/etc/'))
+            return len(self.dirnames) - 1
+
+    def insert(self, idx, file):
+        ''' insert the RPMFile file before idx '''
+        self._columns()
+        slash = file.name.rfind('/') + 1
+        self.basenames.insert(idx, file.name[slash:])
+        self.dirindexes.insert(idx, self._dirindex(file.name[:slash]))
+        for name, column in self.columns.items():
+            column.insert(idx, getattr(file, name))
+
+    def append(self, file):
+        self.insert(len(self.basenames), file)
+
+    def extend(self, files):
+        for file in files:
+            self.append(file)
+
+    def __delitem__(self, idx):
+        for column in self._columns():
+            del column[idx]
+
+    def __setitem__(self, idx, value):
+        if isinstance(idx, slice):
+            start, stop, step = idx.indices(len(self.basenames))
+            value = list(value)
+            if step != 1:
+                indices = range(start, stop, step)
+                if len(value) != len(indices):
+                    raise ValueError('attempt to assign sequence of size %d to extended slice of size %d' % (len(value), len(indices)))
+                for i, file in zip(indices, value):
+                    self[i] = file
+                return
+            del self[idx]
+            for offset, file in enumerate(value):
+                self.insert(start + offset, file)
+            return
+        if idx < 0:
+            idx += len(self.basenames)
+        if not 0 <= idx < len(self.basenames):
+            raise IndexError(idx)
+        del self[idx]
+        self.insert(idx, value)
+
+    def index(self, file):
+        ''' position of the first file equal to the RPMFile file '''
+        for idx, row in enumerate(self):
+            if row == file:
+                return idx
+        raise ValueError('%r is not in the file table' % (file, ))
+
+    def remove(self, file):
+        del self[self.index(file)]
+
+    def pop(self, idx=-1):
+        file = self[idx]
+        del self[idx]
+        return file
+
+    @property
+    def names(self):
+        ''' full paths of all files '''
+        dirnames = self.dirnames
+        return [dirnames[dirindex] + basename for dirindex, basename in zip(self.dirindexes, self.basenames)]
+
+    def column(self, name):
+        ''' all values of a RPMFile field, name is computed on the fly '''
+        if name == 'name':
+            return self.names
+        return self.columns[name]
+
+    def row(self, idx):
+        ''' the RPMFile of the file at idx '''
+        columns = self.columns
+        dirindex = self.dirindexes[idx]
+        mode = columns['mode'][idx]
+        flags = columns['flags'][idx]
+        return RPMFile(
+            name=self.dirnames[dirindex] + self.basenames[idx],
+            size=columns['size'][idx],
+            mode=mode,
+            rdevice=columns['rdevice'][idx],
+            time=columns['time'][idx],
+            digest=columns['digest'][idx],
+            link_to=columns['link_to'][idx],
+            flags=flags,
+            username=columns['username'][idx],
+            group=columns['group'][idx],
+            verify_flags=columns['verify_flags'][idx],
+            device=columns['device'][idx],
+            inode=columns['inode'][idx],
+            language=columns['language'][idx],
+            color=columns['color'][idx],
+            content_class=columns['content_class'][idx],
+            type='dir' if mode is not None and stat.S_ISDIR(mode & 65535) else ('ghost' if flags is not None and flags & 64 else 'file'),
+            primary=self._primary_dirnames[dirindex])
+
+    def to_numpy(self):
+        ''' the columns as numpy arrays, integer columns without copying '''
+        if numpy is None:
+            raise RPMError('numpy is not available')
+
+        arrays = {'name': numpy.array(self.names, dtype=object)}
+        for name, column in self.columns.items():
+            if isinstance(column, _NoneColumn):
+                continue
+            if isinstance(column, array):
+                arrays[name] = numpy.frombuffer(column, dtype=column.typecode)
+            elif isinstance(column, numpy.ndarray):
+                arrays[name] = column
+            else:
+                arrays[name] = numpy.array(column, dtype=object)
+        return arrays
+
+
+class _NoneColumn(object):
+    ''' column of a value missing from the header '''
+
+    def __init__(self, length):
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        for idx in range(self.length):
+            yield None
+
+    def __getitem__(self, idx):
+        if not -self.length <= idx < self.length:
+            raise IndexError(idx)
+        return None
 
 
 class RPM(object):
+    __slots__ = ('rpmfile', 'checksum_types', 'binary', 'source', 'header', 'signature', 'files', 'filelist', 'changelog',
+                 'provides', 'requires', 'obsoletes', 'conflicts', '_checksums', '_filesize', 'stats')
+
     RPM_LEAD_MAGIC_NUMBER = b'\xed\xab\xee\xdb'
     RPM_PRCO_FLAGS_MAP = {0: None, 2: 'LT', 4: 'GT', 8: 'EQ', 10: 'LE', 12: 'GE'}
+    RPM_FILE_DIGEST_ALGORITHMS = {1: 'md5', 2: 'sha1', 8: 'sha256', 9: 'sha384', 10: 'sha512', 11: 'sha224'}
+    MAGIC_NUMBER_SEARCH_LIMIT = 256
+    CHECKSUM_CHUNK_SIZE = 1024 * 1024
 
-    def __init__(self, rpm):
+    def __init__(self, rpm, checksum='sha256', defer_checksum=False, composite=True, stats=None, use_numpy=False):
         ''' rpm - StringIO.StringIO/io.BytesIO | file
+            checksum - name of the package digest algorithm, a list of names to
+                       compute several digests at once or None to skip it
+            defer_checksum - compute the digest on first access instead of
+                             while the package is read
+            composite - build filelist, changelog and the provides, requires,
+                        obsoletes and conflicts lists
+            stats - pyrpm.stats.Stats recording the time spent in every
+                    stage, the bytes read and the header entries decoded
+            use_numpy - decode integer arrays of the headers into numpy
+                        arrays, RPMError if numpy is not available
         '''
         if hasattr(rpm, 'read'):  # if it walk like a duck..
             self.rpmfile = rpm
         else:
             raise ValueError('invalid initialization: StringIO/BytesIO or file expected received %s' % (type(rpm), ))
 
+        if checksum is None:
+            self.checksum_types = ()
+        elif isinstance(checksum, (list, tuple)):
+            self.checksum_types = tuple(checksum)
+        else:
+            self.checksum_types = (checksum, )
+        digests = [hashlib.new(name) for name in self.checksum_types]
+
         self.binary = None
         self.source = None
         self.header = None
         self.signature = None
-        self.filelist = []
+        self.files = self.filelist = FileTable()
         self.changelog = []
 
         self.provides = []
@@ -266,11 +710,85 @@ class RPM(object):
         self.obsoletes = []
         self.conflicts = []
 
-        self._read_lead()
-        self._read_signature()
-        self._read_header()
-        self._match_composite()
-        self._compute_checksum()
+        self._checksums = None
+        self._filesize = None
+        self.stats = stats
+        timer = stats.timer if stats is not None else null_timer
+
+        # hash lead, signature and header while they are read
+        reader = None
+        if digests and not defer_checksum and rpm.tell() == 0:
+            reader = self.rpmfile = _DigestReader(rpm, digests)
+        counter = None
+        if stats is not None:
+            counter = self.rpmfile = _CountingReader(self.rpmfile)
+        try:
+            with timer('read_lead'):
+                self._read_lead()
+            with timer('read_signature'):
+                self._read_signature(use_numpy)
+            with timer('read_header'):
+                self._read_header(use_numpy)
+        finally:
+            self.rpmfile = rpm
+        if counter is not None:
+            stats.count('bytes_read', counter.count)
+        if composite:
+            with timer('match_composite'):
+                self._match_composite()
+        if reader is not None:
+            self._compute_checksum(reader)
+
+    @classmethod
+    def open(cls, path, *args, **kwargs):
+        ''' open the RPM file at path through a read-only memory map
+        '''
+        with open(path, 'rb') as file:
+            try:
+                mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # empty files cannot be mapped
+                raise RPMError('empty file, this is not a RPM file')
+
+        try:
+            return cls(mapped, *args, **kwargs)
+        except:
+            mapped.close()
+            raise
+
+    def close(self):
+        self.rpmfile.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def checksum_type(self):
+        return self.checksum_types[0] if self.checksum_types else None
+
+    @property
+    def checksums(self):
+        ''' hex digests of the package file by algorithm '''
+        if self._checksums is None:
+            self._compute_checksum()
+        return self._checksums
+
+    @property
+    def checksum(self):
+        if not self.checksum_types:
+            return None
+        return self.checksums[self.checksum_type]
+
+    @property
+    def filesize(self):
+        if self._filesize is None:
+            position = self.rpmfile.tell()
+            self.rpmfile.seek(0, 2)
+            self._filesize = self.rpmfile.tell()
+            self.rpmfile.seek(position)
+        return self._filesize
 
     @property
     def canonical_filename(self):
@@ -279,6 +797,144 @@ class RPM(object):
         else:
             return "%s-%s-%s-%d.%s.rpm" % (self.header.name, self.header.version, self.header.release, self.header.epoch, self.header.architecture if self.binary else "src")
 
+    def payload(self):
+        ''' iterate over the members of the payload archive
+
+            The payload is decompressed on the fly while the returned
+            CpioEntry objects are read, an entry can be read until the next one
+            is requested.
+        '''
+        from pyrpm.payload import CpioArchive, DecompressingReader
+
+        if self.header.get(1124, 'cpio') != 'cpio':
+            raise RPMError('unsupported payload format %s' % (self.header[1124], ))
+        self.rpmfile.seek(self.header.header_range[1])
+        return iter(CpioArchive(DecompressingReader(self.rpmfile, self.header.get(1125, 'gzip'))))
+
+    def extract(self, directory):
+        ''' extract the files of the payload into directory '''
+        from pyrpm.payload import extract
+
+        extract(self.payload(), directory)
+
+    def verify_payload(self):
+        ''' check the payload against the file list of the header
+
+            The payload is streamed once and every regular file is hashed with
+            the file digest algorithm of the package as it passes. Returns a list
+            of PayloadMismatch tuples, kind being one of 'size', 'digest',
+            'missing' (listed in the header but not in the payload) and
+            'unexpected' (in the payload but not listed in the header), an empty
+            list means the payload matches.
+        '''
+        from pyrpm.payload import CHUNK_SIZE
+
+        algorithm = self.RPM_FILE_DIGEST_ALGORITHMS.get(self.header.get(5011, 1))
+        if algorithm is None:
+            raise RPMError('unsupported file digest algorithm %s' % (self.header[5011], ))
+
+        # regular files expected in the payload, ghosts are not packaged
+        expected = {}
+        for file in self.filelist:
+            if stat.S_ISREG(file.mode & 0xffff) and not file.flags & 64:
+                expected[file.name] = file
+
+        mismatches = []
+        for entry in self.payload():
+            name = entry.name[1:] if entry.name.startswith('./') else entry.name
+            file = expected.pop(name, None)
+            if not entry.isreg():
+                continue
+            if file is None:
+                mismatches.append(PayloadMismatch(name, 'unexpected', None, entry.size))
+                continue
+
+            # hard linked files carry their data in one of the links only
+            if entry.size == 0 and entry.nlink > 1:
+                continue
+
+            digest = hashlib.new(algorithm)
+            size = 0
+            data = entry.read(CHUNK_SIZE)
+            while data:
+                digest.update(data)
+                size += len(data)
+                data = entry.read(CHUNK_SIZE)
+
+            if size != file.size:
+                mismatches.append(PayloadMismatch(name, 'size', file.size, size))
+            if file.digest and digest.hexdigest() != file.digest:
+                mismatches.append(PayloadMismatch(name, 'digest', file.digest, digest.hexdigest()))
+
+        for name in sorted(expected):
+            mismatches.append(PayloadMismatch(name, 'missing', expected[name].size, None))
+        return mismatches
+
+    def verify_digests(self, payload=False):
+        ''' check the digests the package carries for itself
+
+            The SHA256 and SHA1 digests of the signature are checked against
+            the raw bytes of the main header, which are read again from the
+            file, the payload is not read. With payload set the rest of the
+            file is streamed once as well to check the payload digest of the
+            header, the MD5 digest of the signature over header and payload
+            and the size of both.
+
+            Returns a list of DigestMismatch tuples, digest being one of
+            'sha256', 'sha1', 'payload', 'md5' and 'size', an empty list means
+            all digests present match. Raises RPMError if the package has no
+            digest to check.
+        '''
+        timer = self.stats.timer if self.stats is not None else null_timer
+        start, end = self.header.header_range
+        expected = []
+        for tag, name in ((273, 'sha256'), (269, 'sha1')):
+            if tag in self.signature:
+                expected.append((name, hashlib.new(name), self.signature[tag]))
+
+        size = None
+        if payload:
+            if 5092 in self.header:
+                algorithm = self.RPM_FILE_DIGEST_ALGORITHMS.get(self.header.get(5093, 8))
+                if algorithm is None:
+                    raise RPMError('unsupported payload digest algorithm %s' % (self.header[5093], ))
+                payload_digest = hashlib.new(algorithm)
+                expected.append(('payload', payload_digest, _sequence(self.header[5092])[0]))
+            if 1004 in self.signature:
+                expected.append(('md5', hashlib.md5(), binascii.hexlify(self.signature[1004]).decode('ascii')))
+            size = self.signature.get(270, self.signature.get(1000))
+        if not expected and size is None:
+            raise RPMError('no digests to verify')
+
+        with timer('verify_digests'):
+            self.rpmfile.seek(start)
+            data = self.rpmfile.read(end - start)
+            if len(data) != end - start:
+                raise RPMError('truncated RPM file, header ends prematurely')
+            for name, digest, value in expected:
+                if name != 'payload':
+                    digest.update(data)
+
+            actual_size = len(data)
+            if payload:
+                data = self.rpmfile.read(self.CHECKSUM_CHUNK_SIZE)
+                while data:
+                    for name, digest, value in expected:
+                        if name in ('payload', 'md5'):
+                            digest.update(data)
+                    actual_size += len(data)
+                    data = self.rpmfile.read(self.CHECKSUM_CHUNK_SIZE)
+        if self.stats is not None:
+            self.stats.count('bytes_read', actual_size)
+
+        mismatches = []
+        for name, digest, value in expected:
+            if digest.hexdigest() != value.lower():
+                mismatches.append(DigestMismatch(name, value, digest.hexdigest()))
+        if size is not None and actual_size != size:
+            mismatches.append(DigestMismatch('size', size, actual_size))
+        return mismatches
+
     def _read_lead(self):
         ''' reads the rpm lead section
 
@@ -295,6 +951,8 @@ class RPM(object):
         '''
         lead_fmt = '!4sBBhh66shh16s'
         data = self.rpmfile.read(96)
+        if len(data) != 96:
+            raise RPMError('truncated lead, this is not a RPM file')
         value = struct.unpack(lead_fmt, data)
 
         magic_num = value[0]
@@ -312,7 +970,7 @@ class RPM(object):
         else:
             raise RPMError('wrong package type this is not a RPM file')
 
-    def _read_signature(self):
+    def _read_signature(self, use_numpy=False):
         ''' read signature header '''
 
         # find the start of the header
@@ -320,60 +978,41 @@ class RPM(object):
             raise RPMError('invalid RPM file, signature area not found')
 
         # consume signature area
-        self.signature = Signature(self.rpmfile)
+        self.signature = Signature(self.rpmfile, use_numpy=use_numpy, stats=self.stats)
 
-    def _read_header(self):
+    def _read_header(self, use_numpy=False):
         ''' read information header '''
 
+        # the header follows the signature, padded to a 8 byte boundary
+        padding = -self.signature.header_range[1] % 8
+        if len(self.rpmfile.read(padding)) != padding:
+            raise RPMError('truncated RPM file, header not found')
+
         # find the start of the header
         if not self._find_magic_number():
             raise RPMError('invalid RPM file, header not found')
 
         # consume header area
-        self.header = Header(self.rpmfile)
+        self.header = Header(self.rpmfile, use_numpy=use_numpy, stats=self.stats)
 
     def _find_magic_number(self):
-        ''' find a magic number in a buffer
+        ''' find a header magic number at the current position
+
+            The sections are located by their sizes, so the magic number is
+            expected right here. Only a small window ahead is searched in case
+            the file has unusual padding.
         '''
-        string = self.rpmfile.read(1)
-        while True:
-            match = HeaderBase.MAGIC_NUMBER_MATCHER.search(string)
-            if match:
-                self.rpmfile.seek(-3, 1)
-                return True
-            byte = self.rpmfile.read(1)
-            if not byte:
-                return False
-            else:
-                string += byte
-        return False
+        start = self.rpmfile.tell()
+        data = self.rpmfile.read(self.MAGIC_NUMBER_SEARCH_LIMIT)
+        position = data.find(HeaderBase.MAGIC_NUMBER)
+        if position == -1:
+            return False
+        self.rpmfile.seek(start + position)
+        return True
 
     def _match_composite(self):
         # files
-        try:
-            for idx, name in enumerate(self.header[1117]):
-                dirname = self.header[1118][self.header[1116][idx]]
-                self.filelist.append(RPMFile(
-                    name=dirname + name,
-                    size=self.header[1028][idx],
-                    mode=self.header[1030][idx],
-                    rdevice=self.header[1033][idx],
-                    time=self.header[1034][idx],
-                    digest=self.header[1035][idx],
-                    link_to=self.header[1036][idx],
-                    flags=self.header[1037][idx],
-                    username=self.header[1039][idx],
-                    group=self.header[1040][idx],
-                    verify_flags=self.header[1045][idx],
-                    device=self.header[1095][idx],
-                    inode=self.header[1096][idx],
-                    language=self.header[1097][idx],
-                    color=self.header[1140][idx] if 1140 in self.header else None,
-                    content_class=self.header[1142][self.header[1141][idx]] if 1142 in self.header and 1141 in self.header else None,
-                    type='dir' if stat.S_ISDIR(self.header[1030][idx] & 65535) else ('ghost' if (self.header[1037][idx] & 64) else 'file'),
-                    primary=('bin/' in dirname or dirname.startswith('/etc/'))))
-        except:
-            pass
+        self.files = self.filelist = FileTable(self.header)
 
         # change log
         try:
@@ -423,17 +1062,27 @@ class RPM(object):
         except:
             pass
 
-    def _compute_checksum(self):
-        self.rpmfile.seek(0)
-        m = hashlib.sha256()
-        size = 0
-        data = self.rpmfile.read()
-        while data:
-            size += len(data)
-            m.update(data)
-            data = self.rpmfile.read()
-        self.filesize = size
-        self.checksum = m.hexdigest()
+    def _compute_checksum(self, reader=None):
+        ''' digest the package file in chunks
+
+            reader already hashed the lead and headers while they were read,
+            so only the rest of the file is read here.
+        '''
+        timer = self.stats.timer if self.stats is not None else null_timer
+        with timer('compute_checksum'):
+            if reader is None:
+                self.rpmfile.seek(0)
+                reader = _DigestReader(self.rpmfile, [hashlib.new(name) for name in self.checksum_types])
+            else:
+                self.rpmfile.seek(reader.size)
+            position = reader.size
+
+            while reader.read(self.CHECKSUM_CHUNK_SIZE):
+                pass
+        self._filesize = reader.size
+        if self.stats is not None:
+            self.stats.count('bytes_read', reader.size - position)
+        self._checksums = dict((name, digest.hexdigest()) for name, digest in zip(self.checksum_types, reader.digests))
 
     def _stringToVersion(self, verstring):
         if verstring in [None, '']:
@@ -441,7 +1090,7 @@ class RPM(object):
         i = verstring.find(':')
         if i != -1:
             try:
-                epoch = str(long(verstring[:i]))
+                epoch = str(int(verstring[:i]))
             except ValueError:
                 # look, garbage in the epoch field, how fun, kill it
                 epoch = '0'  # this is our fallback, deal
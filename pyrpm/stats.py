@@ -0,0 +1,96 @@
+'''
+Instrumentation of package reading and metadata generation
+
+A Stats object handed to RPM (or YumRepository) accumulates the wall time of
+every processing stage and counters like the bytes read and the header
+entries decoded. Without a Stats object the stages run through null_timer,
+which does nothing, so instrumentation costs next to nothing when disabled.
+'''
+from timeit import default_timer
+
+
+class _Timer(object):
+    ''' context manager adding the time spent inside it to a stage '''
+    __slots__ = ('stats', 'stage', 'start')
+
+    def __init__(self, stats, stage):
+        self.stats = stats
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = default_timer()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stats.add_time(self.stage, default_timer() - self.start)
+
+
+class _NullTimer(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+
+def null_timer(stage):
+    ''' timer of disabled instrumentation '''
+    return NULL_TIMER
+
+
+class Stats(object):
+    ''' wall time per stage and counters of a package or a repository run
+
+        times maps stage names to seconds. Reading a package records
+        read_lead, read_signature, read_header, match_composite and
+        compute_checksum, building its metadata xml_primary, xml_filelists
+        and xml_other. Saving a repository records serialize, compress, write
+        and database, reading it read_metadata.
+
+        counts maps counter names to totals: bytes_read and entries_decoded
+        for packages, packages and bytes_written for repositories.
+
+        For repositories every package is read with a Stats of its own, which
+        is added to the totals of the repository's Stats and, if given, passed
+        to callback(href, stats) once the package is done.
+    '''
+
+    def __init__(self, callback=None):
+        self.times = {}
+        self.counts = {}
+        self.callback = callback
+
+    def __repr__(self):
+        return 'Stats(times=%r, counts=%r)' % (self.times, self.counts)
+
+    def timer(self, stage):
+        ''' context manager timing a stage '''
+        return _Timer(self, stage)
+
+    def add_time(self, stage, seconds):
+        self.times[stage] = self.times.get(stage, 0.0) + seconds
+
+    def count(self, name, value=1):
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    def merge(self, other):
+        ''' add the times and counts of another Stats '''
+        for stage, seconds in other.times.items():
+            self.add_time(stage, seconds)
+        for name, value in other.counts.items():
+            self.count(name, value)
+
+    def package(self, name, stats):
+        ''' record the Stats of a package that is done '''
+        self.merge(stats)
+        self.count('packages')
+        if self.callback is not None:
+            self.callback(name, stats)
+
+    def as_dict(self):
+        return {'times': dict(self.times), 'counts': dict(self.counts)}
@@ -0,0 +1,180 @@
+'''
+Compression of repository metadata files
+
+Metadata files are compressed with gzip (gz), bzip2 (bz2) or xz. gzip can be
+compressed on several threads: the data is cut into blocks which are
+compressed independently (zlib releases the GIL) and written as the members
+of a standard multi-member gzip file, which every gzip reader decompresses
+as one stream. The output only depends on the data, the level and the block
+size, not on the number of threads.
+'''
+import bz2
+from collections import deque
+import gzip
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import zlib
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+from pyrpm.payload import DecompressingReader
+
+COMPRESSIONS = ('gz', 'bz2', 'xz')
+DEFAULT_LEVELS = {'gz': 9, 'bz2': 9, 'xz': 6}
+BLOCK_SIZE = 1024 * 1024
+
+# payload compressor names understood by DecompressingReader
+_PAYLOAD_COMPRESSORS = {'bz2': 'bzip2', 'xz': 'xz'}
+
+
+def _gzip_compressor(level):
+    # wbits 16 + 15 writes a gzip header (without file name and time) and trailer
+    return zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+
+def _gzip_member(block, level):
+    compressor = _gzip_compressor(level)
+    return compressor.compress(block) + compressor.flush()
+
+
+def _compressor(compression, level):
+    if compression == 'gz':
+        return _gzip_compressor(level)
+    if compression == 'bz2':
+        return bz2.BZ2Compressor(level)
+    if compression == 'xz':
+        if lzma is None:
+            raise ValueError('xz compression needs the lzma module')
+        return lzma.LZMACompressor(lzma.FORMAT_XZ, preset=level)
+    raise ValueError('unsupported compression %s' % (compression, ))
+
+
+class CompressingWriter(object):
+    ''' file wrapper compressing the data written through it into one stream,
+        close writes the end of the stream but does not close file
+    '''
+
+    def __init__(self, file, compression='gz', level=None):
+        self.file = file
+        self.compressor = _compressor(compression, DEFAULT_LEVELS[compression] if level is None else level)
+
+    def write(self, data):
+        data = self.compressor.compress(data)
+        if data:
+            self.file.write(data)
+
+    def close(self):
+        if self.compressor is not None:
+            self.file.write(self.compressor.flush())
+            self.compressor = None
+
+    def abort(self):
+        ''' drop the stream without writing its end '''
+        self.compressor = None
+
+
+class ParallelGzipWriter(object):
+    ''' file wrapper writing multi-member gzip, the data written through it is
+        cut into blocks of block_size compressed by a pool of threads
+
+        At most two blocks per thread are in flight, the members are written
+        in order as they complete; with a single thread the blocks are
+        compressed right away without a pool. close writes the remaining data
+        but does not close file, abort stops the pool on errors.
+    '''
+
+    def __init__(self, file, level=None, threads=None, block_size=BLOCK_SIZE):
+        self.file = file
+        self.level = DEFAULT_LEVELS['gz'] if level is None else level
+        self.threads = threads or multiprocessing.cpu_count()
+        self.block_size = block_size
+        self.buffer = []
+        self.buffered = 0
+        self.members = 0
+        self.pending = deque()
+        self.pool = None
+
+    def write(self, data):
+        self.buffer.append(data)
+        self.buffered += len(data)
+        if self.buffered >= self.block_size:
+            data = b''.join(self.buffer)
+            end = len(data) - len(data) % self.block_size
+            for start in range(0, end, self.block_size):
+                self._submit(data[start:start + self.block_size])
+            self.buffer = [data[end:]]
+            self.buffered = len(data) - end
+
+    def _submit(self, block):
+        self.members += 1
+        if self.threads == 1:
+            self.file.write(_gzip_member(block, self.level))
+            return
+        if self.pool is None:
+            self.pool = ThreadPool(self.threads)
+        self.pending.append(self.pool.apply_async(_gzip_member, (block, self.level)))
+        while len(self.pending) > 2 * self.threads:
+            self.file.write(self.pending.popleft().get())
+
+    def close(self):
+        if self.buffer is None:
+            return
+        data = b''.join(self.buffer)
+        self.buffer = None
+        try:
+            if data or not self.members:
+                self._submit(data)
+            while self.pending:
+                self.file.write(self.pending.popleft().get())
+        finally:
+            self._stop()
+
+    def abort(self):
+        ''' drop the data not written yet and stop the pool '''
+        self.buffer = None
+        self._stop()
+
+    def _stop(self):
+        self.pending.clear()
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+
+def compressing_writer(file, compression='gz', level=None, threads=1):
+    ''' file wrapper compressing the data written through it with the named
+        compression and level (None for its default), gzip on threads threads
+        (None for one per CPU)
+
+        The writer has to be closed, or aborted if writing fails.
+
+        gzip is always written in blocks, so the output is the same for any
+        number of threads.
+    '''
+    if compression not in COMPRESSIONS:
+        raise ValueError('unsupported compression %s' % (compression, ))
+    if compression == 'gz':
+        return ParallelGzipWriter(file, level, threads)
+    return CompressingWriter(file, compression, level)
+
+
+def compression_of(filename):
+    ''' the compression of a file named by its suffix, None if not compressed '''
+    suffix = filename.rpartition('.')[2]
+    return suffix if suffix in COMPRESSIONS else None
+
+
+def decompressing_reader(file, compression):
+    ''' file-like reader decompressing file '''
+    if compression == 'gz':
+        # reads all members of multi-member files
+        return gzip.GzipFile(fileobj=file)
+    if compression in _PAYLOAD_COMPRESSORS:
+        return DecompressingReader(file, _PAYLOAD_COMPRESSORS[compression])
+    if compression is None:
+        return file
+    raise ValueError('unsupported compression %s' % (compression, ))
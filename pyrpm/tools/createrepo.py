@@ -1,15 +1,20 @@
-import gzip
 import hashlib
+import multiprocessing
+import optparse
 import os
 import os.path
+import pickle
+import sys
+from timeit import default_timer
 try:
     from xml.etree import cElementTree as ElementTree
 except:
     from xml.etree import ElementTree
 
-# try to import the best StringIO
-from StringIO import StringIO
-
+from pyrpm.stats import Stats, null_timer
+from pyrpm.tools import sqlitedb
+from pyrpm.tools.compression import COMPRESSIONS, compressing_writer, compression_of, decompressing_reader
+from pyrpm.tools.storage import LocalStorage
 from pyrpm.yum import YumPackage
 
 # monkey-patch ElementTree 1.2.6 and below to make register_namespace work
@@ -56,156 +61,626 @@ def register_namespace(name, ns):
         ElementTree.register_namespace(name, ns)
 
 
-class YumRepository(object):
+def find_packages(path):
+    ''' sorted paths of all packages below path, skipping repodata '''
+    packages = []
+    for dirpath, dirnames, filenames in os.walk(path):
+        if 'repodata' in dirnames:
+            dirnames.remove('repodata')
+        packages.extend(os.path.join(dirpath, filename) for filename in filenames if filename.endswith('.rpm'))
+    return sorted(packages)
+
+
+def _metadata(package, clog_limit=0, stats=None):
+    ''' build the (pkgid, primary, filelists, other) metadata of package,
+        timing the builders in stats if given
+    '''
+    timer = stats.timer if stats is not None else null_timer
+    with timer('xml_primary'):
+        primary = package.xml_primary_metadata()
+    with timer('xml_filelists'):
+        filelists = package.xml_filelists_metadata()
+    with timer('xml_other'):
+        other = package.xml_other_metadata(clog_limit)
+    return (package.checksum, primary, filelists, other)
+
+
+def _read_package(job):
+    ''' build the metadata nodes of the package described by job, followed by
+        the Stats of reading it if requested
+    '''
+    path, href, clog_limit, with_stats = job
+    stats = Stats() if with_stats else None
+    with YumPackage.open(path, stats=stats) as package:
+        package.location = href
+        return _metadata(package, clog_limit, stats) + (stats, )
+
+
+def _read_package_serialized(job):
+    ''' _read_package for worker processes, returning the nodes as XML strings '''
+    result = _read_package(job)
+    return (result[0], ) + tuple(ElementTree.tostring(node) for node in result[1:4]) + (result[4], )
+
+
+def _escape_cdata(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def _escape_attrib(text):
+    return _escape_cdata(text).replace('"', '&quot;').replace('\r', '&#13;').replace('\n', '&#10;').replace('\t', '&#09;')
+
+
+def _qname(name, namespaces):
+    if name[:1] != '{':
+        return name
+    uri, local = name[1:].split('}', 1)
+    prefix = namespaces[uri]
+    return prefix + ':' + local if prefix else local
+
+
+def _serialize(write, node, namespaces):
+    ''' write node as XML, namespaces maps the uris declared so far to prefixes '''
+    items = list(node.attrib.items())
+
+    # declare unknown namespaces on the node itself
+    declarations = []
+    for name in [node.tag] + [key for key, value in items]:
+        if name[:1] == '{':
+            uri = name[1:].split('}', 1)[0]
+            if uri not in namespaces:
+                namespaces = dict(namespaces)
+                namespaces[uri] = 'ns%d' % (len(namespaces), )
+                declarations.append((namespaces[uri], uri))
+
+    tag = _qname(node.tag, namespaces)
+    write('<' + tag)
+    for key, value in items:
+        write(' %s="%s"' % (_qname(key, namespaces), _escape_attrib(value)))
+    for prefix, uri in declarations:
+        write(' xmlns:%s="%s"' % (prefix, _escape_attrib(uri)))
+
+    if node.text or len(node):
+        write('>')
+        if node.text:
+            write(_escape_cdata(node.text))
+        for child in node:
+            _serialize(write, child, namespaces)
+        write('</' + tag + '>')
+    else:
+        write(' />')
+
+    if node.tail:
+        write(_escape_cdata(node.tail))
+
+
+def _replace(source, destination):
+    ''' move source over destination, atomically where the platform allows it '''
+    if hasattr(os, 'replace'):
+        os.replace(source, destination)
+    else:
+        if os.name == 'nt' and os.path.exists(destination):
+            os.remove(destination)
+        os.rename(source, destination)
+
+
+class _TimedWriter(object):
+    ''' file wrapper adding the time spent writing (and closing) to a stage
+        of stats, less the time recorded meanwhile for the stage exclude
+    '''
+
+    def __init__(self, file, stats, stage, exclude=None):
+        self.file = file
+        self.stats = stats
+        self.stage = stage
+        self.exclude = exclude
+
+    def _timed(self, function, *args):
+        excluded = self.stats.times.get(self.exclude, 0.0)
+        start = default_timer()
+        result = function(*args)
+        self.stats.add_time(self.stage, default_timer() - start - (self.stats.times.get(self.exclude, 0.0) - excluded))
+        return result
+
+    def write(self, data):
+        return self._timed(self.file.write, data)
+
+    def flush(self):
+        return self._timed(self.file.flush)
+
+    def close(self):
+        return self._timed(self.file.close)
+
+
+class _HashingWriter(object):
+    ''' file wrapper computing size and sha256 of the data written through it,
+        without a file the data is only counted and hashed
+    '''
+
+    def __init__(self, file=None):
+        self.file = file
+        self.size = 0
+        self.digest = hashlib.sha256()
+
+    def write(self, data):
+        if self.file is not None:
+            self.file.write(data)
+        self.size += len(data)
+        self.digest.update(data)
+
+    def flush(self):
+        if self.file is not None:
+            self.file.flush()
+
+    def hexdigest(self):
+        return self.digest.hexdigest()
 
-    def __init__(self, repodir):
+
+def _primary_pkgid(node):
+    return node.find('{http://linux.duke.edu/metadata/common}checksum[@pkgid="YES"]').text
+
+
+def _pkgid(node):
+    return node.attrib['pkgid']
+
+
+class YumRepository(object):
+    CACHE_VERSION = 2
+    CHUNK_SIZE = 1024 * 1024
+    METADATA_TYPES = ('primary', 'filelists', 'other')
+    METADATA_NODES = {
+        'primary': ("{http://linux.duke.edu/metadata/common}package", _primary_pkgid),
+        'filelists': ("{http://linux.duke.edu/metadata/filelists}package", _pkgid),
+        'other': ("{http://linux.duke.edu/metadata/other}package", _pkgid),
+    }
+    METADATA_ROOTS = {
+        'primary': ('{http://linux.duke.edu/metadata/common}metadata', {'http://linux.duke.edu/metadata/common': '', 'http://linux.duke.edu/metadata/rpm': 'rpm'}),
+        'filelists': ('{http://linux.duke.edu/metadata/filelists}filelists', {'http://linux.duke.edu/metadata/filelists': ''}),
+        'other': ('{http://linux.duke.edu/metadata/other}otherdata', {'http://linux.duke.edu/metadata/other': ''}),
+    }
+
+    def __init__(self, repodir, stats=None, storage=None, compression='gz', compression_level=None, compression_threads=None,
+                 database_compression='bz2'):
+        ''' repodir - directory of the repository, containing repodata
+            stats - pyrpm.stats.Stats collecting the times and counts of the
+                    packages read and of reading and saving the metadata
+            storage - backend the metadata is read from (see
+                      pyrpm.tools.storage), by default repodir itself; save
+                      always writes to repodir
+            compression - compression of the XML metadata files written by
+                          save, gz, bz2 or xz (see pyrpm.tools.compression)
+            compression_level - level of compression, None for its default
+            compression_threads - threads compressing gz files, None for one
+                                  per CPU
+            database_compression - compression of the sqlite databases
+        '''
+        for name in (compression, database_compression):
+            if name not in COMPRESSIONS:
+                raise ValueError('unsupported compression %s' % (name, ))
         self.repodir = repodir
+        self.stats = stats
+        self.storage = storage if storage is not None else LocalStorage(repodir)
+        self.compression = compression
+        self.compression_level = compression_level
+        self.compression_threads = compression_threads
+        self.database_compression = database_compression
         self.primary_data = {}
         self.filelists_data = {}
         self.other_data = {}
 
-    def read(self):
-        # open repomd to find xml files
-        with self._retr_file('repodata/repomd.xml') as file:
-            repomd_tree = ElementTree.parse(file)
-
-        # read XML files
-        for type, dictionary, node_filter, id_func in [
-                ('primary', self.primary_data, "{http://linux.duke.edu/metadata/common}package", lambda x: x.find('{http://linux.duke.edu/metadata/common}checksum[@pkgid="YES"]').text),
-                ('filelists', self.filelists_data, "{http://linux.duke.edu/metadata/filelists}package", lambda x: x.attrib['pkgid']),
-                ('other', self.other_data, "{http://linux.duke.edu/metadata/other}package", lambda x: x.attrib['pkgid'])]:
-
-            # find location
-            node = repomd_tree.find("{http://linux.duke.edu/metadata/repo}data[@type='" + type + "']")
-            if node is None:
-                continue
-
-            # parse file
-            self._read_meta(node.find('{http://linux.duke.edu/metadata/repo}location').get('href', None), dictionary, node_filter, id_func)
-
-    def save(self):
-        # create XML files
-        primary_file, primary_file_gz = self._create_meta(self.primary_data, '{http://linux.duke.edu/metadata/common}metadata', 'http://linux.duke.edu/metadata/common')
-        filelists_file, filelists_file_gz = self._create_meta(self.filelists_data, '{http://linux.duke.edu/metadata/filelists}filelists', 'http://linux.duke.edu/metadata/filelists')
-        other_file, other_file_gz = self._create_meta(self.other_data, '{http://linux.duke.edu/metadata/other}otherdata', 'http://linux.duke.edu/metadata/other')
-
-        # create repomd
-        tree = ElementTree.ElementTree(ElementTree.Element("{http://linux.duke.edu/metadata/repo}repomd"))
-
-        # compute file-stuff
-        for type, file, file_gz, filename in [
-                ('primary', primary_file, primary_file_gz, 'repodata/primary.xml.gz'),
-                ('filelists', filelists_file, filelists_file_gz, 'repodata/filelists.xml.gz'),
-                ('other', other_file, other_file_gz, 'repodata/other.xml.gz')]:
-
-            # compute file numbers (size, checksum)
-            open_size = file.tell()
-            open_checksum = self._hash(file)
-            normal_size = file_gz.tell()
-            normal_checksum = self._hash(file_gz)
-
-            # create XML
-            e = ElementTree.Element("{http://linux.duke.edu/metadata/repo}data", {'type': type})
-            self._add_node(e, "{http://linux.duke.edu/metadata/repo}checksum", {'type': 'sha256'}, text=normal_checksum)
-            self._add_node(e, "{http://linux.duke.edu/metadata/repo}size", text=str(normal_size))
-            self._add_node(e, "{http://linux.duke.edu/metadata/repo}open-checksum", {'type': 'sha256'}, text=open_checksum)
-            self._add_node(e, "{http://linux.duke.edu/metadata/repo}open-size", text=str(open_size))
-            self._add_node(e, "{http://linux.duke.edu/metadata/repo}location", {'href': filename})
-            tree.getroot().append(e)
-
-            # write files
-            self._store_file(file_gz, filename)
-
-            # close files
-            file.close()
-            file_gz.close()
-
-        # map namespaces
-        register_namespace('rpm', 'http://linux.duke.edu/metadata/rpm')
-        register_namespace('', 'http://linux.duke.edu/metadata/repo')
-
-        # write everything out
-        file = StringIO()
-        file.write("<?xml version='1.0' encoding='utf-8'?>\n")
-        tree.write(file, encoding='utf-8')
-        self._store_file(file, 'repodata/repomd.xml')
-        file.close()
+    def _timer(self, stage):
+        return self.stats.timer(stage) if self.stats is not None else null_timer(stage)
+
+    def read(self, types=METADATA_TYPES):
+        ''' load the package nodes of the given metadata types from repodata '''
+        with self._timer('read_metadata'):
+            locations = self._locations()
+            for type, dictionary in [
+                    ('primary', self.primary_data),
+                    ('filelists', self.filelists_data),
+                    ('other', self.other_data)]:
+                location, checksum = locations.get(type, (None, None))
+                if type in types and location:
+                    for pkgid, node in self._read_meta(location, *self.METADATA_NODES[type], checksum=checksum):
+                        dictionary[pkgid] = node
+
+    def iter_metadata(self, type):
+        ''' stream the (pkgid, package node) pairs of a metadata type from repodata
+
+            The file is parsed incrementally and the nodes are dropped from the
+            document once handed out, so memory use does not grow with the size
+            of the repository unless the caller keeps the nodes.
+        '''
+        location, checksum = self._locations().get(type, (None, None))
+        if location:
+            for item in self._read_meta(location, *self.METADATA_NODES[type], checksum=checksum):
+                yield item
+
+    def iter_packages(self, types=METADATA_TYPES):
+        ''' stream (pkgid, primary, filelists, other) tuples from repodata
+
+            Only the metadata types listed in types are read, the others are
+            None. The metadata files are read side by side and have to list the
+            packages in the same order, as createrepo tools write them.
+        '''
+        locations = self._locations()
+        streams = {}
+        for type in types:
+            location, checksum = locations.get(type, (None, None))
+            if location:
+                streams[type] = self._read_meta(location, *self.METADATA_NODES[type], checksum=checksum)
+
+        while streams:
+            items = dict((type, next(stream, None)) for type, stream in streams.items())
+            if not any(items.values()):
+                return
+            pkgids = set(item and item[0] for item in items.values())
+            if len(pkgids) != 1 or None in pkgids:
+                raise ValueError('metadata files list different packages at the same position')
+            yield (pkgids.pop(), ) + tuple(items[type][1] if type in items else None for type in self.METADATA_TYPES)
+
+    def save(self, databases=False):
+        ''' write the metadata files and repomd.xml
+
+            Every package node is serialized straight into the compressed
+            stream of its metadata file, the open and compressed sizes and
+            checksums are computed along the way. All files are written under
+            temporary names and moved into place once complete, repomd.xml
+            last. Metadata files left over from other compressions are removed.
+
+            With databases set the sqlite versions of the metadata files
+            (primary_db, filelists_db and other_db) are written as well.
+        '''
+        self.write_metadata(dict((type, (data.values, len(data))) for type, data in [
+            ('primary', self.primary_data),
+            ('filelists', self.filelists_data),
+            ('other', self.other_data)]), databases)
+
+    def write_metadata(self, sources, databases=False):
+        ''' write metadata files and repomd.xml from streams of package nodes
+
+            sources maps every metadata type to a (nodes, count) pair, nodes
+            being a function returning an iterable over the count package
+            nodes of the type. It is called once for the XML file and once
+            more for the database, so the nodes can be streamed from
+            elsewhere instead of being held in the repository. See save.
+        '''
+        repomd = ElementTree.Element("{http://linux.duke.edu/metadata/repo}repomd")
+        written = []
+        try:
+            # create XML files
+            for type in self.METADATA_TYPES:
+                nodes, count = sources[type]
+                root_tag, namespaces = self.METADATA_ROOTS[type]
+                filename = 'repodata/%s.xml.%s' % (type, self.compression)
+                temp_path, open_size, open_checksum, size, checksum = self._write_meta(filename, nodes(), count, root_tag, namespaces)
+                written.append((temp_path, filename))
+                repomd.append(self._data_node(type, filename, open_size, open_checksum, size, checksum))
+
+                # create database
+                if databases:
+                    filename = 'repodata/%s.sqlite.%s' % (type, self.database_compression)
+                    database_path = self._temp_path('repodata/%s.sqlite' % (type, ))
+                    try:
+                        with self._timer('database'):
+                            sqlitedb.DATABASES[type](database_path, nodes(), checksum)
+                            temp_path, open_size, open_checksum, size, checksum = self._compress_file(database_path, filename)
+                    finally:
+                        if os.path.exists(database_path):
+                            os.remove(database_path)
+                    written.append((temp_path, filename))
+                    if self.stats is not None:
+                        self.stats.count('bytes_written', size)
+                    repomd.append(self._data_node(type + '_db', filename, open_size, open_checksum, size, checksum, sqlitedb.DATABASE_VERSION))
+
+            # map namespaces
+            register_namespace('rpm', 'http://linux.duke.edu/metadata/rpm')
+            register_namespace('', 'http://linux.duke.edu/metadata/repo')
+
+            # write repomd
+            temp_path = self._temp_path('repodata/repomd.xml')
+            written.append((temp_path, 'repodata/repomd.xml'))
+            with self._timer('write'):
+                with open(temp_path, 'wb') as file:
+                    file.write(b"<?xml version='1.0' encoding='utf-8'?>\n")
+                    ElementTree.ElementTree(repomd).write(file, encoding='utf-8')
+        except:
+            for temp_path, filename in written:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            raise
+
+        # swap in the new files
+        for temp_path, filename in written:
+            _replace(temp_path, os.path.join(self.repodir, filename))
+
+        # drop metadata files of other compressions
+        for type in self.METADATA_TYPES:
+            for name, compression in [('%s.xml.%%s' % (type, ), self.compression), ('%s.sqlite.%%s' % (type, ), self.database_compression)]:
+                for other in COMPRESSIONS:
+                    path = os.path.join(self.repodir, 'repodata', name % (other, ))
+                    if other != compression and os.path.exists(path):
+                        os.remove(path)
 
     def packages(self):
-        for key, value in self.primary_data.iteritems():
+        for key, value in self.primary_data.items():
             yield (key, value, self.filelists_data[key], self.other_data[key])
 
     def add_package(self, package, clog_limit=0):
-        pkgid = package.checksum
+        ''' add the metadata of a YumPackage, which has to be read with a
+            checksum as it is the pkgid
+        '''
+        if package.checksum is None:
+            raise ValueError('%s was read without a checksum, it has no pkgid' % (package.location, ))
+        if self.stats is None:
+            self._add_metadata(*_metadata(package, clog_limit))
+            return
 
-        self.primary_data[pkgid] = package.xml_primary_metadata()
-        self.filelists_data[pkgid] = package.xml_filelists_metadata()
-        self.other_data[pkgid] = package.xml_other_metadata(clog_limit)
+        # the package Stats (if it was read with one) get the builder times
+        stats = package.stats if package.stats is not None and package.stats is not self.stats else Stats()
+        self._add_metadata(*_metadata(package, clog_limit, stats))
+        self.stats.package(package.location, stats)
+
+    def add_directory(self, path, workers=1, clog_limit=0):
+        ''' add all packages found below path
+
+            With more than one worker the packages are read and their metadata
+            built in a pool of processes. Packages are added in path order either
+            way, so the result is the same as for a serial run.
+        '''
+        jobs = [(filename, self._href(filename), clog_limit, self.stats is not None) for filename in find_packages(path)]
+        for job, result in zip(jobs, self._read_packages(jobs, workers)):
+            self._add_metadata(*result[:4])
+            self._record(job[1], result[4])
+
+    def update(self, path, workers=1, clog_limit=0, cache_file=None):
+        ''' update the repository to the packages found below path
+
+            The existing repodata is read and a package cache maps the href of
+            every package to the (size, mtime, inode) it had when it was last
+            read and to its pkgid, whose metadata is then taken over from the
+            repodata. Only new or changed packages are read again, packages that
+            are gone are dropped.
+
+            The cache is kept in cache_file, by default .pyrpm-cache in the
+            repository directory. It records clog_limit, all packages are read
+            again when the limit changes.
+        '''
+        if cache_file is None:
+            cache_file = os.path.join(self.repodir, '.pyrpm-cache')
+
+        # load existing metadata and cache
+        if not self.primary_data:
+            try:
+                self.read()
+            except (IOError, OSError):
+                pass
+        cache = self._load_cache(cache_file, clog_limit)
+
+        # keep unchanged packages, collect the others to be read
+        hrefs = []
+        packages = {}
+        jobs = []
+        for filename in find_packages(path):
+            href = self._href(filename)
+            info = os.stat(filename)
+            key = (info.st_size, info.st_mtime, info.st_ino)
+            hrefs.append(href)
+
+            cached = cache.get(href)
+            if cached is not None and cached[:3] == key and cached[3] in self.primary_data and cached[3] in self.filelists_data and cached[3] in self.other_data:
+                packages[href] = cached
+            else:
+                jobs.append((filename, href, clog_limit, key))
+
+        # drop packages that are gone or changed
+        kept = set(package[3] for package in packages.values())
+        for pkgid in list(self.primary_data):
+            if pkgid not in kept:
+                self.remove_package(pkgid)
+
+        # read new and changed packages
+        for job, result in zip(jobs, self._read_packages([job[:3] + (self.stats is not None, ) for job in jobs], workers)):
+            self._add_metadata(*result[:4])
+            self._record(job[1], result[4])
+            packages[job[1]] = job[3] + (result[0], )
+
+        # restore path order
+        for data in (self.primary_data, self.filelists_data, self.other_data):
+            nodes = dict(data)
+            data.clear()
+            for href in hrefs:
+                pkgid = packages[href][3]
+                if pkgid not in data:
+                    data[pkgid] = nodes[pkgid]
+
+        self._save_cache(cache_file, packages, clog_limit)
 
     def remove_package(self, pkgid):
         for part in (self.primary_data, self.filelists_data, self.other_data):
             if pkgid in part:
                 del part[pkgid]
 
-    def _read_meta(self, location, dictionary, search_str, id_func):
-        if not location:
-            return
+    def _add_metadata(self, pkgid, primary, filelists, other):
+        self.primary_data[pkgid] = primary
+        self.filelists_data[pkgid] = filelists
+        self.other_data[pkgid] = other
+
+    def _record(self, href, stats):
+        ''' add the Stats of a package read to the repository totals '''
+        if stats is not None and self.stats is not None:
+            self.stats.package(href, stats)
+
+    def _read_packages(self, jobs, workers):
+        ''' read the packages of jobs, yielding their metadata in job order '''
+        if workers > 1 and len(jobs) > 1:
+            pool = multiprocessing.Pool(workers)
+            try:
+                for result in pool.imap(_read_package_serialized, jobs, chunksize=max(1, min(64, len(jobs) // (4 * workers)))):
+                    yield (result[0], ) + tuple(ElementTree.fromstring(node) for node in result[1:4]) + (result[4], )
+            except:
+                # a package failed (or the caller stopped), drop the queued ones
+                pool.terminate()
+                pool.join()
+                raise
+            pool.close()
+            pool.join()
+        else:
+            for job in jobs:
+                yield _read_package(job)
+
+    def _load_cache(self, cache_file, clog_limit):
+        ''' the cached packages, none if the cache was written with another
+            changelog limit
+        '''
+        try:
+            with open(cache_file, 'rb') as file:
+                cache = pickle.load(file)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return {}
+        if not isinstance(cache, dict) or cache.get('version') != self.CACHE_VERSION or cache.get('clog_limit') != clog_limit:
+            return {}
+        return cache['packages']
+
+    def _save_cache(self, cache_file, packages, clog_limit):
+        temp_file = cache_file + '.tmp'
+        with open(temp_file, 'wb') as file:
+            pickle.dump({'version': self.CACHE_VERSION, 'clog_limit': clog_limit, 'packages': packages}, file, pickle.HIGHEST_PROTOCOL)
+        _replace(temp_file, cache_file)
+
+    def _href(self, path):
+        return os.path.relpath(path, self.repodir).replace(os.sep, '/')
+
+    def _locations(self):
+        ''' map metadata types to their location in repomd and its checksum,
+            a (type, hexdigest) pair or None
+        '''
+        with self._retr_file('repodata/repomd.xml') as file:
+            repomd_tree = ElementTree.parse(file)
 
-        # parse primary XML
-        with self._retr_file(location) as file:
-            file_gz = gzip.GzipFile(fileobj=file)
-            tree = ElementTree.parse(file_gz)
-            file_gz.close()
-
-        # read package nodes
-        for pkg_node in tree.findall(search_str):
-            dictionary[id_func(pkg_node)] = pkg_node
-
-    def _create_meta(self, list, root_tag, local_namespace):
-        # create complete document
-        tree = ElementTree.ElementTree(ElementTree.Element(root_tag))
-        tree.getroot().set('packages', str(len(list)))
-        for pkg_node in list.items():
-            tree.getroot().append(pkg_node[1])
-
-        # map namespaces
-        register_namespace('rpm', 'http://linux.duke.edu/metadata/rpm')
-        register_namespace('', local_namespace)
-
-        # write it out
-        output = StringIO()
-        output_gz = StringIO()
-        primary_file = gzip.GzipFile(fileobj=output_gz, mode='w')
-        for file_obj in (output, primary_file):
-            file_obj.write("<?xml version='1.0' encoding='utf-8'?>\n")
-            tree.write(file_obj, 'utf-8')
-
-        return output, output_gz
-
-    def _retr_file(self, filename):
-        return open(os.path.join(self.repodir, filename), 'rb')
-
-    def _store_file(self, file, filename):
-        # check for folder
-        if not os.path.exists(os.path.dirname(os.path.join(self.repodir, filename))):
-            os.mkdir(os.path.dirname(os.path.join(self.repodir, filename)))
-
-        # store file
-        file.seek(0)
-        with open(os.path.join(self.repodir, filename), 'wb') as fs_file:
-            data = file.read()
-            while data:
-                fs_file.write(data)
-                data = file.read()
-
-    def _hash(self, file):
-        file.seek(0)
-        m = hashlib.sha256()
-        data = file.read()
-        while data:
-            m.update(data)
-            data = file.read()
-        return m.hexdigest()
+        locations = {}
+        for node in repomd_tree.findall("{http://linux.duke.edu/metadata/repo}data"):
+            location = node.find('{http://linux.duke.edu/metadata/repo}location')
+            checksum = node.find('{http://linux.duke.edu/metadata/repo}checksum')
+            if location is not None:
+                locations[node.get('type')] = (location.get('href', None), (checksum.get('type'), checksum.text.strip()) if checksum is not None and checksum.text else None)
+        return locations
+
+    def _read_meta(self, location, search_str, id_func, checksum=None):
+        with self._retr_file(location, checksum) as file:
+            reader = decompressing_reader(file, compression_of(location))
+            try:
+                root = None
+                for event, node in ElementTree.iterparse(reader, events=('start', 'end')):
+                    if root is None:
+                        root = node
+                    elif event == 'end' and node.tag == search_str:
+                        yield id_func(node), node
+
+                        # drop handed out package nodes from the document
+                        root.clear()
+            finally:
+                reader.close()
+
+    def _write_meta(self, filename, nodes, count, root_tag, namespaces):
+        ''' stream count package nodes into the compressed metadata file filename
+
+            namespaces maps the namespace uris declared on the root element to
+            their prefixes. The file is written to a temporary path, which is
+            returned with the open size and checksum and the compressed size
+            and checksum.
+        '''
+        stats = self.stats
+        temp_path = self._temp_path(filename)
+        compressor = None
+        try:
+            with open(temp_path, 'wb') as file:
+                output = _HashingWriter(file if stats is None else _TimedWriter(file, stats, 'write'))
+                output_compressed = compressor = compressing_writer(output, self.compression, self.compression_level, self.compression_threads)
+                if stats is not None:
+                    output_compressed = _TimedWriter(output_compressed, stats, 'compress', exclude='write')
+                open_output = _HashingWriter(output_compressed)
+
+                # root element
+                namespaces = dict(namespaces, **{'http://www.w3.org/XML/1998/namespace': 'xml'})
+                root = ['<', _qname(root_tag, namespaces)]
+                for uri, prefix in sorted(namespaces.items(), key=lambda item: item[1]):
+                    if prefix != 'xml':
+                        root.append(' xmlns%s="%s"' % (':' + prefix if prefix else '', _escape_attrib(uri)))
+                root.append(' packages="%d">' % (count, ))
+                open_output.write(("<?xml version='1.0' encoding='utf-8'?>\n" + ''.join(root)).encode('utf-8'))
+
+                # package nodes, one at a time
+                timer = self._timer
+                for node in nodes:
+                    with timer('serialize'):
+                        chunks = []
+                        _serialize(chunks.append, node, namespaces)
+                        data = ''.join(chunks).encode('utf-8')
+                    open_output.write(data)
+
+                open_output.write(('</%s>' % (_qname(root_tag, namespaces), )).encode('utf-8'))
+                output_compressed.close()
+        except:
+            # no partial file is left behind
+            if compressor is not None:
+                compressor.abort()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        if stats is not None:
+            stats.count('bytes_written', output.size)
+        return temp_path, open_output.size, open_output.hexdigest(), output.size, output.hexdigest()
+
+    def _compress_file(self, path, filename):
+        ''' compress the file at path to a temporary path for filename with
+            the database compression
+
+            Returns the temporary path with the open size and checksum and the
+            compressed size and checksum.
+        '''
+        temp_path = self._temp_path(filename)
+        compressor = None
+        try:
+            with open(path, 'rb') as source:
+                with open(temp_path, 'wb') as file:
+                    output = _HashingWriter(file)
+                    compressor = compressing_writer(output, self.database_compression, threads=self.compression_threads)
+                    open_output = _HashingWriter(compressor)
+                    data = source.read(self.CHUNK_SIZE)
+                    while data:
+                        open_output.write(data)
+                        data = source.read(self.CHUNK_SIZE)
+                    compressor.close()
+        except:
+            if compressor is not None:
+                compressor.abort()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        return temp_path, open_output.size, open_output.hexdigest(), output.size, output.hexdigest()
+
+    def _data_node(self, type, filename, open_size, open_checksum, size, checksum, database_version=None):
+        ''' create the repomd data node of a metadata file '''
+        e = ElementTree.Element("{http://linux.duke.edu/metadata/repo}data", {'type': type})
+        self._add_node(e, "{http://linux.duke.edu/metadata/repo}checksum", {'type': 'sha256'}, text=checksum)
+        self._add_node(e, "{http://linux.duke.edu/metadata/repo}size", text=str(size))
+        self._add_node(e, "{http://linux.duke.edu/metadata/repo}open-checksum", {'type': 'sha256'}, text=open_checksum)
+        self._add_node(e, "{http://linux.duke.edu/metadata/repo}open-size", text=str(open_size))
+        self._add_node(e, "{http://linux.duke.edu/metadata/repo}location", {'href': filename})
+        if database_version is not None:
+            self._add_node(e, "{http://linux.duke.edu/metadata/repo}database_version", text=str(database_version))
+        return e
+
+    def _temp_path(self, filename):
+        path = os.path.join(self.repodir, filename)
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        return os.path.join(os.path.dirname(path), '.%s.tmp' % (os.path.basename(path), ))
+
+    def _retr_file(self, filename, checksum=None):
+        return self.storage.open(filename, checksum)
 
     def _add_node(self, parent, tag, attrib={}, text=None):
             a = ElementTree.Element(tag, attrib)
@@ -213,19 +688,37 @@ class YumRepository(object):
                 a.text = text
             parent.append(a)
 
-if __name__ == '__main__':
-    from pprint import pprint
-    from pyrpm.yum import YumPackage
-
-    repo = YumRepository("D:\\Projekte\\pyrpm\\temprepo")
-
-    # read existing repo
-    #repo.read()
+def main(argv=None):
+    parser = optparse.OptionParser(usage='%prog [options] DIRECTORY', description='create YUM metadata for the packages below DIRECTORY')
+    parser.add_option('-w', '--workers', type='int', default=multiprocessing.cpu_count(), help='number of worker processes [default: %default]')
+    parser.add_option('--changelog-limit', type='int', default=0, help='only include the last N changelog entries')
+    parser.add_option('-d', '--database', action='store_true', default=False, help='also create sqlite databases')
+    parser.add_option('--update', action='store_true', default=False, help='only read new and changed packages, reusing the existing metadata')
+    parser.add_option('--cache-file', default=None, help='package cache used by --update [default: DIRECTORY/.pyrpm-cache]')
+    parser.add_option('--stats', action='store_true', default=False, help='print the time spent in every stage')
+    parser.add_option('--compress-type', choices=list(COMPRESSIONS), default='gz', help='compression of the XML metadata, one of %s [default: %%default]' % (', '.join(COMPRESSIONS), ))
+    parser.add_option('--compress-level', type='int', default=None, help='compression level [default: the default of the compression]')
+    parser.add_option('--database-compress-type', choices=list(COMPRESSIONS), default='bz2', help='compression of the sqlite databases [default: %default]')
+    options, args = parser.parse_args(argv)
+    if len(args) != 1:
+        parser.error('exactly one directory expected')
+
+    stats = Stats() if options.stats else None
+    repo = YumRepository(args[0], stats=stats, compression=options.compress_type, compression_level=options.compress_level,
+                         compression_threads=options.workers, database_compression=options.database_compress_type)
+    if options.update:
+        repo.update(args[0], workers=options.workers, clog_limit=options.changelog_limit, cache_file=options.cache_file)
+    else:
+        repo.add_directory(args[0], workers=options.workers, clog_limit=options.changelog_limit)
+    repo.save(databases=options.database)
 
-    # add package
-    repo.add_package(YumPackage(file(os.path.join(repo.repodir, 'tcl-devel-8.5.7-6.el6.x86_64.rpm'), 'rb')))
+    if stats is not None:
+        for stage, seconds in sorted(stats.times.items(), key=lambda item: -item[1]):
+            sys.stderr.write('%-16s %10.3fs\n' % (stage, seconds))
+        for name, value in sorted(stats.counts.items()):
+            sys.stderr.write('%-16s %10d\n' % (name, value))
+    return 0
 
-    # delete package
-    #repo.remove_package('4d9c71201f9c0d11164772600d7dadc2cad0a01ac4e472210641e242ad231b3a')
 
-    repo.save()
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+'''
+mergerepo: combine the metadata of several YUM repositories
+
+The metadata is merged without reading any package. A first pass over the
+primary metadata of all repositories picks the packages to keep, a second
+pass streams the package nodes of every metadata type into the merged files,
+so memory use only grows with the number of packages, not their metadata.
+'''
+import optparse
+import os
+import sys
+
+from pyrpm.tools.createrepo import YumRepository
+
+COMMON_NS = '{http://linux.duke.edu/metadata/common}'
+XML_BASE = '{http://www.w3.org/XML/1998/namespace}base'
+
+
+def _nevra(node):
+    version = node.find(COMMON_NS + 'version')
+    return (node.findtext(COMMON_NS + 'name'), version.get('epoch') or '0', version.get('ver'), version.get('rel'), node.findtext(COMMON_NS + 'arch'))
+
+
+def _build_time(node):
+    time = node.find(COMMON_NS + 'time')
+    try:
+        return int(time.get('build')) if time is not None else 0
+    except (TypeError, ValueError):
+        return 0
+
+
+class RepositoryMerger(object):
+    ''' merge the metadata of repositories into a new repository
+
+        sources are (repodir, prefix) pairs, the location hrefs of the
+        packages of a repository are prefixed with its prefix (None for the
+        relative path from the destination to the repository). Locations
+        with an xml:base are kept as they are.
+
+        Packages are unique by pkgid, the first repository listing a pkgid
+        wins. With nevra set, packages with the same name, epoch, version,
+        release and arch are unique too, the one with the newest build time
+        wins (the first one listed on ties).
+    '''
+
+    def __init__(self, destination, sources, nevra=False):
+        self.destination = destination
+        self.sources = []
+        for repodir, prefix in sources:
+            if prefix is None:
+                prefix = os.path.relpath(repodir, destination).replace(os.sep, '/')
+            self.sources.append((repodir, '' if prefix in ('', '.') else prefix.rstrip('/') + '/'))
+        self.nevra = nevra
+        self.selected = None
+
+    def select(self):
+        ''' first pass: map the pkgids of the packages to keep to the index of
+            the repository they are taken from
+        '''
+        selected = {}
+        newest = {}
+        for index, (repodir, prefix) in enumerate(self.sources):
+            for pkgid, node in YumRepository(repodir).iter_metadata('primary'):
+                if pkgid in selected:
+                    continue
+                if self.nevra:
+                    key = _nevra(node)
+                    build_time = _build_time(node)
+                    current = newest.get(key)
+                    if current is not None:
+                        if build_time <= current[0]:
+                            continue
+                        del selected[current[1]]
+                    newest[key] = (build_time, pkgid)
+                selected[pkgid] = index
+        self.selected = selected
+        return selected
+
+    def nodes(self, type):
+        ''' second pass: the package nodes of a metadata type to keep, with
+            rewritten locations
+        '''
+        selected = self.selected
+        emitted = set()
+        for index, (repodir, prefix) in enumerate(self.sources):
+            for pkgid, node in YumRepository(repodir).iter_metadata(type):
+                if selected.get(pkgid) != index or pkgid in emitted:
+                    continue
+                emitted.add(pkgid)
+                if type == 'primary' and prefix:
+                    location = node.find(COMMON_NS + 'location')
+                    if location is not None and location.get(XML_BASE) is None:
+                        location.set('href', prefix + location.get('href', ''))
+                yield node
+
+    def merge(self, databases=False, stats=None):
+        ''' write the merged metadata to the destination, returns the number
+            of packages
+        '''
+        self.select()
+        count = len(self.selected)
+        repo = YumRepository(self.destination, stats=stats)
+        repo.write_metadata(dict((type, (lambda type=type: self.nodes(type), count)) for type in YumRepository.METADATA_TYPES), databases)
+        return count
+
+
+def merge(destination, repodirs, nevra=False, databases=False):
+    ''' merge the repositories at repodirs into destination, see
+        RepositoryMerger
+    '''
+    return RepositoryMerger(destination, [(repodir, None) for repodir in repodirs], nevra).merge(databases)
+
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage='%prog [options] REPODIR...', description='merge the metadata of YUM repositories')
+    parser.add_option('-o', '--outputdir', default='merged', help='directory of the merged repository [default: %default]')
+    parser.add_option('-n', '--nevra', action='store_true', default=False, help='also drop packages with the same NEVRA, keeping the newest build')
+    parser.add_option('-d', '--database', action='store_true', default=False, help='also create sqlite databases')
+    options, args = parser.parse_args(argv)
+    if not args:
+        parser.error('at least one repository expected')
+
+    count = merge(options.outputdir, args, options.nevra, options.database)
+    sys.stderr.write('%d packages merged\n' % (count, ))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+'''
+repomanage: select the newest builds of every package
+
+Packages are grouped by name and architecture and ordered by epoch, version
+and release with the cached sort keys of pyrpm.version. Only the name and
+version tags of each package are read (or the primary metadata of a
+repository), no full metadata is built.
+'''
+from collections import namedtuple
+import multiprocessing
+import optparse
+import os
+import sys
+
+from pyrpm.batch import scan
+from pyrpm.tools.createrepo import YumRepository, find_packages
+from pyrpm.version import evr_key
+
+COMMON_NS = '{http://linux.duke.edu/metadata/common}'
+
+Build = namedtuple("Build", ['path', 'name', 'arch', 'epoch', 'version', 'release'])
+
+
+def directory_builds(directory, workers=1):
+    ''' the builds of the packages below directory, packages that cannot be
+        read are skipped
+    '''
+    for result in scan(find_packages(directory), ('name', 'epoch', 'version', 'release', 'architecture', 'source'), workers):
+        if result.error is None:
+            tags = result.tags
+            yield Build(result.path, tags['name'], 'src' if tags['source'] else tags['architecture'],
+                        tags['epoch'], tags['version'], tags['release'])
+
+
+def repository_builds(repo):
+    ''' the builds listed in the primary metadata of repo, a YumRepository or
+        the directory of one
+    '''
+    if not isinstance(repo, YumRepository):
+        repo = YumRepository(repo)
+    repodir = repo.repodir
+    for pkgid, node in repo.iter_metadata('primary'):
+        version = node.find(COMMON_NS + 'version')
+        location = node.find(COMMON_NS + 'location')
+        yield Build(os.path.join(repodir, location.get('href')), node.findtext(COMMON_NS + 'name'), node.findtext(COMMON_NS + 'arch'),
+                    version.get('epoch'), version.get('ver'), version.get('rel'))
+
+
+def newest(builds, keep=1):
+    ''' split builds into the newest keep builds per name.arch and the older
+        ones, returning (new, old) lists sorted by name, arch and version
+    '''
+    groups = {}
+    for build in builds:
+        groups.setdefault((build.name, build.arch), []).append(build)
+
+    new = []
+    old = []
+    for key in sorted(groups):
+        group = sorted(groups[key], key=lambda build: evr_key(build.epoch, build.version, build.release), reverse=True)
+        new.extend(reversed(group[:keep]))
+        old.extend(reversed(group[keep:]))
+    return new, old
+
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage='%prog [options] DIRECTORY', description='list the newest (or old) packages below DIRECTORY')
+    parser.add_option('-o', '--old', action='store_true', default=False, help='list the old packages instead of the newest ones')
+    parser.add_option('-k', '--keep', type='int', default=1, help='number of newest builds to keep per name.arch [default: %default]')
+    parser.add_option('-r', '--repodata', action='store_true', default=False, help='read the repository metadata instead of the packages')
+    parser.add_option('-w', '--workers', type='int', default=multiprocessing.cpu_count(), help='number of worker processes [default: %default]')
+    options, args = parser.parse_args(argv)
+    if len(args) != 1:
+        parser.error('exactly one directory expected')
+    if options.keep < 1:
+        parser.error('--keep has to be at least 1')
+
+    if options.repodata:
+        builds = repository_builds(args[0])
+    else:
+        builds = directory_builds(args[0], options.workers)
+    new, old = newest(builds, options.keep)
+    for build in (old if options.old else new):
+        print(build.path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
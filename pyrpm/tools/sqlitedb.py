@@ -0,0 +1,204 @@
+'''
+sqlite versions of the YUM metadata files
+
+The databases follow the schema (version 10) written by createrepo, they are
+filled from the primary, filelists and other package nodes of a
+YumRepository.
+'''
+import os
+import sqlite3
+
+DATABASE_VERSION = 10
+
+COMMON_NS = '{http://linux.duke.edu/metadata/common}'
+RPM_NS = '{http://linux.duke.edu/metadata/rpm}'
+FILELISTS_NS = '{http://linux.duke.edu/metadata/filelists}'
+OTHER_NS = '{http://linux.duke.edu/metadata/other}'
+XML_NS = '{http://www.w3.org/XML/1998/namespace}'
+
+PRIMARY_SCHEMA = [
+    '''CREATE TABLE db_info (dbversion INTEGER, checksum TEXT)''',
+    '''CREATE TABLE packages (pkgKey INTEGER PRIMARY KEY, pkgId TEXT, name TEXT, arch TEXT, version TEXT, epoch TEXT, release TEXT, summary TEXT,
+        description TEXT, url TEXT, time_file INTEGER, time_build INTEGER, rpm_license TEXT, rpm_vendor TEXT, rpm_group TEXT, rpm_buildhost TEXT,
+        rpm_sourcerpm TEXT, rpm_header_start INTEGER, rpm_header_end INTEGER, rpm_packager TEXT, size_package INTEGER, size_installed INTEGER,
+        size_archive INTEGER, location_href TEXT, location_base TEXT, checksum_type TEXT)''',
+    '''CREATE TABLE files (name TEXT, type TEXT, pkgKey INTEGER)''',
+    '''CREATE TABLE requires (name TEXT, flags TEXT, epoch TEXT, version TEXT, release TEXT, pkgKey INTEGER, pre BOOLEAN DEFAULT FALSE)''',
+    '''CREATE TABLE provides (name TEXT, flags TEXT, epoch TEXT, version TEXT, release TEXT, pkgKey INTEGER)''',
+    '''CREATE TABLE conflicts (name TEXT, flags TEXT, epoch TEXT, version TEXT, release TEXT, pkgKey INTEGER)''',
+    '''CREATE TABLE obsoletes (name TEXT, flags TEXT, epoch TEXT, version TEXT, release TEXT, pkgKey INTEGER)''',
+]
+
+PRIMARY_INDEXES = [
+    '''CREATE INDEX packagename ON packages (name)''',
+    '''CREATE INDEX packageId ON packages (pkgId)''',
+    '''CREATE INDEX filenames ON files (name)''',
+    '''CREATE INDEX pkgfiles ON files (pkgKey)''',
+    '''CREATE INDEX pkgrequires ON requires (pkgKey)''',
+    '''CREATE INDEX requiresname ON requires (name)''',
+    '''CREATE INDEX pkgprovides ON provides (pkgKey)''',
+    '''CREATE INDEX providesname ON provides (name)''',
+    '''CREATE INDEX pkgconflicts ON conflicts (pkgKey)''',
+    '''CREATE INDEX pkgobsoletes ON obsoletes (pkgKey)''',
+    '''CREATE TRIGGER removals AFTER DELETE ON packages BEGIN
+        DELETE FROM files WHERE pkgKey = old.pkgKey;
+        DELETE FROM requires WHERE pkgKey = old.pkgKey;
+        DELETE FROM provides WHERE pkgKey = old.pkgKey;
+        DELETE FROM conflicts WHERE pkgKey = old.pkgKey;
+        DELETE FROM obsoletes WHERE pkgKey = old.pkgKey;
+        END''',
+]
+
+FILELISTS_SCHEMA = [
+    '''CREATE TABLE db_info (dbversion INTEGER, checksum TEXT)''',
+    '''CREATE TABLE packages (pkgKey INTEGER PRIMARY KEY, pkgId TEXT)''',
+    '''CREATE TABLE filelist (pkgKey INTEGER, dirname TEXT, filenames TEXT, filetypes TEXT)''',
+]
+
+FILELISTS_INDEXES = [
+    '''CREATE INDEX keyfile ON filelist (pkgKey)''',
+    '''CREATE INDEX pkgId ON packages (pkgId)''',
+    '''CREATE INDEX dirnames ON filelist (dirname)''',
+    '''CREATE TRIGGER remove_filelist AFTER DELETE ON packages BEGIN
+        DELETE FROM filelist WHERE pkgKey = old.pkgKey;
+        END''',
+]
+
+OTHER_SCHEMA = [
+    '''CREATE TABLE db_info (dbversion INTEGER, checksum TEXT)''',
+    '''CREATE TABLE packages (pkgKey INTEGER PRIMARY KEY, pkgId TEXT)''',
+    '''CREATE TABLE changelog (pkgKey INTEGER, author TEXT, date INTEGER, changelog TEXT)''',
+]
+
+OTHER_INDEXES = [
+    '''CREATE INDEX keychange ON changelog (pkgKey)''',
+    '''CREATE INDEX pkgId ON packages (pkgId)''',
+    '''CREATE TRIGGER remove_changelogs AFTER DELETE ON packages BEGIN
+        DELETE FROM changelog WHERE pkgKey = old.pkgKey;
+        END''',
+]
+
+FILE_TYPES = {'file': 'f', 'dir': 'd', 'ghost': 'g'}
+
+
+def _int(value):
+    return int(value) if value else None
+
+
+def _attr(node, name):
+    return node.get(name) if node is not None else None
+
+
+def _split_path(name):
+    ''' split a file name into dirname and basename the way createrepo does '''
+    position = name.rfind('/')
+    if position == -1:
+        return '.', name
+    return name[:position] or '/', name[position + 1:]
+
+
+def _create(path, schema, indexes, checksum, fill, nodes):
+    ''' create the database at path, filling it with fill(cursor, pkgKey, node)
+        for every node inside one transaction
+    '''
+    if os.path.exists(path):
+        os.remove(path)
+
+    connection = sqlite3.connect(path)
+    try:
+        connection.execute('PRAGMA synchronous = OFF')
+        connection.execute('PRAGMA journal_mode = OFF')
+        cursor = connection.cursor()
+        for statement in schema:
+            cursor.execute(statement)
+        cursor.execute('INSERT INTO db_info (dbversion, checksum) VALUES (?, ?)', (DATABASE_VERSION, checksum))
+        for key, node in enumerate(nodes):
+            fill(cursor, key + 1, node)
+        for statement in indexes:
+            cursor.execute(statement)
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def _fill_primary(cursor, key, node):
+    version = node.find(COMMON_NS + 'version')
+    checksum = node.find(COMMON_NS + 'checksum')
+    time = node.find(COMMON_NS + 'time')
+    size = node.find(COMMON_NS + 'size')
+    location = node.find(COMMON_NS + 'location')
+    format = node.find(COMMON_NS + 'format')
+    if format is None:
+        format = node
+    header_range = format.find(RPM_NS + 'header-range')
+
+    cursor.execute('INSERT INTO packages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', (
+        key, checksum.text, node.findtext(COMMON_NS + 'name'), node.findtext(COMMON_NS + 'arch'),
+        version.get('ver'), version.get('epoch'), version.get('rel'),
+        node.findtext(COMMON_NS + 'summary'), node.findtext(COMMON_NS + 'description'), node.findtext(COMMON_NS + 'url'),
+        _int(_attr(time, 'file')), _int(_attr(time, 'build')),
+        format.findtext(RPM_NS + 'license'), format.findtext(RPM_NS + 'vendor'), format.findtext(RPM_NS + 'group'),
+        format.findtext(RPM_NS + 'buildhost'), format.findtext(RPM_NS + 'sourcerpm'),
+        _int(_attr(header_range, 'start')), _int(_attr(header_range, 'end')),
+        node.findtext(COMMON_NS + 'packager'),
+        _int(_attr(size, 'package')), _int(_attr(size, 'installed')), _int(_attr(size, 'archive')),
+        _attr(location, 'href'), _attr(location, XML_NS + 'base'), checksum.get('type')))
+
+    cursor.executemany('INSERT INTO files VALUES (?, ?, ?)', [
+        (file.text, file.get('type', 'file'), key) for file in format.findall(FILELISTS_NS + 'file') + format.findall(COMMON_NS + 'file')])
+
+    for pcotype in ('provides', 'conflicts', 'obsoletes'):
+        cursor.executemany('INSERT INTO %s VALUES (?, ?, ?, ?, ?, ?)' % (pcotype, ), [
+            (entry.get('name'), entry.get('flags'), entry.get('epoch'), entry.get('ver'), entry.get('rel'), key)
+            for entry in format.findall('%s%s/%sentry' % (RPM_NS, pcotype, RPM_NS))])
+    cursor.executemany('INSERT INTO requires VALUES (?, ?, ?, ?, ?, ?, ?)', [
+        (entry.get('name'), entry.get('flags'), entry.get('epoch'), entry.get('ver'), entry.get('rel'), key, 1 if entry.get('pre') == '1' else 0)
+        for entry in format.findall('%srequires/%sentry' % (RPM_NS, RPM_NS))])
+
+
+def _fill_filelists(cursor, key, node):
+    cursor.execute('INSERT INTO packages VALUES (?, ?)', (key, node.get('pkgid')))
+
+    # group files by directory
+    directories = {}
+    order = []
+    for file in node.findall(FILELISTS_NS + 'file'):
+        dirname, basename = _split_path(file.text or '')
+        if dirname not in directories:
+            directories[dirname] = ([], [])
+            order.append(dirname)
+        directories[dirname][0].append(basename)
+        directories[dirname][1].append(FILE_TYPES.get(file.get('type', 'file'), 'f'))
+
+    cursor.executemany('INSERT INTO filelist VALUES (?, ?, ?, ?)', [
+        (key, dirname, '/'.join(directories[dirname][0]), ''.join(directories[dirname][1])) for dirname in order])
+
+
+def _fill_other(cursor, key, node):
+    cursor.execute('INSERT INTO packages VALUES (?, ?)', (key, node.get('pkgid')))
+    cursor.executemany('INSERT INTO changelog VALUES (?, ?, ?, ?)', [
+        (key, changelog.get('author'), _int(changelog.get('date')), changelog.text) for changelog in node.findall(OTHER_NS + 'changelog')])
+
+
+def create_primary_db(path, nodes, checksum):
+    ''' create the primary database at path from primary package nodes,
+        checksum is the checksum of the compressed primary XML file
+    '''
+    _create(path, PRIMARY_SCHEMA, PRIMARY_INDEXES, checksum, _fill_primary, nodes)
+
+
+def create_filelists_db(path, nodes, checksum):
+    ''' create the filelists database at path from filelists package nodes '''
+    _create(path, FILELISTS_SCHEMA, FILELISTS_INDEXES, checksum, _fill_filelists, nodes)
+
+
+def create_other_db(path, nodes, checksum):
+    ''' create the other database at path from other package nodes '''
+    _create(path, OTHER_SCHEMA, OTHER_INDEXES, checksum, _fill_other, nodes)
+
+
+DATABASES = {
+    'primary': create_primary_db,
+    'filelists': create_filelists_db,
+    'other': create_other_db,
+}
@@ -0,0 +1,181 @@
+'''
+Storage backends of YUM repositories
+
+A storage hands out the files of a repository by their path relative to the
+repository root. LocalStorage reads a directory, HTTPStorage fetches the
+files from a web server over a pool of keep-alive connections and verifies
+them against the checksums listed in repomd.xml. With a cache directory it
+keeps the verified metadata files and does not fetch them again as long as
+repomd.xml lists the same checksum.
+'''
+import hashlib
+import os
+import os.path
+import shutil
+import tempfile
+import threading
+
+from pyrpm.remote import connect, disconnected, parse_url
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class ChecksumError(IOError):
+    ''' a file does not match the checksum listed for it '''
+
+
+def _digest(checksum_type):
+    # repomd calls sha1 sha
+    return hashlib.new('sha1' if checksum_type == 'sha' else checksum_type)
+
+
+class LocalStorage(object):
+    ''' repository in a local directory
+
+        Checksums are not verified, the files are trusted.
+    '''
+
+    def __init__(self, root):
+        self.root = root
+
+    def open(self, filename, checksum=None):
+        ''' open filename for reading, checksum is a (type, hexdigest) pair '''
+        return open(os.path.join(self.root, filename), 'rb')
+
+    def store(self, file, filename):
+        ''' write the contents of file to filename '''
+        path = os.path.join(self.root, filename)
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+
+        file.seek(0)
+        with open(path, 'wb') as fs_file:
+            shutil.copyfileobj(file, fs_file, CHUNK_SIZE)
+
+
+class HTTPStorage(object):
+    ''' read-only repository on a web server
+
+        baseurl is the URL of the repository root. Up to connections idle
+        keep-alive connections are kept for reuse, the storage can be used
+        from several threads. Files are downloaded to temporary files, or to
+        cache_dir if given, and verified against their checksum before they
+        are handed out. Cached files are named by their checksum and used
+        again without a request while the checksum matches. requests counts
+        the requests made.
+    '''
+
+    def __init__(self, baseurl, cache_dir=None, connections=4, timeout=None, headers=None):
+        self.connection_class, self.host, path = parse_url(baseurl)
+        self.baseurl = baseurl
+        self.path = path.rstrip('/') + '/'
+        self.cache_dir = cache_dir
+        self.connections = connections
+        self.timeout = timeout
+        self.headers = dict(headers or {})
+        self.requests = 0
+
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+    def _acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return connect(self.connection_class, self.host, self.timeout)
+
+    def _release(self, connection):
+        with self._lock:
+            if len(self._idle) < self.connections:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    def _download(self, filename, file, digest=None):
+        ''' fetch filename into file, updating digest with its data '''
+        for attempt in (0, 1):
+            connection = self._acquire()
+            try:
+                connection.request('GET', self.path + filename, headers=self.headers)
+                response = connection.getresponse()
+            except Exception as error:
+                connection.close()
+                if attempt or not disconnected(error):
+                    raise
+                continue
+
+            try:
+                with self._lock:
+                    self.requests += 1
+                if response.status != 200:
+                    raise IOError('HTTP error %d %s fetching %s%s' % (response.status, response.reason, self.baseurl, filename))
+
+                file.seek(0)
+                file.truncate()
+                data = response.read(CHUNK_SIZE)
+                while data:
+                    file.write(data)
+                    if digest is not None:
+                        digest.update(data)
+                    data = response.read(CHUNK_SIZE)
+            except:
+                connection.close()
+                raise
+
+            if response.getheader('connection', '').lower() == 'close':
+                connection.close()
+            else:
+                self._release(connection)
+            file.seek(0)
+            return
+
+    def _cache_path(self, filename, checksum):
+        return os.path.join(self.cache_dir, '%s-%s' % (checksum[1], os.path.basename(filename)))
+
+    def open(self, filename, checksum=None):
+        ''' fetch filename, checksum is a (type, hexdigest) pair to verify it
+            against, raising ChecksumError on a mismatch
+        '''
+        if self.cache_dir is not None and checksum is not None:
+            path = self._cache_path(filename, checksum)
+            if os.path.exists(path):
+                return open(path, 'rb')
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            file = tempfile.NamedTemporaryFile(dir=self.cache_dir, prefix='.download-', delete=False)
+        else:
+            path = None
+            file = tempfile.TemporaryFile()
+
+        try:
+            digest = _digest(checksum[0]) if checksum is not None else None
+            self._download(filename, file, digest)
+            if digest is not None and digest.hexdigest() != checksum[1]:
+                raise ChecksumError('%s%s does not match its checksum %s:%s' % (self.baseurl, filename, checksum[0], checksum[1]))
+        except:
+            file.close()
+            if path is not None:
+                os.remove(file.name)
+            raise
+
+        if path is None:
+            return file
+        file.close()
+        os.rename(file.name, path)
+        return open(path, 'rb')
+
+    def store(self, file, filename):
+        raise IOError('%s is read-only' % (self.baseurl, ))
+
+
+def storage(location, cache_dir=None):
+    ''' the storage of a repository at location, a URL or local directory '''
+    if location.startswith('http://') or location.startswith('https://'):
+        return HTTPStorage(location, cache_dir)
+    return LocalStorage(location)
@@ -0,0 +1,203 @@
+'''
+RPM version comparison
+
+rpmvercmp compares version (or release) strings the way rpm does. Versions
+are split into alphabetic and numeric segments, separators are ignored,
+numeric segments are newer than alphabetic ones, '~' sorts before anything
+(even the end of the string) and '^' sorts after the end of the string but
+before any other segment.
+
+version_key and evr_key turn versions into tuples sorting the same way, they
+are cached so sorting many packages splits every distinct string only once.
+'''
+import re
+
+ALNUM = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789')
+DIGITS = frozenset('0123456789')
+
+# dependency flags
+LT = 2
+GT = 4
+EQ = 8
+FLAGS_MAP = {'LT': LT, 'GT': GT, 'EQ': EQ, 'LE': LT | EQ, 'GE': GT | EQ}
+
+SEGMENTS = re.compile(r'([0-9]+)|([a-zA-Z]+)|(~)|(\^)')
+
+# segment keys, ordered the way rpmvercmp orders them
+TILDE_KEY = (0, )
+END_KEY = (1, )
+CARET_KEY = (2, )
+ALPHA = 3
+NUMERIC = 4
+
+KEY_CACHE_SIZE = 100000
+_key_cache = {}
+
+
+def rpmvercmp(a, b):
+    ''' compare two version strings, returns -1, 0 or 1 '''
+    if a == b:
+        return 0
+    a = a or ''
+    b = b or ''
+    one = two = 0
+    end_one = len(a)
+    end_two = len(b)
+
+    while one < end_one or two < end_two:
+        # skip separators
+        while one < end_one and a[one] not in ALNUM and a[one] not in '~^':
+            one += 1
+        while two < end_two and b[two] not in ALNUM and b[two] not in '~^':
+            two += 1
+
+        # tilde sorts before everything else
+        tilde_one = one < end_one and a[one] == '~'
+        tilde_two = two < end_two and b[two] == '~'
+        if tilde_one or tilde_two:
+            if not tilde_one:
+                return 1
+            if not tilde_two:
+                return -1
+            one += 1
+            two += 1
+            continue
+
+        # caret sorts after the end of the string but before anything else
+        caret_one = one < end_one and a[one] == '^'
+        caret_two = two < end_two and b[two] == '^'
+        if caret_one or caret_two:
+            if one >= end_one:
+                return -1
+            if two >= end_two:
+                return 1
+            if not caret_one:
+                return 1
+            if not caret_two:
+                return -1
+            one += 1
+            two += 1
+            continue
+
+        if one >= end_one or two >= end_two:
+            break
+
+        # grab the next segment of the same kind from both strings
+        start_one, start_two = one, two
+        isnum = a[one] in DIGITS
+        if isnum:
+            while one < end_one and a[one] in DIGITS:
+                one += 1
+            while two < end_two and b[two] in DIGITS:
+                two += 1
+        else:
+            while one < end_one and a[one] in ALNUM and a[one] not in DIGITS:
+                one += 1
+            while two < end_two and b[two] in ALNUM and b[two] not in DIGITS:
+                two += 1
+        segment_one = a[start_one:one]
+        segment_two = b[start_two:two]
+
+        # numeric segments are newer than alphabetic ones
+        if not segment_two:
+            return 1 if isnum else -1
+
+        if isnum:
+            segment_one = segment_one.lstrip('0')
+            segment_two = segment_two.lstrip('0')
+            if len(segment_one) != len(segment_two):
+                return 1 if len(segment_one) > len(segment_two) else -1
+        if segment_one != segment_two:
+            return 1 if segment_one > segment_two else -1
+
+    if one >= end_one and two >= end_two:
+        return 0
+    return -1 if one >= end_one else 1
+
+
+def _version_key(version):
+    key = []
+    for numeric, alpha, tilde, caret in SEGMENTS.findall(version or ''):
+        if numeric:
+            key.append((NUMERIC, int(numeric)))
+        elif alpha:
+            key.append((ALPHA, alpha))
+        elif tilde:
+            key.append(TILDE_KEY)
+        else:
+            key.append(CARET_KEY)
+    key.append(END_KEY)
+    return tuple(key)
+
+
+def version_key(version):
+    ''' sort key for a version string, comparing keys gives the order of rpmvercmp '''
+    try:
+        return _key_cache[version]
+    except KeyError:
+        pass
+    key = _version_key(version)
+    if len(_key_cache) >= KEY_CACHE_SIZE:
+        _key_cache.clear()
+    _key_cache[version] = key
+    return key
+
+
+def _epoch(epoch):
+    try:
+        return int(epoch or 0)
+    except ValueError:
+        return 0
+
+
+def _cmp(a, b):
+    return (a > b) - (a < b)
+
+
+def compare_evr(evr1, evr2):
+    ''' compare two (epoch, version, release) tuples, returns -1, 0 or 1
+
+        A missing release on either side is not compared, so a version
+        without release matches all releases of that version.
+    '''
+    epoch1, epoch2 = _epoch(evr1[0]), _epoch(evr2[0])
+    if epoch1 != epoch2:
+        return 1 if epoch1 > epoch2 else -1
+    result = _cmp(version_key(evr1[1]), version_key(evr2[1]))
+    if result or not evr1[2] or not evr2[2]:
+        return result
+    return _cmp(version_key(evr1[2]), version_key(evr2[2]))
+
+
+def evr_key(epoch, version, release):
+    ''' sort key for an (epoch, version, release) triple, a missing epoch
+        sorts as 0 and a missing release as an empty one
+    '''
+    return (_epoch(epoch), version_key(version), version_key(release))
+
+
+def flags_value(flags):
+    ''' dependency flags as the bits of a header, from an int or 'GE' style string '''
+    if not flags:
+        return 0
+    if isinstance(flags, int):
+        return flags & (LT | GT | EQ)
+    return FLAGS_MAP[flags]
+
+
+def ranges_overlap(flags1, evr1, flags2, evr2):
+    ''' whether two versioned dependencies overlap, as a provide satisfying a require
+
+        Dependencies without version flags match everything.
+    '''
+    flags1 = flags_value(flags1)
+    flags2 = flags_value(flags2)
+    if not flags1 or not flags2:
+        return True
+
+    sense = compare_evr(evr1, evr2)
+    if sense < 0:
+        return bool(flags1 & GT or flags2 & LT)
+    if sense > 0:
+        return bool(flags1 & LT or flags2 & GT)
+    return bool(flags1 & flags2 & (LT | GT | EQ))
@@ -1,9 +1,16 @@
+import sys
 try:
     from xml.etree.cElementTree import Element
 except:
     from xml.etree.ElementTree import Element
 
-from rpm import RPM
+from pyrpm.rpm import RPM
+from pyrpm.version import evr_key
+
+if sys.version < '3':
+    text_type = unicode
+else:
+    text_type = str
 
 
 def element(tag, attrib={}, text=None):
@@ -14,19 +21,68 @@ def element(tag, attrib={}, text=None):
     return ele
 
 
+def _prco_key(prco):
+    """sort key ordering dependencies by name, then version (rpm ordering)"""
+    return (prco.name, evr_key(*prco.version), prco.flags)
+
+
 class YumPackage(RPM):
+    __slots__ = ('_location', '_provide_sets', '_file_paths')
+
+    def __init__(self, *args, **kwargs):
+        self._location = None
+        self._provide_sets = (None, None, None)
+        self._file_paths = (None, None, None)
+        RPM.__init__(self, *args, **kwargs)
+
+    @property
+    def location(self):
+        ''' href of the package relative to the repository '''
+        return self._location or self.canonical_filename
+
+    @location.setter
+    def location(self, href):
+        self._location = href
+
+    def _provides_cache(self):
+        # rebuilt when the provides list is replaced or changed, the copy
+        # compares by identity of its items first so the check stays cheap
+        provides = self.provides
+        if self._provide_sets[0] != provides:
+            self._provide_sets = (list(provides), frozenset(prco.name for prco in provides), frozenset(provides))
+        return self._provide_sets
+
+    @property
+    def provide_names(self):
+        ''' set of the names of all provides '''
+        return self._provides_cache()[1]
+
+    @property
+    def provide_tuples(self):
+        ''' set of all provides, as RPMprco tuples '''
+        return self._provides_cache()[2]
+
+    @property
+    def file_paths(self):
+        ''' set of the paths of all files '''
+        files = self.filelist
+        version = getattr(files, 'version', None)
+        if self._file_paths[0] is not files or self._file_paths[1] != version:
+            self._file_paths = (files, version, frozenset(files.names if hasattr(files, 'names') else [file.name for file in files]))
+        return self._file_paths[2]
+
     def _xml_base_items(self, ele):
         ele.append(element('{http://linux.duke.edu/metadata/common}name', text=self.header.name))
         ele.append(element('{http://linux.duke.edu/metadata/common}arch', text=self.header.architecture))
-        ele.append(element("{http://linux.duke.edu/metadata/common}version", {'epoch': str(self.header.epoch), 'ver': unicode(self.header.version), 'rel': unicode(self.header.release)}))
-        ele.append(element('{http://linux.duke.edu/metadata/common}checksum', {'type': 'sha256', 'pkgid': 'YES'}, text=self.checksum))
+        ele.append(element("{http://linux.duke.edu/metadata/common}version", {'epoch': str(self.header.epoch), 'ver': text_type(self.header.version), 'rel': text_type(self.header.release)}))
+        ele.append(element('{http://linux.duke.edu/metadata/common}checksum', {'type': self.checksum_type, 'pkgid': 'YES'}, text=self.checksum))
         ele.append(element('{http://linux.duke.edu/metadata/common}summary', text=self.header.summary))
         ele.append(element('{http://linux.duke.edu/metadata/common}description', text=self.header.description))
         ele.append(element('{http://linux.duke.edu/metadata/common}packager', text=self.header.packager))
         ele.append(element('{http://linux.duke.edu/metadata/common}url', text=self.header.url))
         ele.append(element('{http://linux.duke.edu/metadata/common}time', {'file': str(self.header.build_time), 'build': str(self.header.build_time)}))
         ele.append(element('{http://linux.duke.edu/metadata/common}size', {'package': str(self.filesize), 'installed': str(sum([file.size for file in self.filelist])), 'archive': str(self.header.archive_size)}))
-        ele.append(element('{http://linux.duke.edu/metadata/common}location', {'href': self.canonical_filename}))
+        ele.append(element('{http://linux.duke.edu/metadata/common}location', {'href': self.location}))
 
     def _xml_format_items(self, ele):
         ef = element('{http://linux.duke.edu/metadata/common}format')
@@ -51,7 +107,7 @@ class YumPackage(RPM):
             return
 
         ef = element('{http://linux.duke.edu/metadata/rpm}' + pcotype)
-        for prco in sorted(mylist):
+        for prco in sorted(mylist, key=_prco_key):
             entry = element('{http://linux.duke.edu/metadata/rpm}entry', {'name': prco.name})
             if prco.str_flags:
                 entry.set('flags', prco.str_flags)
@@ -85,17 +141,19 @@ class YumPackage(RPM):
         """returns deps in XML format"""
         ef = element('{http://linux.duke.edu/metadata/rpm}requires')
         used = 0
+        provide_names = self.provide_names
+        provide_tuples = self.provide_tuples
 
-        for prco in sorted(self.requires):
+        for prco in sorted(self.requires, key=_prco_key):
             if prco.name.startswith('rpmlib('):
                 continue
 
             # this drops out requires that the pkg provides for itself.
-            if prco.name in [p.name for p in self.provides] or (prco.name.startswith('/') and (prco.name in [file.name for file in self.filelist])):
+            if prco.name in provide_names or (prco.name.startswith('/') and prco.name in self.file_paths):
                 if not prco.flags:
                     continue
                 else:
-                    if prco in self.provides:
+                    if prco in provide_tuples:
                         continue
 
             entry = element('{http://linux.duke.edu/metadata/rpm}entry', {'name': prco.name})
@@ -134,12 +192,12 @@ class YumPackage(RPM):
 
     def xml_filelists_metadata(self):
         ele = element("{http://linux.duke.edu/metadata/filelists}package", {'pkgid': self.checksum, 'name': self.header.name, 'arch': self.header.architecture})
-        ele.append(element("{http://linux.duke.edu/metadata/filelists}version", {'epoch': str(self.header.epoch), 'ver': unicode(self.header.version), 'rel': unicode(self.header.release)}))
+        ele.append(element("{http://linux.duke.edu/metadata/filelists}version", {'epoch': str(self.header.epoch), 'ver': text_type(self.header.version), 'rel': text_type(self.header.release)}))
         self._xml_files(ele)
         return ele
 
     def xml_other_metadata(self, clog_limit=0):
         ele = element("{http://linux.duke.edu/metadata/other}package", {'pkgid': self.checksum, 'name': self.header.name, 'arch': self.header.architecture})
-        ele.append(element("{http://linux.duke.edu/metadata/other}version", {'epoch': str(self.header.epoch), 'ver': unicode(self.header.version), 'rel': unicode(self.header.release)}))
+        ele.append(element("{http://linux.duke.edu/metadata/other}version", {'epoch': str(self.header.epoch), 'ver': text_type(self.header.version), 'rel': text_type(self.header.release)}))
         self._xml_changelog(ele, clog_limit)
         return ele
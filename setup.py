@@ -28,6 +28,13 @@ setup(name=NAME,
       ],
 
       packages=find_packages(where='.'),
+      entry_points={
+          'console_scripts': [
+              'pyrpm-createrepo = pyrpm.tools.createrepo:main',
+              'pyrpm-repomanage = pyrpm.tools.repomanage:main',
+              'pyrpm-mergerepo = pyrpm.tools.mergerepo:main',
+          ],
+      },
       options = {
           'bdist_rpm':{
               'build_requires':[
@@ -0,0 +1,52 @@
+'''
+Local keep-alive HTTP server for the tests of pyrpm.remote and
+pyrpm.tools.storage
+'''
+import threading
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    ''' quiet HTTP/1.1 request handler counting the connections in
+        server.connections
+    '''
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_data(self, status, data=b'', headers=()):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_server(handler, **attributes):
+    ''' serve with handler on a free local port in a thread, the server
+        records requests and connections and gets attributes set
+    '''
+    server = HTTPServer(('127.0.0.1', 0), handler)
+    server.requests = []
+    server.connections = 0
+    for name, value in attributes.items():
+        setattr(server, name, value)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05, ))
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def stop_server(server):
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from pyrpm import scan
+from pyrpm.batch import verify_digests, verify_payloads
+
+
+class BatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        with open('tests/Eterm-0.9.3-5mdv2007.0.src.rpm', 'rb') as file:
+            data = file.read()
+
+        self.paths = []
+        for filename, content in (('good.rpm', data), ('corrupt.rpm', data[:-20000] + b'\x00' * 20000), ('empty.rpm', b'')):
+            self.paths.append(os.path.join(self.directory, filename))
+            with open(self.paths[-1], 'wb') as file:
+                file.write(content)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_verify_payloads(self):
+        for workers in (1, 2):
+            results = dict((os.path.basename(result.path), result) for result in verify_payloads(self.paths, workers=workers))
+            self.assertEqual(results['good.rpm'].mismatches, [])
+            self.assertEqual(results['good.rpm'].error, None)
+            self.assertTrue(results['corrupt.rpm'].error.startswith('corrupt payload'))
+            self.assertEqual(results['empty.rpm'].mismatches, None)
+            self.assertTrue(results['empty.rpm'].error)
+
+    def test_verify_digests(self):
+        for workers, threads in ((1, False), (2, False), (2, True)):
+            results = dict((os.path.basename(result.path), result) for result in verify_digests(self.paths, workers=workers, threads=threads))
+            self.assertEqual(results['good.rpm'].mismatches, [])
+            self.assertEqual(results['corrupt.rpm'].mismatches, [])
+            self.assertTrue(results['empty.rpm'].error)
+
+        results = dict((os.path.basename(result.path), result) for result in verify_digests(self.paths, payload=True))
+        self.assertEqual(results['good.rpm'].mismatches, [])
+        self.assertEqual([mismatch.digest for mismatch in results['corrupt.rpm'].mismatches], ['md5'])
+
+    def test_scan(self):
+        for workers, threads in ((1, False), (2, False), (2, True)):
+            results = dict((os.path.basename(result.path), result) for result in scan(self.paths, workers=workers, threads=threads))
+            self.assertEqual(results['good.rpm'].tags, {'name': 'Eterm', 'epoch': 0, 'version': '0.9.3', 'release': '5mdv2007.0', 'architecture': 'i586'})
+            self.assertEqual(results['good.rpm'].checksum, None)
+            self.assertEqual(results['empty.rpm'].tags, None)
+            self.assertTrue(results['empty.rpm'].error)
+
+    def test_scan_projection(self):
+        result = list(scan(self.paths[:1], tags=['summary', 1009, 'filesize', 'requires'], checksum='sha1'))[0]
+        self.assertEqual(result.tags['summary'], 'Eterm (Enlightened Terminal Emulator) is a terminal emulator')
+        self.assertEqual(result.tags[1009], 2436105)
+        self.assertEqual(result.tags['filesize'], 2438640)
+        self.assertEqual(len(result.tags['requires']), 7)
+        self.assertEqual(len(result.checksum), 40)
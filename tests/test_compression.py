@@ -0,0 +1,84 @@
+import binascii
+import bz2
+import gzip
+import io
+import os
+import unittest
+
+from pyrpm.tools.compression import ParallelGzipWriter, compressing_writer, compression_of, decompressing_reader, lzma
+
+
+def compress(data, writes, *args, **kwargs):
+    output = io.BytesIO()
+    writer = compressing_writer(output, *args, **kwargs)
+    for start in range(0, len(data), writes):
+        writer.write(data[start:start + writes])
+    writer.close()
+    return output.getvalue()
+
+
+class CompressionTest(unittest.TestCase):
+
+    def setUp(self):
+        # compressible but not trivially so
+        self.data = ''.join('<file>/usr/share/doc/%d/%s</file>\n' % (i, binascii.hexlify(os.urandom(4)).decode('ascii')) for i in range(20000)).encode('ascii')
+
+    def test_parallel_gzip(self):
+        output = io.BytesIO()
+        writer = ParallelGzipWriter(output, threads=3, block_size=64 * 1024)
+        for start in range(0, len(self.data), 1000):
+            writer.write(self.data[start:start + 1000])
+        writer.close()
+        self.assertEqual(writer.members, (len(self.data) + 64 * 1024 - 1) // (64 * 1024))
+        self.assertTrue(writer.members > 1)
+        self.assertEqual(gzip.GzipFile(fileobj=io.BytesIO(output.getvalue())).read(), self.data)
+
+        # independent of the threads and the sizes of the writes
+        output2 = io.BytesIO()
+        writer = ParallelGzipWriter(output2, threads=1, block_size=64 * 1024)
+        writer.write(self.data)
+        writer.close()
+        self.assertEqual(output2.getvalue(), output.getvalue())
+
+    def test_threads(self):
+        # several blocks, the framing does not depend on the threads
+        data = self.data * 3
+        serial = compress(data, 65536, 'gz', threads=1)
+        for threads in (2, 4, None):
+            self.assertEqual(compress(data, 10000, 'gz', threads=threads), serial)
+        self.assertEqual(gzip.GzipFile(fileobj=io.BytesIO(serial)).read(), data)
+
+    def test_abort(self):
+        writer = compressing_writer(io.BytesIO(), 'gz', threads=2)
+        writer.write(self.data * 3)
+        self.assertTrue(writer.pool is not None)
+        writer.abort()
+        self.assertEqual((writer.pool, len(writer.pending)), (None, 0))
+        # closing after abort writes nothing more
+        writer.close()
+
+    def test_empty(self):
+        for compression, threads in (('gz', 1), ('gz', 4), ('bz2', 1)):
+            data = compress(b'', 1, compression, threads=threads)
+            self.assertEqual(decompressing_reader(io.BytesIO(data), compression).read(), b'')
+
+    def test_codecs(self):
+        self.assertEqual(gzip.GzipFile(fileobj=io.BytesIO(compress(self.data, 4096, 'gz', 1, threads=4))).read(), self.data)
+        self.assertEqual(bz2.decompress(compress(self.data, 4096, 'bz2', 1)), self.data)
+        if lzma is not None:
+            self.assertEqual(lzma.decompress(compress(self.data, 4096, 'xz', 0)), self.data)
+        self.assertRaises(ValueError, compressing_writer, io.BytesIO(), 'zip')
+
+    def test_levels(self):
+        self.assertTrue(len(compress(self.data, 65536, 'gz', 1, threads=1)) > len(compress(self.data, 65536, 'gz', 9, threads=1)))
+
+    def test_reader(self):
+        self.assertEqual(compression_of('repodata/primary.xml.xz'), 'xz')
+        self.assertEqual(compression_of('repodata/repomd.xml'), None)
+        for compression in ('gz', 'bz2', 'xz'):
+            if compression == 'xz' and lzma is None:
+                continue
+            reader = decompressing_reader(io.BytesIO(compress(self.data, 50000, compression)), compression)
+            self.assertEqual(reader.read(10), self.data[:10])
+            self.assertEqual(reader.read(), self.data[10:])
+            reader.close()
@@ -0,0 +1,268 @@
+import bz2
+import gzip
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from pyrpm.rpm import RPMError
+from pyrpm.tools import createrepo
+from pyrpm.tools.compression import lzma
+from pyrpm.tools.createrepo import YumRepository, ElementTree
+from pyrpm.yum import YumPackage
+
+REPO_NS = '{http://linux.duke.edu/metadata/repo}'
+
+
+class CreateRepoTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        with open('tests/Eterm-0.9.3-5mdv2007.0.src.rpm', 'rb') as file:
+            data = file.read()
+
+        # two packages with different checksums, one of them in a subdirectory
+        os.mkdir(os.path.join(self.directory, 'sub'))
+        for filename, content in (('Eterm-0.9.3-5mdv2007.0.src.rpm', data), ('sub/other.src.rpm', data[:-1] + b'x')):
+            with open(os.path.join(self.directory, filename), 'wb') as file:
+                file.write(content)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _metadata(self):
+        contents = {}
+        for type in ('primary', 'filelists', 'other'):
+            with gzip.open(os.path.join(self.directory, 'repodata', type + '.xml.gz')) as file:
+                contents[type] = file.read()
+        return contents
+
+    def test_add_directory(self):
+        repo = YumRepository(self.directory)
+        repo.add_directory(self.directory)
+        self.assertEqual(len(repo.primary_data), 2)
+        hrefs = sorted(node.find('{http://linux.duke.edu/metadata/common}location').get('href') for node in repo.primary_data.values())
+        self.assertEqual(hrefs, ['Eterm-0.9.3-5mdv2007.0.src.rpm', 'sub/other.src.rpm'])
+
+        # repodata is skipped
+        repo.save()
+        open(os.path.join(self.directory, 'repodata', 'stray.rpm'), 'wb').close()
+        self.assertEqual(createrepo.find_packages(self.directory),
+                         [os.path.join(self.directory, 'Eterm-0.9.3-5mdv2007.0.src.rpm'), os.path.join(self.directory, 'sub', 'other.src.rpm')])
+
+    def test_package_without_checksum(self):
+        repo = YumRepository(self.directory)
+        with open(os.path.join(self.directory, 'Eterm-0.9.3-5mdv2007.0.src.rpm'), 'rb') as file:
+            package = YumPackage(file, checksum=None)
+        self.assertRaises(ValueError, repo.add_package, package)
+        self.assertEqual(len(repo.primary_data), 0)
+
+    def test_save(self):
+        repo = YumRepository(self.directory)
+        repo.add_directory(self.directory)
+        repo.save()
+
+        contents = self._metadata()
+        repomd = ElementTree.parse(os.path.join(self.directory, 'repodata', 'repomd.xml'))
+        for node in repomd.findall(REPO_NS + 'data'):
+            with open(os.path.join(self.directory, node.find(REPO_NS + 'location').get('href')), 'rb') as file:
+                data = file.read()
+            content = contents[node.get('type')]
+            self.assertEqual(node.find(REPO_NS + 'checksum').text, hashlib.sha256(data).hexdigest())
+            self.assertEqual(node.find(REPO_NS + 'size').text, str(len(data)))
+            self.assertEqual(node.find(REPO_NS + 'open-checksum').text, hashlib.sha256(content).hexdigest())
+            self.assertEqual(node.find(REPO_NS + 'open-size').text, str(len(content)))
+        self.assertEqual(sorted(os.listdir(os.path.join(self.directory, 'repodata'))), ['filelists.xml.gz', 'other.xml.gz', 'primary.xml.gz', 'repomd.xml'])
+
+        # written nodes read back unchanged
+        read = YumRepository(self.directory)
+        read.read()
+        self.assertEqual(sorted(read.primary_data), sorted(repo.primary_data))
+        for pkgid, node in repo.primary_data.items():
+            self.assertEqual(ElementTree.tostring(read.primary_data[pkgid]), ElementTree.tostring(node))
+
+    def test_parallel_matches_serial(self):
+        repo = YumRepository(self.directory)
+        repo.add_directory(self.directory)
+        repo.save()
+        serial = self._metadata()
+
+        repo = YumRepository(self.directory)
+        repo.add_directory(self.directory, workers=2)
+        repo.save()
+        self.assertEqual(self._metadata(), serial)
+
+    def test_parallel_error(self):
+        # the first package is broken, the queued ones are not waited for
+        with open(os.path.join(self.directory, 'broken.rpm'), 'wb') as file:
+            file.write(b'not a package')
+        pools = []
+        Pool = createrepo.multiprocessing.Pool
+
+        def pool(*args):
+            pools.append(Pool(*args))
+            terminate = pools[-1].terminate
+            pools[-1].terminate = lambda: (pools.append('terminated'), terminate())
+            return pools[0]
+
+        createrepo.multiprocessing.Pool = pool
+        try:
+            repo = YumRepository(self.directory)
+            self.assertRaises(RPMError, repo.add_directory, self.directory, workers=2)
+        finally:
+            createrepo.multiprocessing.Pool = Pool
+        self.assertEqual(pools[1:], ['terminated'])
+
+    def test_compression_threads(self):
+        outputs = []
+        for threads in (1, 4):
+            repo = YumRepository(self.directory, compression_threads=threads)
+            repo.add_directory(self.directory)
+            repo.save()
+            with open(os.path.join(self.directory, 'repodata', 'repomd.xml'), 'rb') as file:
+                outputs.append(file.read())
+        self.assertEqual(outputs[0], outputs[1])
+
+    def test_write_error(self):
+        repo = YumRepository(self.directory, compression_threads=2)
+        repo.add_directory(self.directory)
+        repo.save()
+        with open(os.path.join(self.directory, 'repodata', 'repomd.xml'), 'rb') as file:
+            repomd = file.read()
+
+        def nodes():
+            for node in list(repo.filelists_data.values())[:1]:
+                yield node
+            raise IOError('disk full')
+
+        sources = dict((type, (data.values, len(data))) for type, data in [
+            ('primary', repo.primary_data), ('filelists', repo.filelists_data), ('other', repo.other_data)])
+        sources['filelists'] = (nodes, 2)
+        self.assertRaises(IOError, repo.write_metadata, sources)
+
+        # the previous metadata is kept, no temporary files are left
+        self.assertEqual(sorted(os.listdir(os.path.join(self.directory, 'repodata'))),
+                         ['filelists.xml.gz', 'other.xml.gz', 'primary.xml.gz', 'repomd.xml'])
+        with open(os.path.join(self.directory, 'repodata', 'repomd.xml'), 'rb') as file:
+            self.assertEqual(file.read(), repomd)
+
+    def test_update(self):
+        repo = YumRepository(self.directory)
+        repo.update(self.directory)
+        repo.save()
+
+        # nothing changed, nothing is read
+        repo = YumRepository(self.directory)
+        repo._read_packages = lambda jobs, workers: jobs and self.fail('unexpected read of %s' % (jobs, )) or []
+        repo.update(self.directory)
+        self.assertEqual(len(repo.primary_data), 2)
+
+        # the cache is dropped when the changelog limit changes
+        for clog_limit, reads in ((1, 2), (1, 0), (0, 2)):
+            repo = YumRepository(self.directory)
+            jobs = []
+            read_packages = repo._read_packages
+            repo._read_packages = lambda packages, workers: jobs.extend(packages) or read_packages(packages, workers)
+            repo.update(self.directory, clog_limit=clog_limit)
+            repo.save()
+            self.assertEqual(len(jobs), reads)
+
+        # one package changed, one removed, one added
+        with open(os.path.join(self.directory, 'sub', 'other.src.rpm'), 'rb') as file:
+            data = file.read()
+        with open(os.path.join(self.directory, 'sub', 'other.src.rpm'), 'wb') as file:
+            file.write(data[:-1] + b'y')
+        shutil.move(os.path.join(self.directory, 'Eterm-0.9.3-5mdv2007.0.src.rpm'), os.path.join(self.directory, 'sub', 'new.src.rpm'))
+
+        repo = YumRepository(self.directory)
+        repo.update(self.directory)
+        repo.save()
+        updated = self._metadata()
+
+        repo = YumRepository(self.directory)
+        repo.add_directory(self.directory)
+        repo.save()
+        self.assertEqual(self._metadata(), updated)
+
+    def test_streaming_read(self):
+        repo = YumRepository(self.directory)
+        repo.add_directory(self.directory)
+        repo.save()
+
+        read = YumRepository(self.directory)
+        read.read(types=('primary', ))
+        self.assertEqual(len(read.primary_data), 2)
+        self.assertEqual(read.filelists_data, {})
+
+        pkgids = [pkgid for pkgid, node in read.iter_metadata('other')]
+        self.assertEqual(pkgids, list(repo.other_data))
+
+        packages = list(read.iter_packages(types=('primary', 'other')))
+        self.assertEqual([package[0] for package in packages], list(repo.primary_data))
+        for pkgid, primary, filelists, other in packages:
+            self.assertEqual(filelists, None)
+            self.assertEqual(ElementTree.tostring(primary), ElementTree.tostring(repo.primary_data[pkgid]))
+            self.assertEqual(other.get('pkgid'), pkgid)
+
+    def test_databases(self):
+        repo = YumRepository(self.directory)
+        repo.add_directory(self.directory)
+        repo.save(databases=True)
+
+        repomd = ElementTree.parse(os.path.join(self.directory, 'repodata', 'repomd.xml'))
+        nodes = dict((node.get('type'), node) for node in repomd.findall(REPO_NS + 'data'))
+        self.assertEqual(sorted(nodes), ['filelists', 'filelists_db', 'other', 'other_db', 'primary', 'primary_db'])
+
+        for type in ('primary', 'filelists', 'other'):
+            node = nodes[type + '_db']
+            self.assertEqual(node.find(REPO_NS + 'database_version').text, '10')
+            with open(os.path.join(self.directory, node.find(REPO_NS + 'location').get('href')), 'rb') as file:
+                data = bz2.decompress(file.read())
+            self.assertEqual(node.find(REPO_NS + 'open-checksum').text, hashlib.sha256(data).hexdigest())
+
+            path = os.path.join(self.directory, type + '.sqlite')
+            with open(path, 'wb') as file:
+                file.write(data)
+            connection = sqlite3.connect(path)
+            try:
+                self.assertEqual(connection.execute('SELECT dbversion, checksum FROM db_info').fetchall(), [(10, nodes[type].find(REPO_NS + 'checksum').text)])
+                self.assertEqual(sorted(row[0] for row in connection.execute('SELECT pkgId FROM packages')), sorted(repo.primary_data))
+                if type == 'primary':
+                    self.assertEqual(connection.execute('SELECT DISTINCT name, version, release, location_href FROM packages ORDER BY location_href').fetchall(),
+                                     [('Eterm', '0.9.3', '5mdv2007.0', 'Eterm-0.9.3-5mdv2007.0.src.rpm'), ('Eterm', '0.9.3', '5mdv2007.0', 'sub/other.src.rpm')])
+                    self.assertEqual(connection.execute('SELECT COUNT(*) FROM requires').fetchone()[0], 12)
+                elif type == 'filelists':
+                    self.assertEqual(connection.execute('SELECT COUNT(*) FROM filelist').fetchone()[0], 2)
+                    self.assertEqual(len(connection.execute('SELECT filetypes FROM filelist').fetchone()[0]), 8)
+                else:
+                    self.assertTrue(connection.execute('SELECT COUNT(*) FROM changelog').fetchone()[0] > 0)
+            finally:
+                connection.close()
+
+    def test_compression(self):
+        for compression, database_compression in (('xz', 'gz'), ('bz2', 'xz'), ('gz', 'bz2')):
+            if lzma is None and 'xz' in (compression, database_compression):
+                continue
+            repo = YumRepository(self.directory, compression=compression, compression_level=1, compression_threads=2,
+                                 database_compression=database_compression)
+            repo.add_directory(self.directory)
+            repo.save(databases=True)
+            self.assertEqual(sorted(os.listdir(os.path.join(self.directory, 'repodata'))), sorted(
+                ['%s.xml.%s' % (type, compression) for type in ('primary', 'filelists', 'other')] +
+                ['%s.sqlite.%s' % (type, database_compression) for type in ('primary', 'filelists', 'other')] + ['repomd.xml']))
+
+            # repomd describes the compressed files
+            repomd = ElementTree.parse(os.path.join(self.directory, 'repodata', 'repomd.xml'))
+            for node in repomd.findall(REPO_NS + 'data'):
+                with open(os.path.join(self.directory, node.find(REPO_NS + 'location').get('href')), 'rb') as file:
+                    data = file.read()
+                self.assertEqual(node.find(REPO_NS + 'checksum').text, hashlib.sha256(data).hexdigest())
+                self.assertEqual(node.find(REPO_NS + 'size').text, str(len(data)))
+
+            read = YumRepository(self.directory)
+            read.read()
+            self.assertEqual(sorted(read.other_data), sorted(repo.other_data))
+            for pkgid, node in repo.filelists_data.items():
+                self.assertEqual(ElementTree.tostring(read.filelists_data[pkgid]), ElementTree.tostring(node))
@@ -0,0 +1,108 @@
+import shutil
+import tempfile
+import unittest
+
+from pyrpm.deps import Capability, DependencyIndex, Package
+from pyrpm.tools.createrepo import YumRepository
+from pyrpm.version import compare_evr, evr_key, ranges_overlap, rpmvercmp, version_key
+from pyrpm.yum import YumPackage
+
+
+class VersionTest(unittest.TestCase):
+
+    def test_rpmvercmp(self):
+        # (a, b, expected) from the rpm test suite
+        cases = [
+            ('1.0', '1.0', 0), ('1.0', '2.0', -1), ('2.0.1', '2.0', 1), ('2.0.1a', '2.0.1', 1),
+            ('5.5p1', '5.5p2', -1), ('5.5p10', '5.5p1', 1), ('10xyz', '10.1xyz', -1),
+            ('xyz10', 'xyz10.1', -1), ('xyz.4', '8', -1), ('b', 'a', 1), ('1b', '1a', 1),
+            ('1.0010', '1.9', 1), ('1.05', '1.5', 0), ('2.0', '2_0', 0), ('2a', '2.0', -1),
+            ('1.0~rc1', '1.0', -1), ('1.0~rc1', '1.0~rc2', -1), ('1.0~rc1~git123', '1.0~rc1', -1),
+            ('1.0^', '1.0', 1), ('1.0^git1', '1.0^git2', -1), ('1.0^git1', '1.01', -1),
+            ('1.0^20160101', '1.0.1', -1), ('1.0~rc1^git1', '1.0~rc1', 1), ('1.0^git1~pre', '1.0^git1', -1),
+        ]
+        for a, b, expected in cases:
+            self.assertEqual(rpmvercmp(a, b), expected, (a, b))
+            self.assertEqual(rpmvercmp(b, a), -expected, (b, a))
+            key_a, key_b = version_key(a), version_key(b)
+            self.assertEqual((key_a > key_b) - (key_a < key_b), expected, (a, b))
+
+    def test_evr_key(self):
+        evrs = [('1', '0.1', '1'), (None, '2.0', '1'), ('0', '2.0~rc1', '3'), (None, '2.0', None), ('0', '10', '1')]
+        self.assertEqual(sorted(evrs, key=lambda evr: evr_key(*evr)),
+                         [('0', '2.0~rc1', '3'), (None, '2.0', None), (None, '2.0', '1'), ('0', '10', '1'), ('1', '0.1', '1')])
+
+    def test_compare_evr(self):
+        self.assertEqual(compare_evr(('1', '1.0', '1'), (None, '2.0', '1')), 1)
+        self.assertEqual(compare_evr((None, '1.0', '1'), ('0', '1.0', '2')), -1)
+        self.assertEqual(compare_evr((None, '1.0', None), (None, '1.0', '2')), 0)
+
+    def test_ranges_overlap(self):
+        evr = (None, '1.0', '1')
+        self.assertTrue(ranges_overlap('EQ', evr, 'GE', (None, '0.9', None)))
+        self.assertFalse(ranges_overlap('EQ', evr, 'GT', (None, '1.0', None)))
+        self.assertTrue(ranges_overlap('EQ', evr, 'LE', (None, '1.0', None)))
+        self.assertTrue(ranges_overlap(0, (None, None, None), 'GE', (None, '5', None)))
+        self.assertTrue(ranges_overlap('GE', evr, 'LT', (None, '2', None)))
+        self.assertFalse(ranges_overlap('LT', evr, 'GT', (None, '2', None)))
+
+
+class DependencyIndexTest(unittest.TestCase):
+
+    def _index(self):
+        index = DependencyIndex()
+        index.add(Package('a', 'liba', 'x86_64', '0', '1.2', '1'),
+                  [Capability('liba', 8, ('0', '1.2', '1')), Capability('liba.so.1()(64bit)', 0, (None, None, None))],
+                  [], ['/usr/lib64/liba.so.1'])
+        index.add(Package('b', 'app', 'x86_64', '0', '2.0', '1'),
+                  [Capability('app', 8, ('0', '2.0', '1'))],
+                  [Capability('liba', 12, (None, '1.0', None)), Capability('liba.so.1()(64bit)', 0, (None, None, None)),
+                   Capability('/usr/lib64/liba.so.1', 0, (None, None, None)), Capability('rpmlib(PayloadIsXz)', 0, (None, '5.2', '1'))])
+        index.add(Package('c', 'plugin', 'x86_64', '0', '1.0', '1'),
+                  [],
+                  [Capability('app', 10, (None, '1.9', None)), Capability('missing', 0, (None, None, None))])
+        return index
+
+    def test_queries(self):
+        index = self._index()
+        self.assertEqual(index.what_provides('liba'), ['a'])
+        self.assertEqual(index.what_provides('liba', 'GE', (None, '1.3', None)), [])
+        self.assertEqual(index.what_provides('/usr/lib64/liba.so.1'), ['a'])
+        self.assertEqual(index.what_requires('liba'), ['b'])
+        self.assertEqual(index.what_requires('app', 'EQ', ('0', '2.0', '1')), [])
+        self.assertEqual(index.what_requires('rpmlib(PayloadIsXz)'), [])
+
+    def test_closure(self):
+        unresolved = self._index().closure()
+        self.assertEqual([(item.package.pkgid, item.requirement.name) for item in unresolved], [('c', 'app'), ('c', 'missing')])
+
+    def test_packages(self):
+        package = YumPackage(open('tests/Eterm-0.9.3-5mdv2007.0.src.rpm', 'rb'))
+        index = DependencyIndex.from_packages([package])
+        self.assertEqual(index.packages[package.checksum].name, 'Eterm')
+        self.assertEqual(index.what_provides('Eterm'), [])
+        self.assertEqual(len(index.closure()), 6)
+
+    def test_package_file_list(self):
+        # the file list may be replaced by a plain list of RPMFile
+        package = YumPackage(open('tests/Eterm-0.9.3-5mdv2007.0.src.rpm', 'rb'))
+        package.filelist = [package.filelist[0]._replace(name='/usr/bin/eterm')]
+        index = DependencyIndex.from_packages([package])
+        self.assertEqual(index.what_provides('/usr/bin/eterm'), [package.checksum])
+
+    def test_repository(self):
+        directory = tempfile.mkdtemp()
+        try:
+            shutil.copy('tests/Eterm-0.9.3-5mdv2007.0.src.rpm', directory)
+            repo = YumRepository(directory)
+            repo.add_directory(directory)
+            repo.save()
+
+            loaded = DependencyIndex.from_repository(repo)
+            streamed = DependencyIndex.from_repository(YumRepository(directory), filelists=True)
+            for index in (loaded, streamed):
+                self.assertEqual(len(index), 1)
+                self.assertEqual(len(index.closure()), 6)
+            self.assertIn('Eterm.spec', streamed.files)
+        finally:
+            shutil.rmtree(directory)
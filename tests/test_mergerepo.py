@@ -0,0 +1,63 @@
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+from pyrpm.tools.createrepo import YumRepository
+from pyrpm.tools.mergerepo import RepositoryMerger, merge
+
+COMMON_NS = '{http://linux.duke.edu/metadata/common}'
+
+
+class MergeRepoTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        with open('tests/Eterm-0.9.3-5mdv2007.0.src.rpm', 'rb') as file:
+            data = file.read()
+
+        # repository a holds the package, b the same package and a rebuild
+        # with the same NEVRA but a newer build time
+        self.repodirs = []
+        for name, packages in (('a', [('Eterm.src.rpm', data)]), ('b', [('Eterm.src.rpm', data), ('rebuild/Eterm.src.rpm', data[:-1] + b'x')])):
+            repodir = os.path.join(self.directory, name)
+            os.makedirs(os.path.join(repodir, 'rebuild'))
+            for filename, content in packages:
+                with open(os.path.join(repodir, filename), 'wb') as file:
+                    file.write(content)
+            repo = YumRepository(repodir)
+            repo.add_directory(repodir)
+            for pkgid, node in repo.primary_data.items():
+                if node.find(COMMON_NS + 'location').get('href').startswith('rebuild/'):
+                    node.find(COMMON_NS + 'time').set('build', '2000000000')
+            repo.save()
+            self.repodirs.append(repodir)
+        self.destination = os.path.join(self.directory, 'merged')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _locations(self):
+        repo = YumRepository(self.destination)
+        return [node.find(COMMON_NS + 'location').get('href') for pkgid, node in repo.iter_metadata('primary')]
+
+    def test_merge(self):
+        self.assertEqual(merge(self.destination, self.repodirs), 2)
+        self.assertEqual(self._locations(), ['../a/Eterm.src.rpm', '../b/rebuild/Eterm.src.rpm'])
+
+        # all metadata types list the same packages
+        repo = YumRepository(self.destination)
+        self.assertEqual([len(list(repo.iter_packages()))], [2])
+        with gzip.open(os.path.join(self.destination, 'repodata', 'primary.xml.gz')) as file:
+            self.assertIn(b'packages="2"', file.read(300))
+
+    def test_nevra(self):
+        self.assertEqual(merge(self.destination, self.repodirs, nevra=True), 1)
+        self.assertEqual(self._locations(), ['../b/rebuild/Eterm.src.rpm'])
+
+    def test_prefix(self):
+        merger = RepositoryMerger(self.destination, [(self.repodirs[0], 'http://mirror/a'), (self.repodirs[1], '')])
+        self.assertEqual(merger.merge(databases=True), 2)
+        self.assertEqual(self._locations(), ['http://mirror/a/Eterm.src.rpm', 'rebuild/Eterm.src.rpm'])
+        self.assertTrue(os.path.exists(os.path.join(self.destination, 'repodata', 'primary.sqlite.bz2')))
@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from pyrpm.pathindex import PathIndex, PathIndexFile
+from pyrpm.tools.createrepo import YumRepository
+from pyrpm.yum import YumPackage
+
+
+class PathIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.index = PathIndex()
+        self.index.add('a', ['/usr/lib64/libfoo.so.1', '/usr/lib64/libfoo.so.1.2', '/usr/lib64', '/etc/foo.conf'])
+        self.index.add('b', ['/usr/lib64/libbar.so.1', '/usr/lib64', '/usr/lib64/bar/plugin.so', '/usr/lib64/bar/plugin.so'])
+        self.index.add('c', ['/usr/lib64/libfoo.so.1', '/usr/lib64x/other', '/'])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _check(self, index):
+        self.assertEqual(len(index), 3)
+        self.assertEqual(index.what_owns('/usr/lib64/libfoo.so.1'), ['a', 'c'])
+        self.assertEqual(index.what_owns('/usr/lib64'), ['a', 'b'])
+        self.assertEqual(index.what_owns('/usr/lib64/bar/plugin.so'), ['b'])
+        self.assertEqual(index.what_owns('/'), ['c'])
+        self.assertEqual(index.what_owns('/usr/lib64/libfoo.so'), [])
+        self.assertEqual(index.what_owns('/usr/lib'), [])
+        self.assertEqual(index.what_owns('/nonexistent/file'), [])
+
+        self.assertEqual(sorted(index.search('/usr/lib64/libfoo')), [('/usr/lib64/libfoo.so.1', ['a', 'c']), ('/usr/lib64/libfoo.so.1.2', ['a'])])
+        self.assertEqual(sorted(path for path, pkgids in index.search('/usr/lib64')), [
+            '/usr/lib64', '/usr/lib64/bar/plugin.so', '/usr/lib64/libbar.so.1', '/usr/lib64/libfoo.so.1', '/usr/lib64/libfoo.so.1.2', '/usr/lib64x/other'])
+        self.assertEqual(sorted(path for path, pkgids in index.search('/usr/lib64/')), [
+            '/usr/lib64/bar/plugin.so', '/usr/lib64/libbar.so.1', '/usr/lib64/libfoo.so.1', '/usr/lib64/libfoo.so.1.2'])
+        self.assertEqual(len(list(index.search(''))), 8)
+        self.assertEqual(list(index.search('/opt')), [])
+
+    def test_memory(self):
+        self._check(self.index)
+
+        # adding packages invalidates the compiled index
+        self.index.add('d', ['/opt/d'])
+        self.assertEqual(self.index.what_owns('/opt/d'), ['d'])
+
+    def test_file(self):
+        path = os.path.join(self.directory, 'paths.idx')
+        self.index.save(path)
+        with PathIndexFile.open(path) as index:
+            self._check(index)
+            self.assertEqual(index.package(1), 'b')
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, PathIndexFile, b'')
+        self.assertRaises(ValueError, PathIndexFile, b'\x00' * 100)
+
+    def test_packages_and_repository(self):
+        shutil.copy('tests/Eterm-0.9.3-5mdv2007.0.src.rpm', self.directory)
+        with YumPackage.open(os.path.join(self.directory, 'Eterm-0.9.3-5mdv2007.0.src.rpm')) as package:
+            names = package.filelist.names
+            index = PathIndex.from_packages([package])
+            pkgid = package.checksum
+        self.assertEqual(index.what_owns(names[0]), [pkgid])
+        self.assertEqual(len(list(index.search(''))), len(names))
+
+        repo = YumRepository(self.directory)
+        repo.add_directory(self.directory)
+        repo.save()
+        for repository in (repo, YumRepository(self.directory)):
+            index = PathIndex.from_repository(repository)
+            self.assertEqual(len(index), 1)
+            self.assertEqual(sorted(path for path, pkgids in index.search('')), sorted(names))
+            self.assertEqual(index.what_owns(names[-1]), [pkgid])
@@ -0,0 +1,150 @@
+import bz2
+import hashlib
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+import sys
+import zlib
+
+if sys.version < '3':
+    from cStringIO import StringIO as BytesIO
+else:
+    from io import BytesIO
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+from pyrpm.payload import CpioArchive, DecompressingReader, extract
+from pyrpm.rpm import RPM, RPMError
+
+
+def cpio(entries):
+    ''' build a newc cpio archive from (name, mode, data, inode, nlink) tuples '''
+    archive = b''
+    for name, mode, data, inode, nlink in entries + [('TRAILER!!!', 0, b'', 0, 1)]:
+        name = name.encode('utf-8') + b'\x00'
+        fields = (inode, mode, 0, 0, nlink, 1000000000, len(data), 0, 0, 0, 0, len(name), 0)
+        archive += b'070701' + ''.join('%08X' % (field, ) for field in fields).encode('ascii') + name
+        archive += b'\x00' * (-len(archive) % 4) + data
+        archive += b'\x00' * (-len(archive) % 4)
+    return archive
+
+
+class PayloadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rpm = RPM.open('tests/Eterm-0.9.3-5mdv2007.0.src.rpm')
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.rpm.close()
+        shutil.rmtree(self.directory)
+
+    def test_payload(self):
+        digests = dict((file.name, (file.size, file.digest)) for file in self.rpm.filelist)
+        names = []
+        for entry in self.rpm.payload():
+            names.append(entry.name)
+            data = entry.read()
+            self.assertEqual(digests[entry.name], (len(data), hashlib.md5(data).hexdigest()))
+        self.assertEqual(sorted(names), sorted(digests))
+
+    def test_verify(self):
+        self.assertEqual(self.rpm.verify_payload(), [])
+
+    def test_verify_mismatch(self):
+        spec = [file for file in self.rpm.filelist if file.name == 'Eterm.spec'][0]
+        self.rpm.filelist.remove(spec)
+        self.rpm.filelist.append(spec._replace(name='Eterm.spec.orig'))
+        self.rpm.filelist[0] = self.rpm.filelist[0]._replace(size=1, digest='0' * 32)
+        mismatches = self.rpm.verify_payload()
+        self.assertEqual([(mismatch.name, mismatch.kind) for mismatch in mismatches], [
+            ('Eterm-0.9.1-themefix.patch.bz2', 'size'), ('Eterm-0.9.1-themefix.patch.bz2', 'digest'),
+            ('Eterm.spec', 'unexpected'), ('Eterm.spec.orig', 'missing')])
+
+    def test_skip_unread(self):
+        names = [entry.name for entry in self.rpm.payload()]
+        self.assertEqual(len(names), 8)
+
+    def test_extract(self):
+        self.rpm.extract(self.directory)
+        with open(os.path.join(self.directory, 'Eterm.spec'), 'rb') as file:
+            self.assertEqual(hashlib.md5(file.read()).hexdigest(), '51a76438189c9e0133a1c6bc7c7d9620')
+        self.assertEqual(len(os.listdir(self.directory)), 8)
+
+
+class CpioTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.archive = cpio([
+            ('./usr', stat.S_IFDIR | 0o755, b'', 1, 2),
+            ('./usr/bin/tool', stat.S_IFREG | 0o755, b'#!/bin/sh\n', 2, 1),
+            ('./usr/bin/alias', stat.S_IFLNK | 0o777, b'tool', 3, 1),
+            ('./usr/lib/a', stat.S_IFREG | 0o644, b'', 4, 2),
+            ('./usr/lib/b', stat.S_IFREG | 0o644, b'linked', 4, 2),
+        ])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_entries(self):
+        entries = [(entry.name, entry.size) for entry in CpioArchive(BytesIO(self.archive))]
+        self.assertEqual(entries, [('./usr', 0), ('./usr/bin/tool', 10), ('./usr/bin/alias', 4), ('./usr/lib/a', 0), ('./usr/lib/b', 6)])
+
+    def test_partial_read(self):
+        archive = CpioArchive(BytesIO(self.archive))
+        archive.next_entry()
+        self.assertEqual(archive.next_entry().read(2), b'#!')
+        self.assertEqual(archive.next_entry().read(), b'tool')
+
+    def test_truncated(self):
+        self.assertRaises(RPMError, list, CpioArchive(BytesIO(self.archive[:150])))
+
+    def test_extract(self):
+        extract(CpioArchive(BytesIO(self.archive)), self.directory)
+        self.assertEqual(os.readlink(os.path.join(self.directory, 'usr', 'bin', 'alias')), 'tool')
+        with open(os.path.join(self.directory, 'usr', 'lib', 'a'), 'rb') as file:
+            self.assertEqual(file.read(), b'linked')
+        self.assertEqual(os.stat(os.path.join(self.directory, 'usr', 'bin', 'tool')).st_mode & 0o777, 0o755)
+
+    def test_extract_outside(self):
+        archive = cpio([('../escape', stat.S_IFREG | 0o644, b'x', 1, 1)])
+        self.assertRaises(RPMError, extract, CpioArchive(BytesIO(archive)), self.directory)
+
+    def test_extract_symlink_outside(self):
+        outside = tempfile.mkdtemp()
+        try:
+            # a symlinked directory followed by a file below it
+            archive = cpio([
+                ('./usr', stat.S_IFLNK | 0o777, outside.encode('utf-8'), 1, 1),
+                ('./usr/evil', stat.S_IFREG | 0o644, b'x', 2, 1),
+            ])
+            self.assertRaises(RPMError, extract, CpioArchive(BytesIO(archive)), self.directory)
+            self.assertEqual(os.listdir(outside), [])
+
+            # the same through an existing link, relative link targets leaving the directory
+            os.symlink(outside, os.path.join(self.directory, 'usr'))
+            archive = cpio([('./usr/evil', stat.S_IFREG | 0o644, b'x', 2, 1)])
+            self.assertRaises(RPMError, extract, CpioArchive(BytesIO(archive)), self.directory)
+            archive = cpio([('./lib/up', stat.S_IFLNK | 0o777, b'../../escape', 1, 1)])
+            self.assertRaises(RPMError, extract, CpioArchive(BytesIO(archive)), self.directory)
+            self.assertEqual(os.listdir(outside), [])
+        finally:
+            shutil.rmtree(outside)
+
+    def test_decompression(self):
+        compressors = [('gzip', self._gzip), ('bzip2', bz2.compress)]
+        if lzma is not None:
+            compressors.append(('xz', lzma.compress))
+        for name, compress in compressors:
+            reader = DecompressingReader(BytesIO(compress(self.archive * 100)), name, chunk_size=64)
+            self.assertEqual(len(list(CpioArchive(reader))), 5)
+
+    def _gzip(self, data):
+        compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return compressor.compress(data) + compressor.flush()
@@ -0,0 +1,102 @@
+import errno
+import os
+import re
+import socket
+import unittest
+
+from pyrpm.remote import HTTPRangeFile, disconnected, http_client, open_url
+from pyrpm.rpm import RPM
+from pyrpm.yum import YumPackage
+
+from tests.httpserver import KeepAliveHandler, start_server, stop_server
+
+RPM_FILE = 'tests/Eterm-0.9.3-5mdv2007.0.src.rpm'
+
+
+class RangeHandler(KeepAliveHandler):
+    ''' serves the test package with range support '''
+
+    def do_GET(self):
+        self.server.requests.append(self.headers.get('Range'))
+        data = self.server.data
+        match = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range') or '')
+        if match is None or not self.server.ranges:
+            self.send_data(200, data)
+            return
+
+        start = int(match.group(1))
+        end = min(int(match.group(2)) + 1 if match.group(2) else len(data), len(data))
+        if start >= len(data):
+            self.send_data(416, headers=[('Content-Range', 'bytes */%d' % (len(data), ))])
+            return
+        self.send_data(206, data[start:end], [('Content-Range', 'bytes %d-%d/%d' % (start, end - 1, len(data)))])
+
+
+class RemoteTest(unittest.TestCase):
+
+    def setUp(self):
+        with open(RPM_FILE, 'rb') as file:
+            self.server = start_server(RangeHandler, data=file.read(), ranges=True)
+        self.url = 'http://127.0.0.1:%d/%s' % (self.server.server_address[1], os.path.basename(RPM_FILE))
+
+    def tearDown(self):
+        stop_server(self.server)
+
+    def test_header_only(self):
+        local = RPM(open(RPM_FILE, 'rb'))
+        rpm = open_url(self.url)
+        try:
+            self.assertEqual(rpm.header.name, 'Eterm')
+            self.assertEqual([file.name for file in rpm.filelist], [file.name for file in local.filelist])
+            self.assertEqual(rpm.requires, local.requires)
+            self.assertEqual(rpm.rpmfile.requests, 3)
+            self.assertEqual(rpm.rpmfile.bytes_fetched, local.header.header_range[1])
+            self.assertEqual(self.server.connections, 1)
+            self.assertEqual(rpm.filesize, len(self.server.data))
+        finally:
+            rpm.close()
+
+    def test_payload_and_checksum(self):
+        rpm = open_url(self.url, cls=YumPackage, checksum='sha256')
+        try:
+            self.assertEqual(rpm.checksum, RPM(open(RPM_FILE, 'rb')).checksum)
+            self.assertEqual(rpm.verify_payload(), [])
+            self.assertEqual(self.server.connections, 1)
+        finally:
+            rpm.close()
+
+    def test_file(self):
+        data = self.server.data
+        with HTTPRangeFile(self.url, block_size=1000) as file:
+            self.assertEqual(file.read(10), data[:10])
+            file.seek(5000)
+            self.assertEqual(file.read(100), data[5000:5100])
+            self.assertEqual(file.read(2000), data[5100:7100])
+            self.assertEqual(file.seek(-10, 2), len(data) - 10)
+            self.assertEqual(file.read(), data[-10:])
+            self.assertEqual(file.read(10), b'')
+
+    def test_no_ranges(self):
+        self.server.ranges = False
+        with HTTPRangeFile(self.url) as file:
+            data = self.server.data
+            file.seek(100)
+            self.assertEqual(file.read(10), data[100:110])
+            file.seek(5000)
+            self.assertEqual(file.read(100), data[5000:5100])
+            file.seek(50)
+            self.assertEqual(file.read(20), data[50:70])
+            self.assertEqual(file.seek(-10, 2), len(data) - 10)
+            self.assertEqual(file.read(), data[-10:])
+            file.seek(0)
+            self.assertEqual(file.read(), data)
+            self.assertEqual(file.requests, 1)
+
+    def test_disconnected(self):
+        self.assertTrue(disconnected(http_client.BadStatusLine('')))
+        self.assertTrue(disconnected(socket.error(errno.ECONNRESET, 'reset')))
+        self.assertTrue(disconnected(socket.error(errno.EPIPE, 'broken pipe')))
+        # refused connections and timeouts are not retried
+        self.assertFalse(disconnected(socket.error(errno.ECONNREFUSED, 'refused')))
+        self.assertFalse(disconnected(socket.timeout('timed out')))
+        self.assertFalse(disconnected(ValueError()))
@@ -0,0 +1,45 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from pyrpm.tools.createrepo import YumRepository
+from pyrpm.tools.repomanage import Build, directory_builds, newest, repository_builds
+
+
+class RepoManageTest(unittest.TestCase):
+
+    def test_newest(self):
+        builds = [Build('%s-%s' % (name, version), name, arch, None, version, '1') for name, arch, version in [
+            ('foo', 'x86_64', '1.10'), ('foo', 'x86_64', '1.9'), ('foo', 'x86_64', '1.10~rc1'), ('foo', 'i686', '1.0'),
+            ('bar', 'noarch', '2')]]
+        new, old = newest(builds, keep=2)
+        self.assertEqual([build.path for build in new], ['bar-2', 'foo-1.0', 'foo-1.10~rc1', 'foo-1.10'])
+        self.assertEqual([build.path for build in old], ['foo-1.9'])
+
+    def test_directory_and_repository(self):
+        directory = tempfile.mkdtemp()
+        try:
+            with open('tests/Eterm-0.9.3-5mdv2007.0.src.rpm', 'rb') as file:
+                data = file.read()
+            # two builds with different checksums and a broken package
+            for filename, content in (('a.src.rpm', data), ('b.src.rpm', data[:-1] + b'x'), ('broken.rpm', b'not a package')):
+                with open(os.path.join(directory, filename), 'wb') as file:
+                    file.write(content)
+
+            builds = sorted(directory_builds(directory))
+            self.assertEqual([(build.name, build.arch, build.version, build.release) for build in builds],
+                             [('Eterm', 'src', '0.9.3', '5mdv2007.0')] * 2)
+            new, old = newest(builds)
+            self.assertEqual(len(new), 1)
+            self.assertEqual(len(old), 1)
+
+            os.remove(os.path.join(directory, 'broken.rpm'))
+            repo = YumRepository(directory)
+            repo.add_directory(directory)
+            repo.save()
+            self.assertEqual([(build.path, build.name, build.version, build.release) for build in sorted(repository_builds(directory))],
+                             [(build.path, build.name, build.version, build.release) for build in builds])
+            self.assertEqual(sorted(repository_builds(repo)), sorted(repository_builds(directory)))
+        finally:
+            shutil.rmtree(directory)
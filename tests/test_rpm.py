@@ -1,3 +1,7 @@
+import hashlib
+import os
+import shutil
+import tempfile
 import unittest
 import sys
 
@@ -6,7 +10,14 @@ if sys.version < '3':
 else:
     from io import BytesIO
 
-from pyrpm.rpm import RPM
+import struct
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from pyrpm.rpm import RPM, Entry, FileTable, RPMError
 
 
 class RPMTest(unittest.TestCase):
@@ -39,3 +50,237 @@ class RPMStringIOTest(RPMTest):
     def setUp(self):
 
         self.rpm = RPM(BytesIO(open('tests/Eterm-0.9.3-5mdv2007.0.src.rpm', 'rb').read()))
+
+
+class RPMOpenTest(RPMTest):
+
+    def setUp(self):
+
+        self.rpm = RPM.open('tests/Eterm-0.9.3-5mdv2007.0.src.rpm')
+
+    def tearDown(self):
+        self.rpm.close()
+
+
+class RPMCorruptTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        with open('tests/Eterm-0.9.3-5mdv2007.0.src.rpm', 'rb') as file:
+            self.data = file.read()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _open(self, data):
+        path = os.path.join(self.directory, 'test.rpm')
+        with open(path, 'wb') as file:
+            file.write(data)
+        return RPM.open(path)
+
+    def test_empty(self):
+        self.assertRaises(RPMError, self._open, b'')
+
+    def test_not_rpm(self):
+        self.assertRaises(RPMError, self._open, b'\x00' * 1024 * 1024)
+
+    def test_truncated(self):
+        for size in (50, 200, 1000, 4000):
+            self.assertRaises(RPMError, self._open, self.data[:size])
+
+    def test_misaligned_header(self):
+        # extra padding between signature and header is found by the fallback search
+        data = self.data[:440] + b'\x00' * 8 + self.data[440:]
+        with self._open(data) as rpm:
+            self.assertEqual(rpm.header.name, 'Eterm')
+
+
+class ChecksumTest(unittest.TestCase):
+
+    def setUp(self):
+        with open('tests/Eterm-0.9.3-5mdv2007.0.src.rpm', 'rb') as file:
+            self.data = file.read()
+
+    def test_default(self):
+        rpm = RPM(BytesIO(self.data))
+        self.assertEqual(rpm.checksum_type, 'sha256')
+        self.assertEqual(rpm.checksum, hashlib.sha256(self.data).hexdigest())
+        self.assertEqual(rpm.filesize, len(self.data))
+
+    def test_multiple(self):
+        rpm = RPM(BytesIO(self.data), checksum=['sha1', 'sha512'])
+        self.assertEqual(rpm.checksum, hashlib.sha1(self.data).hexdigest())
+        self.assertEqual(rpm.checksums['sha512'], hashlib.sha512(self.data).hexdigest())
+
+    def test_deferred(self):
+        rpm = RPM(BytesIO(self.data), defer_checksum=True)
+        self.assertEqual(rpm._checksums, None)
+        self.assertEqual(rpm.checksum, hashlib.sha256(self.data).hexdigest())
+
+    def test_skipped(self):
+        rpm = RPM(BytesIO(self.data), checksum=None)
+        self.assertEqual(rpm.checksum, None)
+        self.assertEqual(rpm.filesize, len(self.data))
+
+    def test_misaligned_header(self):
+        data = self.data[:440] + b'\x00' * 8 + self.data[440:]
+        self.assertEqual(RPM(BytesIO(data)).checksum, hashlib.sha256(data).hexdigest())
+
+
+class DigestTest(unittest.TestCase):
+
+    def setUp(self):
+        with open('tests/Eterm-0.9.3-5mdv2007.0.src.rpm', 'rb') as file:
+            self.data = file.read()
+
+    def _verify(self, data, payload=False):
+        return [mismatch.digest for mismatch in RPM(BytesIO(data), checksum=None).verify_digests(payload)]
+
+    def test_valid(self):
+        self.assertEqual(self._verify(self.data), [])
+        self.assertEqual(self._verify(self.data, payload=True), [])
+
+    def test_corrupt_header(self):
+        # a byte of the description in the header store
+        offset = self.data.index(b'Enlightened Terminal')
+        data = self.data[:offset] + b'e' + self.data[offset + 1:]
+        self.assertEqual(self._verify(data), ['sha1'])
+        self.assertEqual(self._verify(data, payload=True), ['sha1', 'md5'])
+
+    def test_corrupt_payload(self):
+        data = self.data[:-1] + b'x'
+        self.assertEqual(self._verify(data), [])
+        self.assertEqual(self._verify(data, payload=True), ['md5'])
+        self.assertEqual(self._verify(self.data[:-100], payload=True), ['md5', 'size'])
+
+    def test_generated(self):
+        sys.path.insert(0, 'benchmarks')
+        try:
+            from rpmgen import build_rpm
+        finally:
+            sys.path.remove('benchmarks')
+        data = build_rpm(files=3)
+        rpm = RPM(BytesIO(data), checksum=None)
+        self.assertTrue(273 in rpm.signature and 5092 in rpm.header)
+        self.assertEqual(rpm.verify_digests(payload=True), [])
+
+        data = data[:-1] + (b'\x00' if data[-1:] != b'\x00' else b'\x01')
+        mismatches = RPM(BytesIO(data), checksum=None).verify_digests(payload=True)
+        self.assertEqual([mismatch.digest for mismatch in mismatches], ['payload', 'md5'])
+        self.assertEqual(mismatches[0].expected, rpm.header[5092][0])
+
+
+class FileTableTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.rpm = RPM(open('tests/Eterm-0.9.3-5mdv2007.0.src.rpm', 'rb'))
+
+    def test_rows(self):
+        files = self.rpm.files
+        self.assertTrue(self.rpm.filelist is files)
+        self.assertEqual(len(files), 8)
+        self.assertEqual(files[-1].name, 'Eterm.spec')
+        self.assertEqual(files[-1].size, 11194)
+        self.assertEqual(files[-1].type, 'file')
+        self.assertEqual(files[0].digest, '897a8c3262f962fc804e71df72582372')
+        self.assertEqual(files[0].color, None)
+        self.assertEqual([file.name for file in files[:2]], ['Eterm-0.9.1-themefix.patch.bz2', 'Eterm-0.9.2-muttandirc-themes.patch.bz2'])
+        self.assertRaises(IndexError, lambda: files[8])
+
+    def test_columns(self):
+        files = self.rpm.files
+        self.assertEqual(files.column('name'), [file.name for file in files])
+        self.assertEqual(sum(files.column('size')), 2436105)
+        self.assertEqual(list(files.column('content_class')), [None] * 8)
+
+    def test_empty(self):
+        self.assertEqual(list(FileTable()), [])
+
+    def test_mutation(self):
+        files = self.rpm.files
+        expected = list(files)
+        new = expected[0]._replace(name='/usr/bin/eterm', mode=0o100755, size=10, primary=True)
+        for changed in (files, expected):
+            changed.append(new)
+            changed.insert(1, new._replace(name='/etc/Eterm/theme.cfg'))
+            changed.remove(changed[0])
+            changed[2] = new._replace(name='Eterm.new', primary=False)
+            changed[-2:] = [new._replace(name='/usr/share/Eterm/%d' % (i, ), primary=False) for i in range(3)]
+            del changed[3]
+            changed.extend([new])
+            changed.pop(0)
+        self.assertEqual(list(files), expected)
+        self.assertEqual(files.column('name'), [file.name for file in expected])
+        self.assertTrue(files.version > 0)
+        self.assertRaises(ValueError, files.remove, self.rpm.files[0]._replace(name='missing'))
+
+    def test_use_numpy(self):
+        if numpy is None:
+            self.assertRaises(RPMError, RPM, open('tests/Eterm-0.9.3-5mdv2007.0.src.rpm', 'rb'), use_numpy=True)
+            return
+        rpm = RPM(open('tests/Eterm-0.9.3-5mdv2007.0.src.rpm', 'rb'), use_numpy=True)
+        self.assertTrue(isinstance(rpm.header[1028], numpy.ndarray))
+        self.assertEqual([file.name for file in rpm.filelist], [file.name for file in self.rpm.filelist])
+        self.assertEqual(int(rpm.files.to_numpy()['size'].sum()), 2436105)
+
+    @unittest.skipIf(numpy is None, 'numpy not available')
+    def test_numpy(self):
+        arrays = self.rpm.files.to_numpy()
+        self.assertEqual(int(arrays['size'].sum()), 2436105)
+        self.assertEqual(arrays['name'][-1], 'Eterm.spec')
+
+
+class HeaderTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.rpm = RPM(open('tests/Eterm-0.9.3-5mdv2007.0.src.rpm', 'rb'))
+
+    def test_lazy_lookup(self):
+        self.assertTrue(1000 in self.rpm.header)
+        self.assertFalse(1140 in self.rpm.header)
+        self.assertEqual(self.rpm.header[1000], 'Eterm')
+        self.assertTrue(1000 in self.rpm.header._cache)
+        self.assertFalse(1010 in self.rpm.header._cache)
+        self.assertRaises(KeyError, lambda: self.rpm.header[1140])
+
+    def test_iteration(self):
+        tags = [entry.tag for entry in self.rpm.header]
+        self.assertEqual(tags, [record[0] for record in self.rpm.header.records])
+        self.assertEqual(len(self.rpm.header.entries), len(tags))
+        self.assertEqual(self.rpm.signature.size, 2438200)
+
+    def test_compact(self):
+        # slotted objects, decoded entries keep no raw index record
+        for obj in (self.rpm, self.rpm.header, self.rpm.signature, self.rpm.header._entry(0)):
+            self.assertFalse(hasattr(obj, '__dict__'))
+        self.assertFalse(hasattr(self.rpm.header._entry(0), 'entry'))
+
+        # repeated strings are shared within and across packages
+        other = RPM(open('tests/Eterm-0.9.3-5mdv2007.0.src.rpm', 'rb'))
+        usernames = self.rpm.files.column('username') + other.files.column('username')
+        self.assertEqual(len(set(id(username) for username in usernames)), len(set(usernames)))
+        self.assertTrue(self.rpm.requires[0].name is other.requires[0].name)
+
+
+class EntryTest(unittest.TestCase):
+
+    def test_string_array(self):
+        store = b'abc\x00\xc3\xa9t\xc3\xa9\x00\x00rest'
+        self.assertEqual(Entry((1117, 8, 0, 3), store).value, ['abc', u'\xe9t\xe9', ''])
+        self.assertEqual(Entry((1000, 6, 4, 1), store).value, u'\xe9t\xe9')
+
+    def test_string_fallback(self):
+        store = b'utf\x00l\xe4tin\x00'
+        self.assertEqual(Entry((1117, 8, 0, 2), store).value, ['utf', u'l\xe4tin'])
+
+    def test_unterminated_string(self):
+        self.assertRaises(RPMError, Entry, (1000, 6, 0, 1), b'abc')
+
+    def test_integers(self):
+        store = struct.pack('!3i', 1, -2, 3) + struct.pack('!h', 7)
+        self.assertEqual(list(Entry((1028, 4, 0, 3), store).value), [1, -2, 3])
+        self.assertEqual(Entry((1028, 4, 4, 1), store).value, -2)
+        self.assertEqual(Entry((1030, 3, 12, 1), store).value, 7)
+        self.assertRaises(RPMError, Entry, (1028, 4, 8, 3), store)
@@ -0,0 +1,79 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from pyrpm.rpm import RPM
+from pyrpm.stats import Stats
+from pyrpm.tools.createrepo import YumRepository
+
+RPM_FILE = 'tests/Eterm-0.9.3-5mdv2007.0.src.rpm'
+
+# the signature and the header are found by reading a window ahead, which
+# is read again from the magic number on
+LOOK_AHEAD = 2 * RPM.MAGIC_NUMBER_SEARCH_LIMIT
+
+
+class StatsTest(unittest.TestCase):
+
+    def test_package(self):
+        stats = Stats()
+        with RPM.open(RPM_FILE, stats=stats) as rpm:
+            self.assertEqual(set(stats.times), set(['read_lead', 'read_signature', 'read_header', 'match_composite', 'compute_checksum']))
+            self.assertEqual(stats.counts['bytes_read'], os.path.getsize(RPM_FILE) + LOOK_AHEAD)
+            decoded = stats.counts['entries_decoded']
+            self.assertTrue(decoded > 0)
+
+            # cached entries are decoded once
+            rpm.header.name
+            rpm.header.name
+            self.assertTrue(stats.counts['entries_decoded'] <= decoded + 1)
+
+    def test_deferred_checksum(self):
+        stats = Stats()
+        with RPM.open(RPM_FILE, defer_checksum=True, composite=False, stats=stats) as rpm:
+            self.assertNotIn('compute_checksum', stats.times)
+            rpm.checksum
+            self.assertIn('compute_checksum', stats.times)
+            self.assertEqual(stats.counts['bytes_read'], rpm.header.header_range[1] + LOOK_AHEAD + os.path.getsize(RPM_FILE))
+
+    def test_stream_offset(self):
+        # the bytes read, not the offset the header ends at
+        with open(RPM_FILE, 'rb') as file:
+            data = file.read()
+        stream = io.BytesIO(b'\0' * 1000 + data)
+        stream.seek(1000)
+        stats = Stats()
+        rpm = RPM(stream, checksum=None, composite=False, stats=stats)
+        self.assertEqual(stats.counts['bytes_read'], rpm.header.header_range[1] - 1000 + LOOK_AHEAD)
+
+    def test_repository(self):
+        directory = tempfile.mkdtemp()
+        try:
+            with open(RPM_FILE, 'rb') as file:
+                data = file.read()
+            for filename, content in (('a.src.rpm', data), ('b.src.rpm', data[:-1] + b'x')):
+                with open(os.path.join(directory, filename), 'wb') as file:
+                    file.write(content)
+
+            for workers in (1, 2):
+                packages = []
+                stats = Stats(lambda href, stats: packages.append((href, stats.counts['bytes_read'])))
+                repo = YumRepository(directory, stats=stats)
+                repo.add_directory(directory, workers=workers)
+                repo.save()
+
+                self.assertEqual(packages, [('a.src.rpm', len(data) + LOOK_AHEAD), ('b.src.rpm', len(data) + LOOK_AHEAD)])
+                self.assertEqual(stats.counts['packages'], 2)
+                self.assertEqual(stats.counts['bytes_read'], 2 * (len(data) + LOOK_AHEAD))
+                for stage in ('read_header', 'match_composite', 'xml_primary', 'xml_filelists', 'xml_other', 'serialize', 'compress', 'write'):
+                    self.assertIn(stage, stats.times)
+                self.assertEqual(stats.counts['bytes_written'], sum(
+                    os.path.getsize(os.path.join(directory, 'repodata', type + '.xml.gz')) for type in ('primary', 'filelists', 'other')))
+
+            stats = Stats()
+            YumRepository(directory, stats=stats).read()
+            self.assertEqual(list(stats.times), ['read_metadata'])
+        finally:
+            shutil.rmtree(directory)
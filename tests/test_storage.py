@@ -0,0 +1,93 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from pyrpm.tools.createrepo import YumRepository
+from pyrpm.tools.storage import ChecksumError, HTTPStorage, LocalStorage, storage
+
+from tests.httpserver import KeepAliveHandler, start_server, stop_server
+
+
+class FileHandler(KeepAliveHandler):
+    ''' serves the files below the server root '''
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        path = os.path.join(self.server.root, *self.path.lstrip('/').split('/'))
+        if not os.path.isfile(path):
+            self.send_data(404)
+            return
+        with open(path, 'rb') as file:
+            self.send_data(200, file.read())
+
+
+class StorageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.repodir = os.path.join(self.directory, 'repo')
+        os.mkdir(self.repodir)
+        shutil.copy('tests/Eterm-0.9.3-5mdv2007.0.src.rpm', self.repodir)
+        repo = YumRepository(self.repodir)
+        repo.add_directory(self.repodir)
+        repo.save()
+        self.pkgids = list(repo.primary_data)
+
+        self.server = start_server(FileHandler, root=self.directory)
+        self.url = 'http://127.0.0.1:%d/repo/' % (self.server.server_address[1], )
+
+    def tearDown(self):
+        stop_server(self.server)
+        shutil.rmtree(self.directory)
+
+    def test_storage(self):
+        self.assertTrue(isinstance(storage(self.repodir), LocalStorage))
+        self.assertTrue(isinstance(storage(self.url), HTTPStorage))
+
+    def test_read(self):
+        backend = HTTPStorage(self.url)
+        try:
+            repo = YumRepository(os.path.join(self.directory, 'mirror'), storage=backend)
+            repo.read()
+            self.assertEqual(list(repo.primary_data), self.pkgids)
+            self.assertEqual(list(repo.other_data), self.pkgids)
+            self.assertEqual(len(list(repo.iter_packages())), 1)
+
+            # one keep-alive connection for all requests
+            self.assertEqual(backend.requests, len(self.server.requests))
+            self.assertEqual(self.server.connections, 1)
+
+            # the metadata is written locally
+            repo.save()
+            self.assertEqual(list(YumRepository(repo.repodir).iter_metadata('primary'))[0][0], self.pkgids[0])
+        finally:
+            backend.close()
+
+    def test_cache(self):
+        cache_dir = os.path.join(self.directory, 'cache')
+        for requests in (4, 1):
+            backend = HTTPStorage(self.url, cache_dir=cache_dir)
+            YumRepository(self.directory, storage=backend).read()
+            backend.close()
+            self.assertEqual(backend.requests, requests)
+        self.assertEqual(len(os.listdir(cache_dir)), 3)
+
+    def test_checksum_mismatch(self):
+        path = os.path.join(self.repodir, 'repodata', 'other.xml.gz')
+        with open(path, 'ab') as file:
+            file.write(b'\0')
+        cache_dir = os.path.join(self.directory, 'cache')
+        backend = HTTPStorage(self.url, cache_dir=cache_dir)
+        try:
+            repo = YumRepository(self.directory, storage=backend)
+            repo.read(types=('primary', ))
+            self.assertRaises(ChecksumError, repo.read, types=('other', ))
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+        finally:
+            backend.close()
+
+    def test_missing(self):
+        backend = HTTPStorage(self.url + 'missing/')
+        self.assertRaises(IOError, YumRepository(self.directory, storage=backend).read)
+        backend.close()
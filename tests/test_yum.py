@@ -0,0 +1,58 @@
+import unittest
+
+from pyrpm.rpm import RPMprco
+from pyrpm.yum import YumPackage, element
+
+RPM_NS = '{http://linux.duke.edu/metadata/rpm}'
+
+
+class YumPackageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.package = YumPackage(open('tests/Eterm-0.9.3-5mdv2007.0.src.rpm', 'rb'))
+
+    def _requires(self):
+        ele = element('format')
+        self.package._xml_requires(ele)
+        return [(entry.get('name'), entry.get('flags'), entry.get('ver')) for entry in ele.findall('%srequires/%sentry' % (RPM_NS, RPM_NS))]
+
+    def test_self_provided_requires(self):
+        package = self.package
+        package.provides = [RPMprco('foo', ('0', '1.0', '1'), 8, 'EQ'), RPMprco('bar', (None, None, None), 0, None)]
+        package.filelist = [package.filelist.row(0)._replace(name='/usr/bin/foo')]
+        package.requires = [
+            RPMprco('foo', ('0', '1.0', '1'), 8, 'EQ'),
+            RPMprco('foo', ('0', '2.0', None), 12, 'GE'),
+            RPMprco('bar', (None, None, None), 0, None),
+            RPMprco('/usr/bin/foo', (None, None, None), 0, None),
+            RPMprco('/usr/bin/other', (None, None, None), 0, None),
+            RPMprco('rpmlib(CompressedFileNames)', ('0', '3.0.4', '1'), 16777226, 'LE'),
+        ]
+        self.assertEqual(self._requires(), [('/usr/bin/other', None, None), ('foo', 'GE', '2.0')])
+
+        # the sets follow replaced lists
+        package.provides = []
+        self.assertEqual(len(self._requires()), 4)
+
+    def test_provides_follow_changes(self):
+        package = self.package
+        self.assertFalse('foo' in package.provide_names)
+        prco = RPMprco('foo', ('0', '1.0', '1'), 8, 'EQ')
+        package.provides.append(prco)
+        self.assertTrue('foo' in package.provide_names)
+        self.assertTrue(prco in package.provide_tuples)
+        package.provides[-1] = prco._replace(name='bar')
+        self.assertFalse('foo' in package.provide_names)
+        self.assertTrue('bar' in package.provide_names)
+
+        # a requirement provided in place is no longer listed
+        package.requires.append(RPMprco('bar', ('0', '1.0', '1'), 8, 'EQ'))
+        self.assertFalse('bar' in [name for name, flags, version in self._requires()])
+
+    def test_file_paths_follow_changes(self):
+        package = self.package
+        self.assertFalse('/usr/bin/foo' in package.file_paths)
+        package.filelist.append(package.filelist[0]._replace(name='/usr/bin/foo'))
+        self.assertTrue('/usr/bin/foo' in package.file_paths)
+        package.filelist.pop()
+        self.assertFalse('/usr/bin/foo' in package.file_paths)